@@ -1,45 +1,178 @@
-from flask import Flask, render_template, request, redirect, url_for
-from src.pipelines.predict_pipeline import CustomData, PredictPipeline
-from sklearn import set_config
-import pandas as pd
-
-application = Flask(__name__)
-
-app = application
-
-prediction: int
-
-@app.route('/', methods=['GET', 'POST'])
-def index():
-    if request.method=='GET':
-        return render_template('index.html')
-    else:
-        # Variable to pass prediction to other functions
-        global prediction
-
-        # Initializing data
-        data: object = CustomData(
-            book = request.form.get('book'),
-            delivery = request.form.get('delivery'),
-            rate = request.form.get('rate'),
-            votes = request.form.get('votes'),
-            location = request.form.get('location'),
-            type_tag = (', ').join(request.form.getlist('type_tag')),
-            r_type= request.form.get('r_type')
-            )
-        
-        # Setting sklearn global configurations
-        set_config(transform_output="pandas")
-
-        pred_df: pd.DataFrame = data.get_data_as_dataframe()  
-
-        prediction = PredictPipeline().predict(pred_df)
-
-        return redirect(url_for('results'))
-
-@app.route('/results')
-def results():
-    return render_template('result.html', prediction = prediction)
-
-if __name__=="__main__":
+from flask import Flask, render_template, request, jsonify, Response
+from src.logger import configure_logging, SERVING_LEVELS
+from src.pipelines.predict_pipeline import CustomData, CustomBatchData
+from src.pipelines.model_registry import get_registry
+from src.pipelines.batch_scheduler import MicroBatchScheduler
+from src.pipelines.prediction_cache import PredictionCache
+from src.pipelines.json_api import JsonPredictor
+from src.pipelines.inference_pool import InferencePool
+from src.request_timing import start_request_timing, current_timings, timed, server_timing_header
+from src.metrics import REGISTRY, REQUESTS, REQUEST_SECONDS, CONTENT_TYPE, register_model_metrics
+import numpy as np
+import pandas as pd
+import io
+import gc
+import time
+
+# Writing logs from a background thread, with the per-prediction transformer logs muted
+configure_logging(levels=SERVING_LEVELS)
+
+application = Flask(__name__)
+
+app = application
+
+# Loading model and preprocessor once per worker and watching them for changes
+get_registry().start()
+
+# Predicting batches in worker processes, 0 INFERENCE_WORKERS keeps them in this process
+inference_pool = InferencePool()
+
+# Grouping concurrent form submissions into batches
+scheduler = MicroBatchScheduler(pipeline=inference_pool)
+
+# Remembering predictions of repeated form submissions
+prediction_cache = PredictionCache()
+
+# Answering the JSON API with the same scheduler and cache as the form
+json_predictor = JsonPredictor(scheduler, prediction_cache, inference_pool)
+
+# Exposing the counters of the scheduler, cache and pool and the model served on /metrics
+REGISTRY.register_stats("scheduler", scheduler.stats, counters=["batches", "requests"])
+REGISTRY.register_stats("prediction_cache", prediction_cache.stats, counters=["hits", "misses", "evictions", "expirations", "invalidations"])
+REGISTRY.register_stats("inference_pool", inference_pool.stats, counters=["batches", "chunks", "rows", "fallbacks"])
+register_model_metrics(get_registry())
+
+# Keeping the garbage collector off the objects loaded so far, so that workers
+# forked from a preloading master (see gunicorn.conf.py) share the model pages
+# instead of copying them when a collection touches their reference counts
+gc.freeze()
+
+@app.before_request
+def start_timing():
+    # Collecting the time spent in each stage of the request
+    start_request_timing()
+    request.environ['timing.start'] = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    # Reporting the stages in a Server-Timing header, e.g. for the load benchmark
+    total: float = time.perf_counter() - request.environ['timing.start']
+    timings: dict = current_timings()
+    if timings is not None:
+        timings['total'] = total
+        response.headers['Server-Timing'] = server_timing_header(timings)
+
+    # Counting by route rather than path, which would give a series per URL
+    route: str = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.labels(route, str(response.status_code)).inc()
+    REQUEST_SECONDS.labels(route).observe(total)
+    return response
+
+@app.route('/', methods=['GET', 'POST'])
+def index():
+    if request.method=='GET':
+        return render_template('index.html')
+    else:
+        # Initializing data
+        with timed('parse'):
+            data: object = CustomData(
+                book = request.form.get('book'),
+                delivery = request.form.get('delivery'),
+                rate = request.form.get('rate'),
+                votes = request.form.get('votes'),
+                location = request.form.get('location'),
+                type_tag = (', ').join(request.form.getlist('type_tag')),
+                r_type= request.form.get('r_type')
+                )
+
+        # Predicting unless the same input was predicted with the current model
+        prediction: int = prediction_cache.predict(data, scheduler.predict)
+
+        # Rendering the result in the same response, nothing is shared between requests
+        with timed('render'):
+            return render_template('result.html', prediction = prediction)
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Reports the counters of the micro-batch scheduler, the prediction cache and
+    the inference pool.
+    """
+    return jsonify(scheduler=scheduler.stats(),
+                   prediction_cache=prediction_cache.stats(),
+                   inference_pool=inference_pool.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Reports request counts and latencies, stage latencies, batch sizes, the
+    scheduler, cache and pool counters and the model served, in the Prometheus
+    text format.
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/api/predict', methods=['POST'])
+def api_predict():
+    """
+    Predicts one restaurant given as a JSON object of the form fields, or a
+    batch given as a list of them (or {"records": [...]}), see JsonPredictor.
+    """
+    with timed('parse'):
+        payload = request.get_json(force=True, silent=True)
+    if payload is None:
+        return jsonify(error="Request body is not valid JSON"), 400
+
+    try:
+        result: dict = json_predictor.predict(payload)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
+    with timed('render'):
+        return jsonify(result)
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """
+    Scores many restaurants in one pass. Accepts a JSON list of records (or
+    {"records": [...]}) and answers with JSON, or a CSV file (uploaded as 'file'
+    or sent as a text/csv body) and answers with the CSV plus a prediction column.
+    Restaurants that cannot be predicted get null (an empty CSV cell), payloads
+    of another shape or without the needed columns are answered with 400.
+    """
+    # Reading CSV input
+    csv_file = request.files.get('file')
+    if csv_file is not None or request.mimetype == 'text/csv':
+        try:
+            input_df: pd.DataFrame = pd.read_csv(csv_file if csv_file is not None else io.BytesIO(request.get_data()))
+            batch_df: pd.DataFrame = CustomBatchData(input_df).get_data_as_dataframe()
+        except ValueError as e:
+            return jsonify(error=f"Invalid CSV: {e}"), 400
+
+        input_df['prediction'] = np.trunc(inference_pool.predict_rows(batch_df)).astype('Int64')
+
+        return Response(input_df.to_csv(index=False), mimetype='text/csv')
+
+    # Reading JSON input
+    payload = request.get_json(force=True, silent=True)
+    if payload is None:
+        return jsonify(error="Request body is not valid JSON"), 400
+
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        return jsonify(error='Expected a list of JSON objects or {"records": [...]}'), 400
+    if not records:
+        return jsonify(predictions=[])
+
+    try:
+        batch_df: pd.DataFrame = CustomBatchData(records).get_data_as_dataframe()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    predictions: pd.Series = inference_pool.predict_rows(batch_df)
+
+    return jsonify(predictions=[None if np.isnan(y) else int(y) for y in predictions])
+
+if __name__=="__main__":
     app.run()
\ No newline at end of file
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import asyncio
+import functools
+import contextvars
+import logging
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from src.logger import configure_logging, SERVING_LEVELS
+from src.pipelines.model_registry import get_registry
+from src.pipelines.json_api import JsonPredictor
+from src.pipelines.batch_scheduler import MicroBatchScheduler
+from src.pipelines.prediction_cache import PredictionCache
+from src.pipelines.inference_pool import InferencePool
+from src.request_timing import start_request_timing, timed, server_timing_header
+from src.metrics import REGISTRY, REQUESTS, REQUEST_SECONDS, CONTENT_TYPE, register_model_metrics
+
+from typing import Callable, List, Optional, Tuple, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AsgiConfig:
+    """
+    class AsgiConfig is used to initialize the ASGI app.
+
+    * max_workers: Threads running predictions, requests beyond them wait in the
+      event loop without holding a thread
+    * max_body_bytes: Largest request body accepted, larger ones get 413
+
+    """
+    max_workers: int = int(os.environ.get("ASGI_WORKERS", 32))
+    max_body_bytes: int = 10 * 1024 * 1024
+
+
+class PredictionApp:
+    """
+    class PredictionApp:
+        * __init__(config: AsgiConfig = None, predictor: JsonPredictor = None, executor: Executor = None) -> None
+        * __call__(scope, receive, send) -> None
+
+        This class is the ASGI variant of the JSON API of application.py, written
+        against the bare ASGI protocol so that it needs no web framework. Run it
+        with any ASGI server, e.g. uvicorn asgi:app
+
+        * POST /api/predict: One restaurant or a batch, see JsonPredictor
+        * GET /stats: Counters of the micro-batch scheduler, the prediction cache
+          and the inference pool
+        * GET /health: Version of the model served, 503 when it cannot be loaded
+        * GET /metrics: Metrics in the Prometheus text format, as in application.py
+
+        The event loop only reads requests and writes responses. Predictions
+        block on pandas and the model, so they run in the executor, and a slow
+        batch never holds up the other connections.
+
+    """
+    JSON_HEADERS: List[Tuple[bytes, bytes]] = [(b"content-type", b"application/json")]
+
+    # Paths counted by /metrics, others are counted as unmatched
+    ROUTES: Tuple[str, ...] = ("/api/predict", "/health", "/metrics", "/stats")
+
+    def __init__(self,
+                 config: Optional[AsgiConfig] = None,
+                 predictor: Optional[JsonPredictor] = None,
+                 executor: Optional[Executor] = None) -> None:
+        self.asgi_config: Type[AsgiConfig] = config or AsgiConfig()
+
+        # Batches go to the worker processes of the pool when INFERENCE_WORKERS is set
+        if predictor is None:
+            inference_pool: InferencePool = InferencePool()
+            predictor = JsonPredictor(MicroBatchScheduler(pipeline=inference_pool), PredictionCache(), inference_pool)
+        self.predictor: JsonPredictor = predictor
+        self.executor: Executor = executor or ThreadPoolExecutor(max_workers=self.asgi_config.max_workers,
+                                                                 thread_name_prefix="asgi-predict")
+
+        # Exposing the counters of the scheduler, cache and pool and the model served on /metrics
+        REGISTRY.register_stats("scheduler", self.predictor.scheduler.stats, counters=["batches", "requests"])
+        REGISTRY.register_stats("prediction_cache", self.predictor.prediction_cache.stats,
+                                counters=["hits", "misses", "evictions", "expirations", "invalidations"])
+        if isinstance(self.predictor.pipeline, InferencePool):
+            REGISTRY.register_stats("inference_pool", self.predictor.pipeline.stats,
+                                    counters=["batches", "chunks", "rows", "fallbacks"])
+        register_model_metrics(get_registry())
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _run(self, function: Callable, *args):
+        """
+        This function runs a blocking function in the executor, in a copy of the
+        current context so that it adds to the timings of the request.
+
+        """
+        context: contextvars.Context = contextvars.copy_context()
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(context.run, function, *args))
+
+    async def _lifespan(self, receive, send) -> None:
+        """
+        This function loads the model at server startup and stops the executor
+        and the registry watcher at shutdown.
+
+        """
+        while True:
+            message: dict = await receive()
+
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self._run(get_registry().start)
+                    await send({"type": "lifespan.startup.complete"})
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                get_registry().stop()
+                self.predictor.scheduler.stop()
+                if isinstance(self.predictor.pipeline, InferencePool):
+                    self.predictor.pipeline.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        """
+        This function reads the request body, or returns None when it is larger
+        than max_body_bytes.
+
+        """
+        body: bytearray = bytearray()
+        while True:
+            message: dict = await receive()
+            body += message.get("body", b"")
+            if len(body) > self.asgi_config.max_body_bytes:
+                return None
+            if not message.get("more_body", False):
+                return bytes(body)
+
+    async def _respond(self, send, status: int, content: dict, timings: Optional[dict] = None) -> None:
+        """
+        This function sends content as a JSON response, with the timings of the
+        request in a Server-Timing header when given.
+
+        """
+        with timed("render"):
+            body: bytes = json.dumps(content).encode()
+
+        headers: List[Tuple[bytes, bytes]] = self.JSON_HEADERS + [(b"content-length", str(len(body)).encode())]
+        if timings is not None:
+            timings["total"] = time.perf_counter() - timings.pop("start")
+            headers.append((b"server-timing", server_timing_header(timings).encode()))
+
+        await send({"type": "http.response.start",
+                    "status": status,
+                    "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _http(self, scope, receive, send) -> None:
+        """
+        This function answers an HTTP request and counts it with its status and
+        latency by route.
+
+        """
+        start: float = time.perf_counter()
+        status: List[int] = [500]
+
+        async def send_and_record(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self._route(scope, receive, send_and_record)
+        finally:
+            route: str = scope["path"] if scope["path"] in self.ROUTES else "unmatched"
+            REQUESTS.labels(route, str(status[0])).inc()
+            REQUEST_SECONDS.labels(route).observe(time.perf_counter() - start)
+
+    async def _route(self, scope, receive, send) -> None:
+        """
+        This function routes an HTTP request.
+
+        """
+        route: Tuple[str, str] = (scope["method"], scope["path"])
+
+        if route == ("GET", "/metrics"):
+            body: bytes = REGISTRY.render().encode()
+            await send({"type": "http.response.start",
+                        "status": 200,
+                        "headers": [(b"content-type", CONTENT_TYPE.encode()),
+                                    (b"content-length", str(len(body)).encode())]})
+            return await send({"type": "http.response.body", "body": body})
+
+        if route == ("GET", "/health"):
+            try:
+                artifacts = await self._run(get_registry().get)
+            except Exception as e:
+                return await self._respond(send, 503, {"error": str(e)})
+            return await self._respond(send, 200, {"version": artifacts.version})
+
+        if route == ("GET", "/stats"):
+            stats: dict = {"scheduler": self.predictor.scheduler.stats(),
+                           "prediction_cache": self.predictor.prediction_cache.stats()}
+            if isinstance(self.predictor.pipeline, InferencePool):
+                stats["inference_pool"] = self.predictor.pipeline.stats()
+            return await self._respond(send, 200, stats)
+
+        if scope["path"] != "/api/predict":
+            return await self._respond(send, 404, {"error": "Not found"})
+        if scope["method"] != "POST":
+            return await self._respond(send, 405, {"error": "Method not allowed"})
+
+        # Collecting the time spent in each stage of the request, this task only
+        timings: dict = start_request_timing()
+        start: float = time.perf_counter()
+
+        body: Optional[bytes] = await self._read_body(receive)
+        if body is None:
+            return await self._respond(send, 413, {"error": "Request body too large"})
+
+        try:
+            with timed("parse"):
+                payload = json.loads(body)
+        except ValueError:
+            return await self._respond(send, 400, {"error": "Request body is not valid JSON"})
+
+        try:
+            result: dict = await self._run(self.predictor.predict, payload)
+        except ValueError as e:
+            return await self._respond(send, 400, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}")
+            return await self._respond(send, 500, {"error": str(e)})
+
+        timings["start"] = start
+        await self._respond(send, 200, result, timings)
+
+
+# Writing logs from a background thread, with the per-prediction transformer logs muted
+configure_logging(levels=SERVING_LEVELS)
+
+app = PredictionApp()
@@ -0,0 +1,20 @@
+import os
+import multiprocessing
+
+# Gunicorn settings, read automatically when gunicorn is started from this folder:
+# gunicorn application:application
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Threads per worker share the micro-batch scheduler and the prediction cache
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Importing application.py in the master loads the model and preprocessor once,
+# the forked workers then share those pages copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker) -> None:
+    # The registry restarts its watcher thread lazily in every worker
+    server.log.info(f"Worker {worker.pid} forked with the preloaded model")
@@ -0,0 +1,151 @@
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from sklearn import config_context
+from sklearn.metrics import r2_score, mean_absolute_error
+
+from src.exception import CustomException
+from src.components.artifact_store import read_frame
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+from src.components.inference_runtime import InferenceRuntime
+from src.components.transformation_components.compiled_preprocessor import CompiledPreprocessor
+from src.benchmarks.load_benchmark import git_commit
+
+from typing import Dict, List
+
+
+ENCODINGS: List[str] = ['explode', 'multi_hot']
+
+
+def restaurants(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function keeps the rows of df the preprocessor can predict, those with
+    a price and a rest_type, with the price parsed to float.
+
+    """
+    target: str = CompiledPreprocessor.TARGET
+    df = df[df[target].notna() & df['rest_type'].notna()].reset_index(drop=True)
+
+    return df.assign(**{target: df[target].astype(str).str.replace(',', '', regex=False).astype(np.float64)})
+
+
+def time_calls(function, repeat: int) -> float:
+    """
+    This function returns the best wall time of repeat calls of function.
+
+    """
+    timings: List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def benchmark(train_df: pd.DataFrame, test_df: pd.DataFrame, model_names: List[str],
+              n_records: int = 500, repeat: int = 5) -> Dict[str, Dict[str, dict]]:
+    """
+    This function fits the preprocessor of every rest_type encoding on
+    train_df, trains every model on it and scores it on the restaurants of
+    test_df. Accuracy is measured per restaurant, the mean of the tag rows with
+    the explode encoding, so that both encodings are scored on the same rows.
+    Speed is measured on the InferenceRuntime, for the whole test split in one
+    predict_columns() call and for n_records single restaurants.
+
+    * test: Restaurants of test_df with their parsed price
+    * feature_rows: Rows of the feature matrix of test, one per tag with explode
+
+    """
+    try:
+        test: pd.DataFrame = restaurants(test_df)
+        records: List[dict] = [{
+            'book': row['book_table'],
+            'delivery': row['online_order'],
+            'rate': row['rate'],
+            'votes': row['votes'],
+            'location': row['location'],
+            'type_tag': row['rest_type'],
+            'r_type': row['listed_in(type)']
+        } for _, row in test.head(n_records).iterrows()]
+
+        results: Dict[str, Dict[str, dict]] = {}
+        for encoding in ENCODINGS:
+            data_transformation = DataTransformation()
+            data_transformation.data_tranformation_config.rest_type_encoding = encoding
+
+            # Fitting the preprocessor of the encoding
+            preprocessor = data_transformation.get_data_transformer_object()
+            start: float = time.perf_counter()
+            with config_context(transform_output="pandas"):
+                X_train, y_train = preprocessor.fit_transform(train_df)
+            transform_seconds: float = time.perf_counter() - start
+
+            compiled_preprocessor: CompiledPreprocessor = CompiledPreprocessor(preprocessor)
+            feature_rows: int = len(compiled_preprocessor.transform(test)[0])
+
+            models: dict = ModelTrainer().get_models()
+            results[encoding] = {}
+            for name in model_names:
+                model = models[name]
+
+                start = time.perf_counter()
+                model.fit(X_train, y_train)
+                fit_seconds: float = time.perf_counter() - start
+
+                runtime: InferenceRuntime = InferenceRuntime.from_model(model, compiled_preprocessor)
+                predictions: np.ndarray = runtime.predict_columns(test)
+
+                batch_seconds: float = time_calls(lambda: runtime.predict_columns(test), repeat)
+                record_seconds: float = time_calls(
+                    lambda: [runtime.predict_record(**record) for record in records], repeat)
+
+                results[encoding][name] = {
+                    "features": len(compiled_preprocessor.feature_names_out),
+                    "train_rows": len(X_train),
+                    "rows_per_restaurant": feature_rows / len(test),
+                    "transform_seconds": transform_seconds,
+                    "fit_seconds": fit_seconds,
+                    "r2": r2_score(test[CompiledPreprocessor.TARGET], predictions),
+                    "mae": mean_absolute_error(test[CompiledPreprocessor.TARGET], predictions),
+                    "batch_restaurants_per_second": len(test) / batch_seconds,
+                    "record_us": record_seconds / len(records) * 1e6
+                }
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+if __name__=="__main__":
+
+    parser = argparse.ArgumentParser(description="Compare the explode and multi_hot rest_type encodings for accuracy and prediction speed")
+    parser.add_argument("--train", default="artifacts/train.parquet", help="Train split (parquet, feather or csv)")
+    parser.add_argument("--test", default="artifacts/test.parquet", help="Test split (parquet, feather or csv)")
+    parser.add_argument("--models", default="XGBRegressor,CatBoosting Regressor,Random Forest Regressor",
+                        help="Comma separated names of ModelTrainer().get_models() that the runtime can export")
+    parser.add_argument("--records", type=int, default=500, help="Single restaurants timed with predict_record()")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="File the results are written to as JSON")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, dict]] = benchmark(read_frame(args.train), read_frame(args.test),
+                                                    args.models.split(","), args.records, args.repeat)
+
+    for encoding, models in results.items():
+        for name, result in models.items():
+            print(f"{encoding:>9} {name:<24} r2 {result['r2']:.4f} mae {result['mae']:7.1f}  "
+                  f"{result['features']:>3} features {result['rows_per_restaurant']:.2f} rows/restaurant  "
+                  f"fit {result['fit_seconds']:6.2f}s  batch {result['batch_restaurants_per_second']:10,.0f} restaurants/s  "
+                  f"record {result['record_us']:7.1f} us")
+
+    if args.output:
+        with open(args.output, "w") as file_obj:
+            json.dump({"commit": git_commit(), "results": results}, file_obj, indent=2)
@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+
+from src.exception import CustomException
+from src.request_timing import parse_server_timing
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Root of the repository, put on the path of a launched server
+REPO_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Path of each endpoint of the serving path
+ENDPOINTS: Dict[str, str] = {"form": "/", "api": "/api/predict"}
+
+# Starts the Flask app on a local port with a thread per request
+SERVER_CODE: str = """
+import sys
+from application import app
+app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)
+"""
+
+
+class FormOptions(HTMLParser):
+    """
+    class FormOptions:
+        * options: Dict[str, List[str]]
+
+        This class reads the values offered by the select boxes and checkboxes
+        of the prediction form, e.g. options['location'].
+
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.options: Dict[str, List[str]] = {}
+        self._select: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        attributes: dict = dict(attrs)
+
+        if tag == "select":
+            self._select = attributes.get("name")
+        elif tag == "option" and self._select and attributes.get("value"):
+            self.options.setdefault(self._select, []).append(attributes["value"])
+        elif tag == "input" and attributes.get("type") == "checkbox":
+            self.options.setdefault(attributes["name"], []).append(attributes["value"])
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "select":
+            self._select = None
+
+
+def read_form_options(template_path: str) -> Dict[str, List[str]]:
+    """
+    This function returns the options of every field of the form template.
+
+    """
+    parser = FormOptions()
+    with open(template_path, encoding="utf-8") as file_obj:
+        parser.feed(file_obj.read())
+
+    return parser.options
+
+
+def generate_requests(options: Dict[str, List[str]], n_requests: int, repeat_fraction: float, seed: int = 42) -> List[dict]:
+    """
+    This function draws n_requests restaurants from the form options, with the
+    rate and votes in the ranges of the form. A repeat_fraction of them repeat
+    an earlier restaurant, as returning users do, and hit the prediction cache.
+
+    """
+    rng = random.Random(seed)
+
+    records: List[dict] = []
+    for _ in range(n_requests):
+        if records and rng.random() < repeat_fraction:
+            records.append(rng.choice(records))
+            continue
+
+        records.append({
+            "book": rng.choice(options["book"]),
+            "delivery": rng.choice(options["delivery"]),
+            "rate": round(rng.uniform(0.0, 5.0), 1),
+            "votes": rng.randint(0, 17000),
+            "location": rng.choice(options["location"]),
+            "type_tag": rng.sample(options["type_tag"], rng.choice([1, 1, 1, 2, 3])),
+            "r_type": rng.choice(options["r_type"])
+        })
+
+    return records
+
+
+def read_requests(file_path: str) -> List[dict]:
+    """
+    This function reads a recorded request mix, one JSON restaurant per line.
+
+    """
+    with open(file_path, encoding="utf-8") as file_obj:
+        return [json.loads(line) for line in file_obj if line.strip()]
+
+
+def flask_sender(endpoint: str) -> Callable[[dict], Tuple[int, str]]:
+    """
+    This function returns a function sending a restaurant to the Flask app in
+    process through its test client, one client per thread, and returning the
+    status and the Server-Timing header of the response.
+
+    """
+    from application import app
+
+    local: threading.local = threading.local()
+
+    def send(record: dict) -> Tuple[int, str]:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+
+        if endpoint == "form":
+            response = local.client.post(ENDPOINTS[endpoint], data=record)
+        else:
+            response = local.client.post(ENDPOINTS[endpoint], json=record)
+
+        return response.status_code, response.headers.get("Server-Timing", "")
+
+    return send
+
+
+def http_sender(url: str, endpoint: str) -> Callable[[dict], Tuple[int, str]]:
+    """
+    This function returns a function sending a restaurant to a server over
+    HTTP and returning the status and the Server-Timing header of the response.
+
+    """
+    target: str = url.rstrip("/") + ENDPOINTS[endpoint]
+
+    def send(record: dict) -> Tuple[int, str]:
+        if endpoint == "form":
+            body: bytes = urllib.parse.urlencode(record, doseq=True).encode()
+            content_type: str = "application/x-www-form-urlencoded"
+        else:
+            body = json.dumps(record).encode()
+            content_type = "application/json"
+
+        request = urllib.request.Request(target, data=body, headers={"Content-Type": content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get("Server-Timing", "")
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get("Server-Timing", "")
+
+    return send
+
+
+def launch_server(port: int, app_dir: str, timeout: float = 60.0) -> subprocess.Popen:
+    """
+    This function starts application.py on a local port from app_dir and waits
+    until it answers /stats.
+
+    """
+    env: dict = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    server = subprocess.Popen([sys.executable, "-c", SERVER_CODE, str(port)], cwd=app_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline: float = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError(f"Server did not answer within {timeout} seconds")
+
+
+def run_level(send: Callable[[dict], Tuple[int, str]], records: List[dict], concurrency: int) -> dict:
+    """
+    This function sends every record from concurrency threads and returns the
+    latency percentiles in milliseconds, the throughput, the number of errors
+    and the mean time per request of every Server-Timing stage in milliseconds,
+    counting requests that skip a stage (e.g. cache hits) as zero.
+
+    * latencies: Seconds from sending to reading every response
+    * stages: Seconds of every stage of every response
+
+    """
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: List[int] = []
+
+    def timed_send(record: dict) -> None:
+        start: float = time.perf_counter()
+        status, header = send(record)
+        latencies.append(time.perf_counter() - start)
+
+        if status != 200:
+            errors.append(status)
+        for stage, seconds in parse_server_timing(header).items():
+            stages.setdefault(stage, []).append(seconds)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        start: float = time.perf_counter()
+        list(clients.map(timed_send, records))
+        seconds: float = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(errors),
+        "seconds": seconds,
+        "requests_per_second": len(records) / seconds,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "max_ms": max(latencies) * 1000,
+        "stages_ms": {stage: sum(values) / len(records) * 1000 for stage, values in stages.items()}
+    }
+
+
+def benchmark(send: Callable[[dict], Tuple[int, str]], mixes: List[Tuple[int, List[dict]]], warmup: List[dict]) -> List[dict]:
+    """
+    This function sends the request mix of every (concurrency, records) level,
+    after warmup requests that load the model on the server.
+
+    """
+    try:
+        for record in warmup:
+            status, _ = send(record)
+            if status != 200:
+                raise RuntimeError(f"Warmup request failed with status {status}: {record}")
+
+        return [run_level(send, records, concurrency) for concurrency, records in mixes]
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def git_commit() -> Optional[str]:
+    """
+    This function returns the commit of the repository benchmarked, if known.
+
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__=="__main__":
+
+    parser = argparse.ArgumentParser(description="Load test the serving path and report latency percentiles, throughput and a per stage breakdown")
+    parser.add_argument("--requests", help="Request mix to replay, one JSON restaurant per line. Generated from the form options when not given")
+    parser.add_argument("--n-requests", type=int, default=2000, help="Requests generated per concurrency level")
+    parser.add_argument("--repeat-fraction", type=float, default=0.3, help="Generated requests repeating an earlier one")
+    parser.add_argument("--template", default=os.path.join(REPO_DIR, "templates", "index.html"))
+    parser.add_argument("--target", choices=["flask", "http"], default="flask",
+                        help="flask sends to the Flask test client in process, http to a server")
+    parser.add_argument("--url", default=None, help="Server to send to with --target http")
+    parser.add_argument("--launch", action="store_true", help="Start application.py locally for --target http")
+    parser.add_argument("--port", type=int, default=5055, help="Port of the launched server")
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="form")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated numbers of concurrent clients")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--output", default=None, help="File the results are written to as JSON")
+    args = parser.parse_args()
+
+    # Generated mixes are drawn again for every level, so that every level sees the same share of cache hits.
+    # A replayed mix is sent as is to every level, and its repeats hit the prediction cache from the second level on
+    concurrency_levels: List[int] = [int(n) for n in args.concurrency.split(",")]
+    if args.requests:
+        records: List[dict] = read_requests(args.requests)
+        mixes: List[Tuple[int, List[dict]]] = [(concurrency, records) for concurrency in concurrency_levels]
+        warmup: List[dict] = records[:args.warmup]
+    else:
+        options: Dict[str, List[str]] = read_form_options(args.template)
+        mixes = [(concurrency, generate_requests(options, args.n_requests, args.repeat_fraction, seed=i))
+                 for i, concurrency in enumerate(concurrency_levels, start=1)]
+        warmup = generate_requests(options, args.warmup, 0.0, seed=0)
+
+    server: Optional[subprocess.Popen] = None
+    if args.target == "flask":
+        send = flask_sender(args.endpoint)
+    else:
+        if args.launch:
+            server = launch_server(args.port, os.getcwd())
+            args.url = f"http://127.0.0.1:{args.port}"
+        if not args.url:
+            parser.error("--target http needs --url or --launch")
+        send = http_sender(args.url, args.endpoint)
+
+    try:
+        levels: List[dict] = benchmark(send, mixes, warmup)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{len(mixes[0][1])} requests per level to the {args.endpoint} endpoint of {args.url or 'the Flask test client'}")
+    for level in levels:
+        stages: str = " ".join(f"{stage}={ms:.2f}" for stage, ms in level["stages_ms"].items())
+        print(f"{level['concurrency']:>4} clients: {level['requests_per_second']:8.1f} req/s "
+              f"p50 {level['p50_ms']:7.2f} p95 {level['p95_ms']:7.2f} p99 {level['p99_ms']:7.2f} ms "
+              f"errors {level['errors']}  [{stages}]")
+
+    if args.output:
+        with open(args.output, "w") as file_obj:
+            json.dump({
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "target": args.target,
+                "url": args.url,
+                "endpoint": args.endpoint,
+                "requests": args.requests,
+                "levels": levels
+            }, file_obj, indent=2)
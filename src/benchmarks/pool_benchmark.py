@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.exception import CustomException
+from src.components.artifact_store import read_frame
+from src.pipelines.predict_pipeline import PredictPipeline
+from src.pipelines.inference_pool import InferencePool, InferencePoolConfig
+
+from typing import Dict, List
+
+
+def make_batches(df: pd.DataFrame, batch_size: int, n_batches: int) -> List[pd.DataFrame]:
+    """
+    This function cuts n_batches batches of batch_size restaurants out of df,
+    cycling through it when it is too short.
+
+    """
+    positions: np.ndarray = np.arange(batch_size * n_batches) % len(df)
+
+    return [df.iloc[positions[i * batch_size:(i + 1) * batch_size]].reset_index(drop=True)
+            for i in range(n_batches)]
+
+
+def benchmark(batches: List[pd.DataFrame], worker_counts: List[int], clients: int) -> Dict[int, dict]:
+    """
+    This function predicts the batches from clients concurrent threads with
+    every number of worker processes, 0 being PredictPipeline in process, and
+    returns the wall time and row throughput of each. The predictions of every
+    pool are checked against the in-process ones first.
+
+    * expected: In-process predictions of the first batch
+
+    """
+    try:
+        expected: pd.Series = PredictPipeline().predict_batch(batches[0])
+        n_rows: int = sum(len(batch) for batch in batches)
+
+        results: Dict[int, dict] = {}
+        for n_workers in worker_counts:
+            pipeline = InferencePool(InferencePoolConfig(n_workers=n_workers))
+
+            # Starting the workers and checking them before timing
+            np.testing.assert_allclose(pipeline.predict_batch(batches[0]), expected)
+
+            with ThreadPoolExecutor(max_workers=clients) as clients_pool:
+                start: float = time.perf_counter()
+                list(clients_pool.map(pipeline.predict_batch, batches))
+                seconds: float = time.perf_counter() - start
+
+            pipeline.stop()
+
+            results[n_workers] = {
+                "seconds": seconds,
+                "rows_per_second": n_rows / seconds
+            }
+
+        for n_workers in results:
+            results[n_workers]["speedup"] = results[n_workers]["rows_per_second"] / results[worker_counts[0]]["rows_per_second"]
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+if __name__=="__main__":
+
+    cores: int = os.cpu_count() or 1
+
+    parser = argparse.ArgumentParser(description="Measure InferencePool throughput against the number of worker processes")
+    parser.add_argument("--input", default="artifacts/test.parquet", help="Restaurants to predict (parquet, feather or csv)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({0, 1, 2, cores // 2, cores})),
+                        help="Comma separated worker counts, 0 predicts in process")
+    parser.add_argument("--clients", type=int, default=2 * cores, help="Threads sending batches concurrently")
+    args = parser.parse_args()
+
+    data: pd.DataFrame = read_frame(args.input)
+    data = data[data['rest_type'].notna()]
+
+    worker_counts: List[int] = sorted({int(n) for n in args.workers.split(",")})
+    results: Dict[int, dict] = benchmark(make_batches(data, args.batch_size, args.batches), worker_counts, args.clients)
+
+    print(f"{cores} cores, {args.batches} batches of {args.batch_size} rows, {args.clients} clients")
+    for n_workers, result in results.items():
+        print(f"{n_workers:>3} workers: {result['seconds']:8.2f} s {result['rows_per_second']:12,.0f} rows/s  x{result['speedup']:.2f}")
@@ -0,0 +1,115 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.components.artifact_store import read_frame
+from src.components.transformation_components.transformation_functions import Transformation_functions
+
+from typing import Callable, Dict, List
+
+
+# Columns kept by the Feature_Selection step
+SELECT_COLUMNS: List[str] = ['online_order',
+                             'book_table',
+                             'rate',
+                             'votes',
+                             'location',
+                             'rest_type',
+                             'approx_cost(for two people)',
+                             'listed_in(type)']
+
+
+class Legacy_Transformation_functions:
+    """
+    Row-wise apply() implementations that Transformation_functions used before
+    it was vectorized. They are kept only as the baseline of this benchmark.
+    """
+    def preprocess(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df[df['approx_cost(for two people)'].notna()]
+        df = df[df['rest_type'].notna()]
+        df['rest_type'] = df['rest_type'].apply(lambda x: str(x).split(', '))
+        df = df.explode('rest_type')
+        df.drop_duplicates(inplace=True)
+        return df
+
+    def prep_rate(self, df: pd.DataFrame) -> pd.DataFrame:
+        df['rate'] = df['rate'].replace(['NEW', '-', np.nan], 0.0)
+        df['rate'] = df['rate'].apply(lambda x: float(str(x)[:3]))
+        return df
+
+    def X_y_split(self, df: pd.DataFrame) -> pd.DataFrame:
+        X: pd.DataFrame = df.drop('approx_cost(for two people)', axis=1)
+        y: pd.Series = df['approx_cost(for two people)']
+        y = y.apply(lambda x: float(str(x).replace(',','')))
+        return X, y
+
+
+def run_chain(functions, df: pd.DataFrame):
+    """
+    This function runs preprocess(), prep_rate() and X_y_split() like the
+    preprocessor pipeline does.
+
+    """
+    return functions.X_y_split(functions.prep_rate(functions.preprocess(df)))
+
+
+def benchmark(df: pd.DataFrame, repeat: int = 5) -> Dict[str, dict]:
+    """
+    This function checks that every implementation gives the legacy output and
+    returns the best wall time and row throughput of each.
+
+    * implementations: Implementations to compare, by name
+    * expected_X, expected_y: Output of the legacy implementation
+
+    """
+    try:
+        implementations: Dict[str, Callable] = {
+            "legacy_apply": lambda: run_chain(Legacy_Transformation_functions(), df.copy()),
+            "vectorized": lambda: run_chain(Transformation_functions(copy=True), df.copy()),
+            "vectorized_no_copy": lambda: run_chain(Transformation_functions(copy=False), df.copy())
+        }
+
+        expected_X, expected_y = implementations["legacy_apply"]()
+
+        results: Dict[str, dict] = {}
+        for name, implementation in implementations.items():
+            X, y = implementation()
+            pd.testing.assert_frame_equal(X, expected_X)
+            pd.testing.assert_series_equal(y, expected_y)
+
+            timings: List[float] = []
+            for _ in range(repeat):
+                start: float = time.perf_counter()
+                implementation()
+                timings.append(time.perf_counter() - start)
+
+            results[name] = {
+                "best_seconds": min(timings),
+                "rows_per_second": len(df) / min(timings)
+            }
+
+        for name in results:
+            results[name]["speedup"] = results["legacy_apply"]["best_seconds"] / results[name]["best_seconds"]
+
+        return results
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+if __name__=="__main__":
+
+    parser = argparse.ArgumentParser(description="Compare row-wise and vectorized Transformation_functions")
+    parser.add_argument("--input", default="artifacts/data.parquet", help="Raw Zomato data (parquet, feather or csv)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data: pd.DataFrame = read_frame(args.input, columns=SELECT_COLUMNS)[SELECT_COLUMNS]
+
+    for name, result in benchmark(data, repeat=args.repeat).items():
+        print(f"{name:>20}: {result['best_seconds']*1000:9.1f} ms "
+              f"{result['rows_per_second']:12,.0f} rows/s  x{result['speedup']:.1f}")
@@ -0,0 +1,277 @@
+import os
+import sys
+import logging
+
+import pandas as pd
+
+from src.exception import CustomException
+
+from typing import Dict, List, Optional, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+# Low cardinality text columns of the Zomato dataset, stored as categoricals
+CATEGORICAL_COLUMNS: List[str] = ['online_order',
+                                  'book_table',
+                                  'location',
+                                  'rest_type',
+                                  'listed_in(type)',
+                                  'listed_in(city)']
+
+
+class CsvSink:
+    """
+    class CsvSink:
+        * write(df: pd.DataFrame) -> None
+        * close() -> None
+
+        This class appends DataFrame chunks to an open CSV file, with the header
+        written once.
+
+    """
+    def __init__(self, path: str) -> None:
+        self.file_obj = open(path, 'w', newline='')
+        self.header: bool = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        df.to_csv(self.file_obj, index=False, header=self.header)
+        self.header = False
+
+    def close(self) -> None:
+        self.file_obj.close()
+
+
+class CsvStore:
+    """
+    class CsvStore:
+        * write(df: pd.DataFrame, path: str) -> None
+        * read(path: str, columns: List[str] = None) -> pd.DataFrame
+        * open_sink(path: str, df: pd.DataFrame) -> CsvSink
+
+        This class stores DataFrames as CSV. Categorical dtypes are not kept in
+        the file, so they are passed to pd.read_csv() explicitly.
+
+    """
+    extension: str = 'csv'
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.to_csv(path, index=False)
+
+    def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.read_csv(path,
+                           usecols=columns,
+                           dtype={column: 'category' for column in CATEGORICAL_COLUMNS})
+
+    def open_sink(self, path: str, df: pd.DataFrame) -> CsvSink:
+        return CsvSink(path)
+
+
+class ArrowSink:
+    """
+    class ArrowSink:
+        * write(df: pd.DataFrame) -> None
+        * close() -> None
+
+        This class converts DataFrame chunks to Arrow tables of a fixed schema
+        and hands them to a pyarrow Parquet or IPC (Feather) writer.
+
+    """
+    def __init__(self, writer, schema) -> None:
+        self.writer = writer
+        self.schema = schema
+
+    def write(self, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        self.writer.write_table(pa.Table.from_pandas(df, preserve_index=False).cast(self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def arrow_schema(df: pd.DataFrame, dictionaries: bool = True):
+    """
+    This function returns the Arrow schema used to write every chunk shaped like
+    df. Text columns that are empty in df are typed as strings instead of nulls,
+    and categoricals get int32 codes so that later chunks with more categories
+    still fit, or are stored as plain strings when dictionaries is False.
+
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    fields: list = []
+    for arrow_field in schema:
+        arrow_type = arrow_field.type
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = pa.dictionary(pa.int32(), pa.string()) if dictionaries else pa.string()
+        elif pa.types.is_null(arrow_type):
+            arrow_type = pa.string()
+        fields.append(pa.field(arrow_field.name, arrow_type))
+
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+class ParquetStore:
+    """
+    class ParquetStore:
+        * write(df: pd.DataFrame, path: str) -> None
+        * read(path: str, columns: List[str] = None) -> pd.DataFrame
+        * open_sink(path: str, df: pd.DataFrame) -> ArrowSink
+
+        This class stores DataFrames as Parquet with pyarrow. Dtypes, including
+        categoricals, are kept in the file and the file is memory-mapped on read.
+
+    """
+    extension: str = 'parquet'
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.to_parquet(path, engine='pyarrow', index=False)
+
+    def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.read_parquet(path, engine='pyarrow', columns=columns, memory_map=True)
+
+    def open_sink(self, path: str, df: pd.DataFrame) -> ArrowSink:
+        from pyarrow import parquet
+
+        schema = arrow_schema(df)
+        return ArrowSink(parquet.ParquetWriter(path, schema), schema)
+
+
+class FeatherStore:
+    """
+    class FeatherStore:
+        * write(df: pd.DataFrame, path: str) -> None
+        * read(path: str, columns: List[str] = None) -> pd.DataFrame
+        * open_sink(path: str, df: pd.DataFrame) -> ArrowSink
+
+        This class stores DataFrames as uncompressed Feather (Arrow IPC). Dtypes
+        are kept in the file and, being uncompressed, the file is read through a
+        memory map without copying it into a buffer first. An IPC file holds a
+        single dictionary per column, so chunked writes store categoricals as
+        strings and read_frame() converts them back.
+
+    """
+    extension: str = 'feather'
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.reset_index(drop=True).to_feather(path, compression='uncompressed')
+
+    def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        from pyarrow import feather
+
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    def open_sink(self, path: str, df: pd.DataFrame) -> ArrowSink:
+        from pyarrow import ipc
+
+        schema = arrow_schema(df, dictionaries=False)
+        return ArrowSink(ipc.new_file(path, schema), schema)
+
+
+# Stores by format name, new formats are added here
+ARTIFACT_STORES: Dict[str, Type] = {
+    store.extension: store for store in (CsvStore, ParquetStore, FeatherStore)
+}
+
+
+def get_artifact_store(artifact_format: str):
+    """
+    This function returns the store of a format ('csv', 'parquet' or 'feather').
+
+    """
+    try:
+        return ARTIFACT_STORES[artifact_format]()
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def with_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function returns df with CATEGORICAL_COLUMNS converted to categoricals.
+
+    """
+    return df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns})
+
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    """
+    This function writes df with explicit dtypes in the format given by the
+    extension of path.
+
+    """
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        store = get_artifact_store(os.path.splitext(path)[1].lstrip('.'))
+        store.write(with_dtypes(df), path)
+
+        logger.info(f"{len(df)} rows written to {path}")
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def read_frame(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    This function reads a DataFrame in the format given by the extension of
+    path, optionally only some of its columns.
+
+    """
+    try:
+        store = get_artifact_store(os.path.splitext(path)[1].lstrip('.'))
+
+        return with_dtypes(store.read(path, columns=columns))
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+class FrameWriter:
+    """
+    class FrameWriter:
+        * __init__(path: str) -> None
+        * write(df: pd.DataFrame) -> None
+        * close() -> None
+
+        This class writes a DataFrame chunk by chunk in the format given by the
+        extension of path, so that a dataset larger than memory can be stored
+        without holding it whole. The sink is opened with the columns and dtypes
+        of the first chunk, which may be empty.
+
+        * rows: Number of rows written so far
+
+    """
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.store = get_artifact_store(os.path.splitext(path)[1].lstrip('.'))
+        self.rows: int = 0
+        self._sink = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        try:
+            df = with_dtypes(df)
+            if self._sink is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._sink = self.store.open_sink(self.path, df)
+
+            self._sink.write(df)
+            self.rows += len(df)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def close(self) -> None:
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+            logger.info(f"{self.rows} rows written to {self.path}")
+
+    def __enter__(self) -> 'FrameWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
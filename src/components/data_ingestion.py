@@ -1,91 +1,248 @@
-import os 
-import sys
-
-import pandas as pd
-from sklearn.model_selection import train_test_split
-
-from dataclasses import dataclass
-
-from src.exception import CustomException
-from src.logger import logging
-
-from src.components.data_transformation import DataTransformation
-from src.components.model_trainer import ModelTrainer
-
-from typing import Type, Tuple
-
-@dataclass
-class DataIngestionConfig:
-    """
-    Class DataIngestionConfig initializes the path of train data, test data and original dataset.
-
-        * train_data_path: Path of train dataset
-        * test_data_path: Path of test dataset
-        * raw_data_path: Path of original dataset
-
-    """
-    # Initializing paths for datasets
-    train_data_path: str = os.path.join('artifacts', 'train.csv')
-    test_data_path: str = os.path.join('artifacts', 'test.csv')
-    raw_data_path: str = os.path.join('artifacts', 'data.csv')
-
-
-class DataIngestion:
-    """
-    class DataIngestion
-        * __init__() -> None
-        * intiate_data_ingestion() -> Tuple[str, str]
-
-        This class is used for implementing data ingestion, it inherits from class DataIngestionConfig.
-        The intiate_data_ingestion() imports the CSV dataset from its locations using pandas library, 
-        splits it into train and test datasets and store them in artifacts folder.
-
-    """
-    def __init__(self) -> None:
-        self.ingestion_config: Type[DataIngestionConfig] = DataIngestionConfig()
-    
-    def intiate_data_ingestion(self) -> Tuple[str, str]:
-        """
-        This function implements data ingestion. The CSV dataset is import using pandas library. The 
-        dataset is then split into train and test data, further the raw, train and test datasets are 
-        stored in the artifacts folder and file paths to train and test datasets are returned as 
-        outputs.
-
-        * df: Original dataset
-        * train: Training dataset
-        * test: Test dataset
-
-        """
-        logging.info("Data ingestion has begun")
-        try:
-            # Importing dataset using pandas
-            df: pd.DataFrame = pd.read_csv('notebook\data\zomato.csv')
-            logging.info("Dataset imported")
-
-            # Creating directory
-            os.makedirs(os.path.dirname(self.ingestion_config.train_data_path), exist_ok=True)
-
-            # Splitting dataset into test and train
-            logging.info("train_test_split initiated")
-            train: pd.DataFrame; test: pd.DataFrame
-            train, test = train_test_split(df, test_size=0.2, random_state=9)
-
-            # Saving raw, train and test datasets as csv
-            df.to_csv(self.ingestion_config.raw_data_path, index = False)
-            logging.info("Raw data saved as csv")
-            
-            train.to_csv(self.ingestion_config.train_data_path, index = False)
-            logging.info("Train data saved as csv")
-
-            test.to_csv(self.ingestion_config.test_data_path, index = False)
-            logging.info("Test data saved as csv")
-
-            logging.info("Data ingestion complete")  
-
-            return(
-                self.ingestion_config.train_data_path,
-                self.ingestion_config.test_data_path
-            )      
-       
-        except Exception as e:
-            raise CustomException(e, sys)
+import os 
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.components.artifact_store import FrameWriter, get_artifact_store, read_frame, write_frame
+from src.profiler import profiled
+from src.components.transformation_components.column_transformers import Column_Transformers
+
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+
+from typing import Dict, List, Optional, Type, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# dtypes of the source columns read by streaming ingestion, other columns are read as str.
+# votes is read as int64, the dtype pd.read_csv() infers for it in intiate_data_ingestion()
+SOURCE_DTYPES: Dict[str, object] = {'votes': 'int64'}
+
+@dataclass
+class DataIngestionConfig:
+    """
+    Class DataIngestionConfig initializes the path of train data, test data and original dataset.
+
+        * source_data_path: Path of the Zomato CSV dump
+        * artifact_format: Format of the stored datasets ('parquet', 'feather' or 'csv')
+        * streaming: Read the dump in chunks and split rows by hash instead of train_test_split()
+        * chunksize: Rows per chunk when streaming
+        * test_size: Share of rows put in the test dataset
+        * split_seed: Seed of the train/test split
+        * train_data_path: Path of train dataset
+        * test_data_path: Path of test dataset
+        * raw_data_path: Path of original dataset
+        * incremental_data_path: Path of the listings added by IncrementalTrainer,
+          which ingestion appends to the train dataset
+
+    """
+    source_data_path: str = os.path.join('notebook', 'data', 'zomato.csv')
+    artifact_format: str = 'parquet'
+
+    # Streaming ingestion for dumps larger than memory
+    streaming: bool = False
+    chunksize: int = 50_000
+    test_size: float = 0.2
+    split_seed: int = 9
+
+    # Initializing paths for datasets, their extension follows artifact_format
+    train_data_path: Optional[str] = None
+    test_data_path: Optional[str] = None
+    raw_data_path: Optional[str] = None
+    incremental_data_path: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        extension: str = get_artifact_store(self.artifact_format).extension
+        self.train_data_path = self.train_data_path or os.path.join('artifacts', f'train.{extension}')
+        self.test_data_path = self.test_data_path or os.path.join('artifacts', f'test.{extension}')
+        self.raw_data_path = self.raw_data_path or os.path.join('artifacts', f'data.{extension}')
+        self.incremental_data_path = self.incremental_data_path or os.path.join('artifacts', 'incremental',
+                                                                                f'rows.{extension}')
+
+
+class DataIngestion:
+    """
+    class DataIngestion
+        * __init__() -> None
+        * intiate_data_ingestion() -> Tuple[str, str]
+        * stream_data_ingestion() -> Tuple[str, str]
+        * incremental_rows(columns: List[str] = None) -> Optional[pd.DataFrame]
+
+        This class is used for implementing data ingestion, it inherits from class DataIngestionConfig.
+        The intiate_data_ingestion() imports the CSV dataset from its locations using pandas library, 
+        splits it into train and test datasets and store them in artifacts folder. With streaming set
+        in the config it hands over to stream_data_ingestion(), which does the same chunk by chunk.
+        Listings added by IncrementalTrainer are appended to the train dataset by both.
+
+    """
+    def __init__(self) -> None:
+        self.ingestion_config: Type[DataIngestionConfig] = DataIngestionConfig()
+    
+    def intiate_data_ingestion(self) -> Tuple[str, str]:
+        """
+        This function implements data ingestion. The CSV dataset is import using pandas library. The 
+        dataset is then split into train and test data, further the raw, train and test datasets are 
+        stored in the artifacts folder and file paths to train and test datasets are returned as 
+        outputs.
+
+        * df: Original dataset
+        * train: Training dataset, with the incremental listings
+        * test: Test dataset
+
+        """
+        if self.ingestion_config.streaming:
+            return self.stream_data_ingestion()
+
+        logger.info("Data ingestion has begun")
+        try:
+            # Importing dataset using pandas
+            with profiled("read_csv"):
+                df: pd.DataFrame = pd.read_csv(self.ingestion_config.source_data_path)
+            logger.info("Dataset imported")
+
+            # Creating directory
+            os.makedirs(os.path.dirname(self.ingestion_config.train_data_path), exist_ok=True)
+
+            # Splitting dataset into test and train
+            logger.info("train_test_split initiated")
+            train: pd.DataFrame; test: pd.DataFrame
+            with profiled("train_test_split"):
+                train, test = train_test_split(df,
+                                               test_size=self.ingestion_config.test_size,
+                                               random_state=self.ingestion_config.split_seed)
+
+            # Adding the listings of incremental training to the train dataset
+            incremental_df: Optional[pd.DataFrame] = self.incremental_rows()
+            if incremental_df is not None:
+                train = pd.concat([train, incremental_df.reindex(columns=train.columns)], ignore_index=True)
+                logger.info(f"{len(incremental_df)} incremental rows added to train data")
+
+            # Saving raw, train and test datasets with explicit dtypes
+            with profiled("write:raw"):
+                write_frame(df, self.ingestion_config.raw_data_path)
+            logger.info("Raw data saved")
+            
+            with profiled("write:train"):
+                write_frame(train, self.ingestion_config.train_data_path)
+            logger.info("Train data saved")
+
+            with profiled("write:test"):
+                write_frame(test, self.ingestion_config.test_data_path)
+            logger.info("Test data saved")
+
+            logger.info("Data ingestion complete")  
+
+            return(
+                self.ingestion_config.train_data_path,
+                self.ingestion_config.test_data_path
+            )      
+       
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def source_columns() -> List[str]:
+        """
+        This function returns the columns kept by select_trf, the only ones the
+        preprocessor reads from the dump.
+
+        """
+        select_trf = Column_Transformers().get_transformers()[0]
+
+        return list(select_trf.transformers[0][2])
+
+    def incremental_rows(self, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        This function returns the listings IncrementalTrainer added since the
+        dump was taken, or None when there are none. They always go to the
+        train dataset, where the incremental updates put them.
+
+        """
+        if not os.path.exists(self.ingestion_config.incremental_data_path):
+            return None
+
+        incremental_df: pd.DataFrame = read_frame(self.ingestion_config.incremental_data_path)
+        # Categoricals of different categories concatenate as object, write_frame() restores them
+        incremental_df = incremental_df.astype(
+            {column: object for column in incremental_df.select_dtypes('category').columns})
+
+        return incremental_df if columns is None else incremental_df.reindex(columns=columns)
+
+    def hash_split(self, chunk: pd.DataFrame) -> np.ndarray:
+        """
+        This function returns a boolean mask of the rows of chunk that belong to
+        the test dataset. A row is assigned by the hash of its values, so the
+        split does not depend on chunk boundaries or row order and identical
+        rows always land in the same dataset.
+
+        * buckets: Hash of every row reduced to 0-9999
+
+        """
+        hash_key: str = f"{self.ingestion_config.split_seed:016d}"[-16:]
+        buckets: np.ndarray = pd.util.hash_pandas_object(chunk, index=False, hash_key=hash_key).to_numpy() % 10_000
+
+        return buckets < self.ingestion_config.test_size * 10_000
+
+    def stream_data_ingestion(self) -> Tuple[str, str]:
+        """
+        This function implements data ingestion for dumps larger than memory. Only
+        the columns of source_columns() are read, with explicit dtypes, chunksize
+        rows at a time. Every chunk is split with hash_split() and appended to the
+        raw, train and test datasets, so peak memory is set by chunksize and not by
+        the size of the dump.
+
+        * columns: Columns read from the dump
+        * chunk: Rows of the dump being processed
+        * is_test: Mask of the rows of chunk that go to the test dataset
+
+        """
+        logger.info("Streaming data ingestion has begun")
+        try:
+            columns: List[str] = self.source_columns()
+            dtypes: Dict[str, object] = {column: SOURCE_DTYPES.get(column, str) for column in columns}
+
+            chunks = pd.read_csv(self.ingestion_config.source_data_path,
+                                 usecols=columns,
+                                 dtype=dtypes,
+                                 chunksize=self.ingestion_config.chunksize)
+
+            with FrameWriter(self.ingestion_config.raw_data_path) as raw_writer, \
+                 FrameWriter(self.ingestion_config.train_data_path) as train_writer, \
+                 FrameWriter(self.ingestion_config.test_data_path) as test_writer:
+
+                for i, chunk in enumerate(chunks):
+                    # Keeping the column order of the dump
+                    chunk = chunk[columns]
+
+                    # Splitting chunk into test and train by row hash
+                    is_test: np.ndarray = self.hash_split(chunk)
+
+                    raw_writer.write(chunk)
+                    train_writer.write(chunk[~is_test])
+                    test_writer.write(chunk[is_test])
+
+                    logger.info(f"Chunk {i} ingested: {len(chunk)} rows, {int(is_test.sum())} to test")
+
+                # Adding the listings of incremental training to the train dataset
+                incremental_df: Optional[pd.DataFrame] = self.incremental_rows(columns)
+                if incremental_df is not None:
+                    train_writer.write(incremental_df)
+                    logger.info(f"{len(incremental_df)} incremental rows added to train data")
+
+            logger.info(f"Streaming data ingestion complete: {train_writer.rows} train rows, {test_writer.rows} test rows")
+
+            return(
+                self.ingestion_config.train_data_path,
+                self.ingestion_config.test_data_path
+            )
+
+        except Exception as e:
+            raise CustomException(e, sys)
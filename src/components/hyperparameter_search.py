@@ -0,0 +1,434 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.utils import limit_model_threads
+from src.profiler import record_stage
+
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+
+from typing import Dict, List, Optional, Tuple, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+# Parameter holding the number of boosting rounds, by library
+BOOSTING_ROUNDS: Dict[str, str] = {"xgboost": "n_estimators", "catboost": "iterations"}
+
+
+@dataclass
+class HyperparameterSearchConfig:
+    """
+    class HyperparameterSearchConfig is used to initialize the hyperparameter
+    search of ModelTrainer.
+
+    * n_trials: Configurations tried per model, the first one being its defaults
+    * n_folds: Folds of the cross-validation scoring every configuration
+    * time_budget: Seconds after which no more folds are started, None for no limit
+    * n_jobs: Folds trained at the same time in a process pool, -1 uses every core
+    * early_stopping_rounds: Rounds without improvement of the eval set after which
+      XGBoost and CatBoost stop
+    * max_boosting_rounds: Most rounds a boosting model trains for during the search
+    * eval_fraction: Share of the training rows of a fold held out as eval set for early stopping
+    * cache_dir: Directory of the fold results, one JSON file per fold, so an
+      interrupted search resumes where it stopped
+    * report_path: Path of the JSON report of the search
+    * random_state: Seed of the sampled configurations and of the folds
+
+    """
+    n_trials: int = 8
+    n_folds: int = 3
+    time_budget: Optional[float] = 600.0
+    n_jobs: int = -1
+    early_stopping_rounds: int = 50
+    max_boosting_rounds: int = 2000
+    eval_fraction: float = 0.1
+    cache_dir: str = os.path.join('artifacts', 'cache', 'search')
+    report_path: str = os.path.join('artifacts', 'search.json')
+    random_state: int = 9
+
+
+def boosting_library(model) -> Optional[str]:
+    """
+    This function returns "xgboost" or "catboost" for models that can stop
+    early on an eval set, and None for every other model.
+
+    """
+    library: str = type(model).__module__.split(".")[0]
+
+    return library if library in BOOSTING_ROUNDS else None
+
+
+def data_fingerprint(X: pd.DataFrame, y: pd.Series) -> str:
+    """
+    This function returns the sha256 of the columns and values of X and y.
+
+    """
+    sha256 = hashlib.sha256()
+    sha256.update(json.dumps([str(column) for column in X.columns]).encode())
+    sha256.update(np.ascontiguousarray(X.to_numpy(dtype=np.float64)).tobytes())
+    sha256.update(np.ascontiguousarray(np.asarray(y, dtype=np.float64)).tobytes())
+
+    return sha256.hexdigest()
+
+
+def fit_fold(model,
+             X: pd.DataFrame,
+             y: pd.Series,
+             train_index: np.ndarray,
+             val_index: np.ndarray,
+             early_stopping_rounds: int,
+             eval_fraction: float,
+             random_state: int,
+             n_threads: Optional[int] = None) -> dict:
+    """
+    This function trains an unfitted model on the training rows of a fold and
+    returns its r2 score on the validation rows, its wall and CPU time and,
+    for XGBoost and CatBoost, the number of rounds it kept. Boosting models
+    hold out eval_fraction of the training rows as eval set and stop once it
+    has not improved for early_stopping_rounds rounds, so a poor configuration
+    costs few rounds and the validation rows stay unseen.
+
+    """
+    # Training only, kept out of the imports of the web process
+    from sklearn.metrics import r2_score
+    from threadpoolctl import threadpool_limits
+
+    library: Optional[str] = boosting_library(model)
+
+    with threadpool_limits(limits=n_threads):
+        if n_threads is not None:
+            limit_model_threads(model, n_threads)
+
+        cpu_start: float = time.process_time()
+        start: float = time.perf_counter()
+
+        X_fit, y_fit = X.iloc[train_index], y.iloc[train_index]
+        rounds: Optional[int] = None
+
+        if library is None:
+            model.fit(X_fit, y_fit)
+        else:
+            # Holding out the eval set from the training rows of the fold
+            order: np.ndarray = np.random.RandomState(random_state).permutation(len(train_index))
+            n_eval: int = max(1, int(len(order) * eval_fraction))
+            X_eval, y_eval = X_fit.iloc[order[:n_eval]], y_fit.iloc[order[:n_eval]]
+            X_fit, y_fit = X_fit.iloc[order[n_eval:]], y_fit.iloc[order[n_eval:]]
+
+            if library == "xgboost":
+                model.set_params(early_stopping_rounds=early_stopping_rounds)
+                model.fit(X_fit, y_fit, eval_set=[(X_eval, y_eval)], verbose=False)
+                rounds = int(model.best_iteration) + 1
+            else:
+                model.fit(X_fit, y_fit, eval_set=(X_eval, y_eval),
+                          early_stopping_rounds=early_stopping_rounds, verbose=False)
+                rounds = int(model.get_best_iteration()) + 1
+
+        score: float = r2_score(y.iloc[val_index], model.predict(X.iloc[val_index]))
+
+        wall_time: float = time.perf_counter() - start
+        cpu_time: float = time.process_time() - cpu_start
+
+    return {"r2_score": score, "rounds": rounds, "wall_time": wall_time, "cpu_time": cpu_time}
+
+
+# Training data of a search worker process, sent once by init_worker()
+_worker_data: Optional[Tuple[pd.DataFrame, pd.Series]] = None
+
+
+def init_worker(X: pd.DataFrame, y: pd.Series) -> None:
+    """
+    This function is the initializer of the search worker processes. The
+    training data is sent once per worker instead of once per fold.
+
+    """
+    global _worker_data
+    _worker_data = (X, y)
+
+
+def fit_fold_in_worker(model, train_index: np.ndarray, val_index: np.ndarray, *args) -> dict:
+    """
+    This function runs fit_fold() on the training data of the worker.
+
+    """
+    X, y = _worker_data
+
+    return fit_fold(model, X, y, train_index, val_index, *args)
+
+
+class HyperparameterSearch:
+    """
+    class HyperparameterSearch:
+        * __init__(config: HyperparameterSearchConfig = None) -> None
+        * sample_trials(spaces: Dict[str, dict]) -> List[Tuple[str, dict]]
+        * search(X_train, y_train, models: dict, spaces: Dict[str, dict]) -> dict
+
+        This class searches the hyperparameters of models by cross-validation.
+        Every model gets n_trials configurations, its defaults and random draws
+        from its space, and every configuration is scored on n_folds folds of
+        the training data, never on the test split. The folds are trained in
+        parallel across processes, in round-robin order over the models, so
+        that when time_budget runs out every model has had as many trials.
+
+        Every fold result is stored in cache_dir under the sha256 of the
+        training data, the model, its parameters and the settings of the
+        fold, so a search that is interrupted or run again only trains the
+        folds it has not seen.
+
+    """
+    def __init__(self, config: Optional[HyperparameterSearchConfig] = None) -> None:
+        self.search_config: Type[HyperparameterSearchConfig] = config or HyperparameterSearchConfig()
+
+    def sample_trials(self, spaces: Dict[str, dict]) -> List[Tuple[str, dict]]:
+        """
+        This function draws the configurations of every model of spaces, a
+        dictionary of model names and {parameter: list of values}, and returns
+        them as (model name, params) in round-robin order over the models.
+
+        """
+        from sklearn.model_selection import ParameterSampler
+
+        per_model: Dict[str, List[dict]] = {}
+        for name, space in spaces.items():
+            # The defaults first, so that a search never does worse than no search
+            n_draws: int = min(self.search_config.n_trials - 1, int(np.prod([len(values) for values in space.values()])))
+            draws: List[dict] = list(ParameterSampler(space, n_iter=n_draws,
+                                                      random_state=self.search_config.random_state)) if n_draws > 0 else []
+            trials: List[dict] = [{}]
+            for params in draws:
+                if params not in trials:
+                    trials.append(params)
+            per_model[name] = trials
+
+        return [(name, per_model[name][i])
+                for i in range(max((len(trials) for trials in per_model.values()), default=0))
+                for name in per_model if i < len(per_model[name])]
+
+    def _fold_key(self, data_key: str, name: str, model, params: dict, fold: int) -> str:
+        """
+        This function returns the cache key of a fold result.
+
+        """
+        library: str = type(model).__module__.split(".")[0]
+        module = sys.modules.get(library)
+
+        return hashlib.sha256(json.dumps({
+            "data": data_key,
+            "model": name,
+            "class": f"{type(model).__module__}.{type(model).__qualname__}",
+            "version": getattr(module, "__version__", None),
+            "params": params,
+            "fold": fold,
+            "n_folds": self.search_config.n_folds,
+            "random_state": self.search_config.random_state,
+            "early_stopping_rounds": self.search_config.early_stopping_rounds,
+            "max_boosting_rounds": self.search_config.max_boosting_rounds,
+            "eval_fraction": self.search_config.eval_fraction
+        }, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _read_fold(self, key: str) -> Optional[dict]:
+        path: str = os.path.join(self.search_config.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as file_obj:
+            return json.load(file_obj)
+
+    def _write_fold(self, key: str, result: dict) -> None:
+        # Written to a temporary name and renamed, so an interrupted write is never read
+        os.makedirs(self.search_config.cache_dir, exist_ok=True)
+        path: str = os.path.join(self.search_config.cache_dir, f"{key}.json")
+        temp_path: str = f"{path}.tmp.{os.getpid()}"
+        with open(temp_path, "w") as file_obj:
+            json.dump(result, file_obj)
+        os.replace(temp_path, path)
+
+    def _trial_model(self, model, params: dict):
+        """
+        This function returns an unfitted copy of model with params, trained
+        for up to max_boosting_rounds when it stops early.
+
+        """
+        from sklearn.base import clone
+
+        trial_model = clone(model).set_params(**params)
+        library: Optional[str] = boosting_library(trial_model)
+        if library is not None:
+            trial_model.set_params(**{BOOSTING_ROUNDS[library]: self.search_config.max_boosting_rounds})
+        if "allow_writing_files" in trial_model.get_params():
+            # Parallel CatBoost fits would write to the same catboost_info directory
+            trial_model.set_params(allow_writing_files=False)
+
+        return trial_model
+
+    def search(self, X_train: pd.DataFrame, y_train: pd.Series, models: dict, spaces: Dict[str, dict]) -> dict:
+        """
+        This function searches the models of spaces and returns, for every one
+        of them, the configuration with the best mean r2 score over the folds:
+
+        * params: Parameters to set on the model, with the number of boosting
+          rounds set to the mean of the rounds kept in its folds
+        * cv_r2_score, cv_r2_std: Mean and standard deviation of its fold scores
+        * trials: Configurations of the model scored on every fold
+
+        Configurations whose folds did not all finish within time_budget are
+        left out, their finished folds stay cached for the next search.
+
+        * tasks: (trial, fold) pairs in the order they are started
+        * results: Fold results of every trial
+
+        """
+        try:
+            from sklearn.model_selection import KFold
+
+            logger.info("Hyperparameter search has begun")
+            start: float = time.perf_counter()
+            config: Type[HyperparameterSearchConfig] = self.search_config
+
+            data_key: str = data_fingerprint(X_train, y_train)
+            folds: List[Tuple[np.ndarray, np.ndarray]] = list(
+                KFold(n_splits=config.n_folds, shuffle=True, random_state=config.random_state).split(X_train))
+
+            trials: List[Tuple[str, dict]] = self.sample_trials({name: space for name, space in spaces.items()
+                                                                 if name in models})
+            tasks: List[Tuple[int, int]] = [(trial, fold) for trial in range(len(trials))
+                                            for fold in range(config.n_folds)]
+            results: Dict[int, Dict[int, dict]] = {trial: {} for trial in range(len(trials))}
+
+            fold_args: tuple = (config.early_stopping_rounds, config.eval_fraction, config.random_state)
+
+            def record(trial: int, fold: int, key: str, result: dict, worker_process: bool) -> None:
+                name: str = trials[trial][0]
+                results[trial][fold] = result
+                self._write_fold(key, result)
+                record_stage(f"trial:{name}:{trial}:fold:{fold}", wall_time=result["wall_time"],
+                             cpu_time=result["cpu_time"], worker_process=worker_process)
+                logger.info(f"{name} {trials[trial][1]} fold {fold}: r2 {result['r2_score']:.4f}")
+
+            # Folds seen by an earlier search are read back instead of trained
+            pending: List[Tuple[int, int, str]] = []
+            for trial, fold in tasks:
+                name, params = trials[trial]
+                key: str = self._fold_key(data_key, name, models[name], params, fold)
+                cached: Optional[dict] = self._read_fold(key)
+                if cached is None:
+                    pending.append((trial, fold, key))
+                else:
+                    results[trial][fold] = cached
+            n_cached: int = len(tasks) - len(pending)
+
+            def budget_left() -> bool:
+                return config.time_budget is None or time.perf_counter() - start < config.time_budget
+
+            cpu_count: int = os.cpu_count() or 1
+            n_jobs: int = cpu_count if config.n_jobs == -1 else max(1, config.n_jobs)
+
+            if n_jobs == 1:
+                for trial, fold, key in pending:
+                    if not budget_left():
+                        break
+                    name, params = trials[trial]
+                    train_index, val_index = folds[fold]
+                    record(trial, fold, key, fit_fold(self._trial_model(models[name], params), X_train, y_train,
+                                                      train_index, val_index, *fold_args), False)
+            else:
+                n_threads: int = max(1, cpu_count // n_jobs)
+
+                # At most n_jobs folds in flight, so none is started past the budget
+                with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker,
+                                         initargs=(X_train, y_train)) as executor:
+                    running: Dict[Future, Tuple[int, int, str]] = {}
+                    queue: List[Tuple[int, int, str]] = list(pending)
+
+                    while queue or running:
+                        while queue and len(running) < n_jobs and budget_left():
+                            trial, fold, key = queue.pop(0)
+                            name, params = trials[trial]
+                            train_index, val_index = folds[fold]
+                            running[executor.submit(fit_fold_in_worker, self._trial_model(models[name], params),
+                                                    train_index, val_index, *fold_args, n_threads)] = (trial, fold, key)
+                        if not budget_left():
+                            queue.clear()
+                        if not running:
+                            break
+
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            trial, fold, key = running.pop(future)
+                            record(trial, fold, key, future.result(), True)
+
+            report: dict = self._best_configurations(trials, results, models)
+
+            seconds: float = time.perf_counter() - start
+            n_trained: int = sum(len(folds_done) for folds_done in results.values()) - n_cached
+            logger.info(f"Hyperparameter search took {seconds:.1f}s, {n_trained} folds trained, {n_cached} from the cache")
+
+            self._save_report(report, trials, results, seconds, n_trained, n_cached)
+
+            return report
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _best_configurations(self, trials: List[Tuple[str, dict]], results: Dict[int, Dict[int, dict]], models: dict) -> dict:
+        """
+        This function returns the best configuration of every model among its
+        trials scored on every fold.
+
+        """
+        report: dict = {}
+        for trial, (name, params) in enumerate(trials):
+            if len(results[trial]) < self.search_config.n_folds:
+                continue
+
+            scores: List[float] = [result["r2_score"] for result in results[trial].values()]
+            cv_r2_score: float = float(np.mean(scores))
+
+            entry: dict = report.setdefault(name, {"trials": 0})
+            entry["trials"] += 1
+            if "cv_r2_score" in entry and entry["cv_r2_score"] >= cv_r2_score:
+                continue
+
+            # Training the final model for as many rounds as its folds kept
+            best_params: dict = dict(params)
+            library: Optional[str] = boosting_library(models[name])
+            if library is not None:
+                rounds: List[int] = [result["rounds"] for result in results[trial].values()]
+                best_params[BOOSTING_ROUNDS[library]] = int(round(np.mean(rounds)))
+
+            entry.update(params=best_params, cv_r2_score=cv_r2_score, cv_r2_std=float(np.std(scores)))
+
+        return report
+
+    def _save_report(self, report: dict, trials: List[Tuple[str, dict]], results: Dict[int, Dict[int, dict]],
+                     seconds: float, n_trained: int, n_cached: int) -> None:
+        """
+        This function writes the best configurations and the scores of every
+        trial as JSON.
+
+        """
+        report_path: str = self.search_config.report_path
+        os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+
+        with open(report_path, "w") as file_obj:
+            json.dump({
+                "seconds": seconds,
+                "folds_trained": n_trained,
+                "folds_cached": n_cached,
+                "best": report,
+                "trials": [{"model": name,
+                            "params": params,
+                            "folds": {str(fold): result for fold, result in sorted(results[trial].items())}}
+                           for trial, (name, params) in enumerate(trials)]
+            }, file_obj, indent=2, default=str)
+
+        logger.info(f"Hyperparameter search report saved to {report_path}")
@@ -0,0 +1,290 @@
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+
+from sklearn import config_context
+from sklearn.pipeline import Pipeline
+from sklearn.metrics import r2_score
+from catboost import CatBoostRegressor
+from xgboost import XGBRegressor
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+
+from src.exception import CustomException
+from src.utils import save_artifact, load_artifact
+from src.components.artifact_store import read_frame, write_frame
+
+from src.components.data_ingestion import DataIngestion, DataIngestionConfig
+from src.components.data_transformation import DataTransformation, DataTransformationConfig
+from src.components.model_trainer import ModelTrainer, ModelTrainerConfig
+
+from dataclasses import dataclass
+
+from typing import Optional, Type, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IncrementalTrainerConfig:
+    """
+    class IncrementalTrainerConfig is used to initialize the settings of
+    incremental retraining.
+
+    * drift_threshold: Largest drift handled incrementally, above it the
+      whole pipeline is retrained
+    * extra_estimators: Trees added to a random forest per update
+    * extra_boosting_rounds: Boosting rounds added to XGBoost/CatBoost per update
+
+    """
+    drift_threshold: float = 0.1
+    extra_estimators: int = 20
+    extra_boosting_rounds: int = 100
+
+
+class IncrementalTrainer:
+    """
+    class IncrementalTrainer:
+        * __init__() -> None
+        * measure_drift(preprocessor: Pipeline, new_df: pd.DataFrame) -> float
+        * initiate_incremental_training(new_data_path: str) -> Tuple[float, str]
+
+        This class updates the saved preprocessor and model with new listings
+        instead of retraining everything. New categories are appended to the
+        OrdinalEncoder (so existing codes do not move), the MinMaxScaler is kept
+        as fitted (so the splits of existing trees keep their meaning, new codes
+        and votes past the old range scale beyond 1) and the model continues
+        training on the new rows: XGBoost from its booster, CatBoost from init_model, random
+        forests by growing extra trees with warm_start. When the new rows drift
+        past drift_threshold, or the saved model cannot continue training, the
+        new rows are appended to the train split and the pipeline is retrained
+        from scratch.
+
+    """
+    def __init__(self) -> None:
+        self.incremental_config: Type[IncrementalTrainerConfig] = IncrementalTrainerConfig()
+        self.ingestion_config: Type[DataIngestionConfig] = DataIngestionConfig()
+        self.transformation_config: Type[DataTransformationConfig] = DataTransformationConfig()
+        self.model_trainer_config: Type[ModelTrainerConfig] = ModelTrainerConfig()
+
+    @staticmethod
+    def _encoder_parts(preprocessor: Pipeline) -> Tuple[object, list, object, list]:
+        """
+        This function returns the fitted OrdinalEncoder and MinMaxScaler with
+        the columns they work on.
+
+        """
+        encode_trf = preprocessor.named_steps['OrdinalEncode']
+        scale_trf = preprocessor.named_steps['MinMaxScale']
+
+        return (encode_trf.named_transformers_['OrdinalEncoder'],
+                list(encode_trf.transformers_[0][2]),
+                scale_trf.named_transformers_['MinMaxScaler'],
+                list(scale_trf.transformers_[0][2]))
+
+    def measure_drift(self, preprocessor: Pipeline, new_df: pd.DataFrame) -> float:
+        """
+        This function measures how far the new rows are from what the
+        preprocessor was fitted on. The drift is the larger of:
+
+        * unseen_share: Share of new rows with a category the encoder has not seen
+        * range_growth: Largest relative growth of a MinMaxScaler range needed
+          to cover the new rows, which the frozen scaler maps past [0, 1]
+
+        With the multi_hot rest_type encoding an unseen type tag would add a
+        column the model was not trained on, so its drift is infinite.
+
+        """
+        try:
+            encoder, encode_columns, scaler, scale_columns = self._encoder_parts(preprocessor)
+
+            # New rows cleaned like the training data, before encoding
+            with config_context(transform_output="pandas"):
+                cleaned: pd.DataFrame = preprocessor[:4].transform(new_df)
+
+            # Unseen type tags of the MultiHotEncoder force a full retrain
+            tag_encoder = preprocessor.named_steps['OrdinalEncode'].named_transformers_.get('MultiHotEncoder')
+            if tag_encoder is not None:
+                new_tags: set = {tag for value in pd.unique(cleaned['rest_type'].to_numpy())
+                                 for tag in str(value).split(', ')} - set(tag_encoder.categories_)
+                if new_tags:
+                    logger.info(f"Drift: type tags {sorted(new_tags)} have no multi-hot column")
+                    return float('inf')
+
+            unseen: np.ndarray = np.zeros(len(cleaned), dtype=bool)
+            codes: dict = {}
+            for column, categories in zip(encode_columns, encoder.categories_):
+                values: np.ndarray = cleaned[column].to_numpy()
+                index: np.ndarray = pd.Index(categories).get_indexer(values)
+
+                # Unseen categories would be appended after the known ones
+                new_categories: np.ndarray = pd.unique(values[index < 0])
+                index[index < 0] = len(categories) + pd.Index(new_categories).get_indexer(values[index < 0])
+
+                unseen |= index >= len(categories)
+                codes[column] = index.astype(np.float64)
+            codes['votes'] = cleaned['votes'].to_numpy(dtype=np.float64)
+
+            unseen_share: float = float(unseen.mean()) if len(unseen) else 0.0
+
+            range_growth: float = 0.0
+            for i, column in enumerate(scale_columns):
+                old_range: float = scaler.data_max_[i] - scaler.data_min_[i]
+                new_range: float = max(scaler.data_max_[i], codes[column].max()) - min(scaler.data_min_[i], codes[column].min())
+                if old_range > 0:
+                    range_growth = max(range_growth, (new_range - old_range) / old_range)
+
+            logger.info(f"Drift: unseen_share={unseen_share:.4f}, range_growth={range_growth:.4f}")
+
+            return max(unseen_share, range_growth)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _extend_preprocessor(self, preprocessor: Pipeline, new_df: pd.DataFrame) -> None:
+        """
+        This function appends unseen categories to the OrdinalEncoder, in place.
+        The MinMaxScaler is not refitted: the trees of the saved model split on
+        the scaled values, and moving the ranges would shift every feature under
+        them.
+
+        """
+        encoder, encode_columns, _, _ = self._encoder_parts(preprocessor)
+
+        with config_context(transform_output="pandas"):
+            cleaned: pd.DataFrame = preprocessor[:4].transform(new_df)
+
+        # Appending new categories keeps the codes of known ones
+        for i, column in enumerate(encode_columns):
+            categories: np.ndarray = encoder.categories_[i]
+            values: np.ndarray = pd.unique(cleaned[column].to_numpy())
+            new_categories: np.ndarray = values[pd.Index(categories).get_indexer(values) < 0]
+            if len(new_categories):
+                logger.info(f"Adding categories {list(new_categories)} to {column}")
+                encoder.categories_[i] = np.concatenate([categories, new_categories]).astype(categories.dtype)
+
+    def _continue_training(self, model, X_new: pd.DataFrame, y_new: pd.Series) -> Optional[object]:
+        """
+        This function continues training the model on the new rows and returns
+        the updated model, or None when the model does not support it.
+
+        """
+        if isinstance(model, XGBRegressor):
+            model.set_params(n_estimators=self.incremental_config.extra_boosting_rounds)
+            model.fit(X_new, y_new, xgb_model=model.get_booster())
+        elif isinstance(model, CatBoostRegressor):
+            # A fitted CatBoost model is frozen, the update is a new model started from it
+            params: dict = dict(model.get_params(), iterations=self.incremental_config.extra_boosting_rounds)
+            updated_model: CatBoostRegressor = CatBoostRegressor(**params)
+            updated_model.fit(X_new, y_new, init_model=model)
+            model = updated_model
+        elif isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+            model.set_params(warm_start=True,
+                             n_estimators=model.n_estimators + self.incremental_config.extra_estimators)
+            model.fit(X_new, y_new)
+        else:
+            return None
+
+        return model
+
+    def _append_to_train(self, new_df: pd.DataFrame) -> None:
+        """
+        This function appends the new rows to the stored train split, and to
+        the incremental rows that DataIngestion adds to the train split, so
+        they outlive the next run of the train pipeline.
+
+        """
+        # Keeping the new rows where ingestion reads them
+        incremental_df: Optional[pd.DataFrame] = DataIngestion().incremental_rows()
+        write_frame(new_df if incremental_df is None else
+                    pd.concat([incremental_df, new_df.reindex(columns=incremental_df.columns)], ignore_index=True),
+                    self.ingestion_config.incremental_data_path)
+
+        train_df: pd.DataFrame = read_frame(self.ingestion_config.train_data_path)
+
+        # Categoricals of different categories concatenate as object, write_frame() restores them
+        train_df = train_df.astype({column: object for column in train_df.select_dtypes('category').columns})
+        write_frame(pd.concat([train_df, new_df.reindex(columns=train_df.columns)], ignore_index=True),
+                    self.ingestion_config.train_data_path)
+
+    def _full_retrain(self, new_df: pd.DataFrame) -> Tuple[float, str]:
+        """
+        This function appends the new rows to the train split and retrains the
+        preprocessor and models from scratch.
+
+        """
+        logger.info("Falling back to a full retrain")
+
+        self._append_to_train(new_df)
+
+        X_train, y_train, X_test, y_test, _ = DataTransformation().initiate_data_transformation(
+            self.ingestion_config.train_data_path, self.ingestion_config.test_data_path)
+
+        return ModelTrainer().initiate_model_training(X_train=X_train,
+                                                      y_train=y_train,
+                                                      X_test=X_test,
+                                                      y_test=y_test)
+
+    def initiate_incremental_training(self, new_data_path: str) -> Tuple[float, str]:
+        """
+        This function updates the saved preprocessor and model with the rows in
+        new_data_path and returns the r2 score on the test split and the path
+        to the pickled model.
+
+        * new_df: New listings, with the columns of the Zomato dataset
+        * drift: Drift of new_df, see measure_drift()
+        * X_new, y_new: New listings transformed by the extended preprocessor
+
+        """
+        try:
+            logger.info("Incremental training has begun")
+
+            new_df: pd.DataFrame = read_frame(new_data_path)
+            preprocessor: Pipeline = load_artifact(self.transformation_config.preprocessor_file_path, mmap_mode=None)
+            model = load_artifact(self.model_trainer_config.trained_model_path, mmap_mode=None)
+
+            drift: float = self.measure_drift(preprocessor, new_df)
+            if drift > self.incremental_config.drift_threshold:
+                logger.info(f"Drift {drift:.4f} is over {self.incremental_config.drift_threshold}")
+                return self._full_retrain(new_df)
+
+            # Updating the preprocessor and transforming the new rows with it
+            self._extend_preprocessor(preprocessor, new_df)
+            with config_context(transform_output="pandas"):
+                X_new, y_new = preprocessor.transform(new_df)
+
+            updated_model = self._continue_training(model, X_new, y_new)
+            if updated_model is None:
+                logger.info(f"{type(model).__name__} cannot continue training")
+                return self._full_retrain(new_df)
+            model = updated_model
+
+            # Scoring the updated model on the test split
+            test_df: pd.DataFrame = read_frame(self.ingestion_config.test_data_path)
+            with config_context(transform_output="pandas"):
+                X_test, y_test = preprocessor.transform(test_df)
+            score: float = r2_score(y_test, model.predict(X_test))
+
+            print("Updated model is:", type(model).__name__)
+            print("r2 score is", score)
+
+            # Keeping the new rows for full retrains and the next train pipeline run
+            self._append_to_train(new_df)
+
+            save_artifact(self.transformation_config.preprocessor_file_path, preprocessor,
+                          artifact_format=self.transformation_config.preprocessor_format)
+            save_artifact(self.model_trainer_config.trained_model_path, model,
+                          artifact_format=self.model_trainer_config.model_format)
+
+            # Exporting the runtime of the updated model
+            if self.model_trainer_config.export_runtime:
+                ModelTrainer().export_runtime(model, X_test)
+
+            logger.info("Incremental training complete")
+
+            return score, self.model_trainer_config.trained_model_path
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,665 @@
+import os
+import sys
+import json
+import struct
+import hashlib
+import zipfile
+import tempfile
+import logging
+
+import numpy as np
+
+from src.exception import CustomException
+from src.request_timing import timed, start_request_timing
+from src.components.transformation_components.rate_parsing import UNRATED, parse_rate
+
+from typing import Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class RuntimeVersionError(Exception):
+    """
+    Raised by an InferencePool worker when the runtime file on disk is not the
+    model version the parent serves, so that the parent predicts in process.
+    Input errors are raised as ValueError instead.
+
+    """
+
+
+class InferenceRuntime:
+    """
+    class InferenceRuntime:
+        * __init__(meta: dict, arrays: Dict[str, np.ndarray]) -> None
+        * from_model(model, compiled_preprocessor) -> InferenceRuntime
+        * save(file_path: str) -> None
+        * load(file_path: str, mmap_mode: str = None) -> InferenceRuntime
+        * version -> Optional[str]
+        * predict_features(X: np.ndarray) -> np.ndarray
+        * parse_rate_value(rate) -> float
+        * transform_record(book, delivery, rate, votes, location, type_tag, r_type) -> np.ndarray
+        * predict_record(book, delivery, rate, votes, location, type_tag, r_type) -> float
+        * predict_columns(columns: Mapping[str, Sequence]) -> np.ndarray
+        * check_parity(model, X: np.ndarray) -> None
+
+        This class is a self-contained inference artifact: the lookup tables of
+        the CompiledPreprocessor and the fitted model exported to plain arrays,
+        evaluated with NumPy alone. Serving from it needs neither pandas,
+        scikit-learn, XGBoost nor CatBoost.
+
+        The model is held as one of:
+
+        * oblivious: CatBoost symmetric trees, one (feature, border) pair per
+          level and 2**depth leaf values per tree, summed, scaled and biased
+        * nodes: Binary trees of scikit-learn (DecisionTree, RandomForest,
+          ExtraTrees) or XGBoost as node arrays, summed or averaged
+        * linear: Coefficients and intercept of linear models
+
+        Features are compared as float32, like the libraries themselves do.
+        category_dicts, rate_fill, rest_type_encoding and parse_rate_value()
+        mirror the CompiledPreprocessor, so a PredictionTable can look up
+        through either. With the multi_hot encoding a restaurant is a single
+        feature row with its type tags set, otherwise one row per type tag.
+
+    """
+    # Values replaced by 0.0 in Transformation_functions().prep_rate()
+    UNRATED: FrozenSet[str] = UNRATED
+
+    # Columns of the Zomato dataset read by the preprocessor
+    COLUMNS: Dict[str, str] = {
+        'delivery': 'online_order',
+        'book': 'book_table',
+        'rate': 'rate',
+        'votes': 'votes',
+        'location': 'location',
+        'type_tag': 'rest_type',
+        'r_type': 'listed_in(type)'
+    }
+
+    def __init__(self, meta: dict, arrays: Dict[str, np.ndarray]) -> None:
+        self.meta: dict = meta
+        self.arrays: Dict[str, np.ndarray] = arrays
+
+        # Category codes of the OrdinalEncoder
+        self.category_dicts: Dict[str, dict] = {
+            column: {value: float(code) for code, value in enumerate(categories)}
+            for column, categories in meta['categories'].items()
+        }
+        self.rate_fill: float = meta['rate_fill']
+        self.feature_names_out: List[str] = meta['feature_names_out']
+        self.scale_columns: List[str] = meta['scale_columns']
+
+        # Runtimes exported before the multi_hot encoding existed explode
+        self.rest_type_encoding: str = meta.get('rest_type_encoding', 'explode')
+        self.tag_columns: List[str] = meta.get('tag_columns', [])
+
+    @classmethod
+    def from_model(cls, model, compiled_preprocessor) -> 'InferenceRuntime':
+        """
+        This function exports a fitted model and the CompiledPreprocessor it is
+        fed by. It raises NotImplementedError for models that have no array form
+        (SVR, KNeighborsRegressor, AdaBoostRegressor).
+
+        """
+        try:
+            meta: dict = {
+                'model_class': f"{type(model).__module__}.{type(model).__qualname__}",
+                'categories': {column: [str(value) for value in codes]
+                               for column, codes in compiled_preprocessor.category_codes.items()},
+                'rate_missing': compiled_preprocessor.rate_missing,
+                'rate_fill': compiled_preprocessor.rate_fill,
+                'scale_columns': compiled_preprocessor.scale_columns,
+                'feature_names_out': compiled_preprocessor.feature_names_out,
+                'rest_type_encoding': compiled_preprocessor.rest_type_encoding,
+                'tag_columns': compiled_preprocessor.tag_columns
+            }
+            arrays: Dict[str, np.ndarray] = {
+                'scale_min': compiled_preprocessor.scale_min,
+                'scale_scale': compiled_preprocessor.scale_scale
+            }
+
+            module: str = type(model).__module__
+            if module.startswith('catboost'):
+                meta.update(cls._export_catboost(model, arrays))
+            elif module.startswith('xgboost'):
+                meta.update(cls._export_xgboost(model, arrays))
+            elif hasattr(model, 'estimator_weights_'):
+                # Weighted ensembles like AdaBoost do not predict the mean of their trees
+                raise NotImplementedError(f"{meta['model_class']} cannot be exported to the NumPy runtime")
+            elif hasattr(model, 'tree_') or (hasattr(model, 'estimators_') and all(
+                    hasattr(tree, 'tree_') for tree in getattr(model, 'estimators_', []))):
+                meta.update(cls._export_sklearn_trees(model, arrays))
+            elif hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+                meta['kind'] = 'linear'
+                arrays['coef'] = np.asarray(model.coef_, dtype=np.float64).ravel()
+                arrays['intercept'] = np.asarray(model.intercept_, dtype=np.float64).reshape(1)
+            else:
+                raise NotImplementedError(f"{meta['model_class']} cannot be exported to the NumPy runtime")
+
+            return cls(meta, arrays)
+
+        except NotImplementedError:
+            raise
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def _export_catboost(model, arrays: Dict[str, np.ndarray]) -> dict:
+        """
+        This function reads the symmetric trees of a CatBoost model from its
+        JSON export.
+
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_path: str = os.path.join(temp_dir, 'model.json')
+            model.save_model(json_path, format='json')
+            with open(json_path) as file_obj:
+                dump: dict = json.load(file_obj)
+
+        trees: list = dump['oblivious_trees']
+        if any(split['split_type'] != 'FloatFeature' for tree in trees for split in tree['splits']):
+            raise NotImplementedError("Only float feature splits of CatBoost can be exported")
+
+        # Padding shallower trees with levels no row passes, their leaves stay reachable
+        depth: int = max(len(tree['splits']) for tree in trees)
+        split_feature: np.ndarray = np.zeros((len(trees), depth), dtype=np.int64)
+        split_border: np.ndarray = np.full((len(trees), depth), np.inf)
+        leaf_values: np.ndarray = np.zeros((len(trees), 2 ** depth))
+        for i, tree in enumerate(trees):
+            levels: int = len(tree['splits'])
+            split_feature[i, :levels] = [split['float_feature_index'] for split in tree['splits']]
+            split_border[i, :levels] = [split['border'] for split in tree['splits']]
+            leaf_values[i, :2 ** levels] = tree['leaf_values']
+
+        arrays['split_feature'] = split_feature
+        arrays['split_border'] = split_border
+        arrays['leaf_values'] = leaf_values
+
+        scale, bias = dump['scale_and_bias']
+        return {'kind': 'oblivious', 'scale': float(scale), 'bias': float(np.sum(bias))}
+
+    @staticmethod
+    def _export_xgboost(model, arrays: Dict[str, np.ndarray]) -> dict:
+        """
+        This function reads the trees of an XGBoost regressor from its JSON
+        model. A row goes left when its feature is below the split condition,
+        compared in float32 as the conditions are rounded decimals of float32.
+
+        """
+        dump: dict = json.loads(model.get_booster().save_raw('json'))
+        learner: dict = dump['learner']
+        if learner['objective']['name'] != 'reg:squarederror':
+            raise NotImplementedError(f"XGBoost objective {learner['objective']['name']} cannot be exported")
+
+        trees: list = learner['gradient_booster']['model']['trees']
+        base_score: float = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+
+        InferenceRuntime._stack_nodes(arrays,
+                                      features=[tree['split_indices'] for tree in trees],
+                                      thresholds=[np.asarray(tree['split_conditions'], dtype=np.float32)
+                                                  for tree in trees],
+                                      lefts=[tree['left_children'] for tree in trees],
+                                      rights=[tree['right_children'] for tree in trees],
+                                      values=[tree['split_conditions'] for tree in trees],
+                                      default_left=[tree['default_left'] for tree in trees])
+
+        return {'kind': 'nodes', 'strict': True, 'aggregate': 'sum', 'bias': base_score}
+
+    @staticmethod
+    def _export_sklearn_trees(model, arrays: Dict[str, np.ndarray]) -> dict:
+        """
+        This function reads the trees of a scikit-learn tree or forest. A row
+        goes left when its feature is at most the threshold.
+
+        """
+        estimators: list = [model] if hasattr(model, 'tree_') else list(model.estimators_)
+        trees: list = [estimator.tree_ for estimator in estimators]
+
+        InferenceRuntime._stack_nodes(arrays,
+                                      features=[tree.feature for tree in trees],
+                                      thresholds=[tree.threshold for tree in trees],
+                                      lefts=[tree.children_left for tree in trees],
+                                      rights=[tree.children_right for tree in trees],
+                                      values=[tree.value[:, 0, 0] for tree in trees],
+                                      default_left=[np.ones(tree.node_count) for tree in trees])
+
+        return {'kind': 'nodes', 'strict': False, 'aggregate': 'mean', 'bias': 0.0}
+
+    @staticmethod
+    def _stack_nodes(arrays: Dict[str, np.ndarray], features, thresholds, lefts, rights, values, default_left) -> None:
+        """
+        This function concatenates the node arrays of all trees, offsetting the
+        child indices so that they point into the concatenated arrays. Leaves
+        point to themselves, so a row that reached one stays there.
+
+        """
+        offsets: np.ndarray = np.cumsum([0] + [len(left) for left in lefts])
+        left_all: list = []
+        right_all: list = []
+        for offset, left, right in zip(offsets, lefts, rights):
+            left = np.asarray(left, dtype=np.int64)
+            right = np.asarray(right, dtype=np.int64)
+            node: np.ndarray = np.arange(len(left)) + offset
+            is_leaf: np.ndarray = left < 0
+            left_all.append(np.where(is_leaf, node, left + offset))
+            right_all.append(np.where(is_leaf, node, right + offset))
+
+        arrays['roots'] = offsets[:-1].astype(np.int64)
+        arrays['left'] = np.concatenate(left_all)
+        arrays['right'] = np.concatenate(right_all)
+        arrays['feature'] = np.maximum(np.concatenate([np.asarray(f, dtype=np.int64) for f in features]), 0)
+        arrays['threshold'] = np.concatenate([np.asarray(t) for t in thresholds])
+        arrays['value'] = np.concatenate([np.asarray(v, dtype=np.float64) for v in values])
+        arrays['default_left'] = np.concatenate([np.asarray(d, dtype=bool) for d in default_left])
+        arrays['is_leaf'] = arrays['left'] == np.arange(len(arrays['left']))
+
+    def save(self, file_path: str) -> None:
+        """
+        This function saves the runtime as a single .npz file of plain arrays,
+        with the metadata as a JSON string, readable without pickle.
+
+        """
+        try:
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+
+            temp_path: str = f"{file_path}.tmp.{os.getpid()}.npz"
+            np.savez(temp_path, meta=np.array(json.dumps(self.meta)), **self.arrays)
+            os.replace(temp_path, file_path)
+
+            logger.info(f"Inference runtime of {self.meta['model_class']} saved to {file_path}")
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def _memmap_members(file_path: str) -> Dict[str, np.ndarray]:
+        """
+        This function memory maps the arrays of an .npz file read-only. np.savez()
+        stores its members uncompressed, so every .npy member is a contiguous
+        range of the file that np.memmap() can map at its offset. Every process
+        mapping the file shares its pages through the page cache. Compressed
+        or empty members are read normally.
+
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as file_obj:
+            for info in archive.infolist():
+                name: str = info.filename[:-len('.npy')]
+                if info.compress_type != zipfile.ZIP_STORED:
+                    arrays[name] = np.load(archive.open(info), allow_pickle=False)
+                    continue
+
+                # Skipping the local file header to the .npy member
+                file_obj.seek(info.header_offset)
+                name_length, extra_length = struct.unpack('<HH', file_obj.read(30)[26:30])
+                file_obj.seek(info.header_offset + 30 + name_length + extra_length)
+
+                # Reading the .npy header to the start of the data
+                version = np.lib.format.read_magic(file_obj)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file_obj)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file_obj)
+
+                if dtype.hasobject or int(np.prod(shape)) == 0 or shape == ():
+                    arrays[name] = np.load(archive.open(info), allow_pickle=False)
+                    continue
+
+                arrays[name] = np.memmap(file_path, dtype=dtype, mode='r', offset=file_obj.tell(),
+                                         shape=shape, order='F' if fortran_order else 'C')
+
+        return arrays
+
+    @classmethod
+    def load(cls, file_path: str, mmap_mode: Optional[str] = None) -> 'InferenceRuntime':
+        """
+        This function loads a runtime saved with save().
+
+        * mmap_mode: "r" memory maps the arrays instead of reading them, so the
+          worker processes of an InferencePool share one copy of the model
+
+        """
+        try:
+            if mmap_mode is not None:
+                arrays: Dict[str, np.ndarray] = cls._memmap_members(file_path)
+                meta: dict = json.loads(str(arrays.pop('meta')))
+                return cls(meta, arrays)
+
+            with np.load(file_path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files if name != 'meta'}
+                meta = json.loads(str(npz['meta']))
+
+            return cls(meta, arrays)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @property
+    def version(self) -> Optional[str]:
+        """
+        This function returns the model version the runtime was exported from,
+        computed like ModelRegistry().load() does from the manifest checksums.
+
+        """
+        checksums: Optional[list] = self.meta.get('checksums')
+        if not checksums:
+            return None
+
+        return hashlib.sha256("".join(checksums).encode()).hexdigest()[:12]
+
+    def predict_features(self, X: np.ndarray) -> np.ndarray:
+        """
+        This function predicts rows of preprocessed features, in the column
+        order of feature_names_out.
+
+        """
+        X = np.asarray(X, dtype=np.float32)
+        kind: str = self.meta['kind']
+
+        if kind == 'linear':
+            return X.astype(np.float64) @ self.arrays['coef'] + self.arrays['intercept'][0]
+
+        if kind == 'oblivious':
+            # Leaf index of every tree for every row, one bit per level, with the
+            # trees along the first axis so that each level gathers whole rows of X
+            X_T: np.ndarray = np.ascontiguousarray(X.T)
+            split_feature: np.ndarray = self.arrays['split_feature']
+            split_border: np.ndarray = self.arrays['split_border']
+            n_trees, depth = split_feature.shape
+            leaf: np.ndarray = np.zeros((n_trees, len(X)), dtype=np.min_scalar_type((1 << depth) - 1))
+            for level in range(depth):
+                bits: np.ndarray = X_T[split_feature[:, level]] > split_border[:, level, None]
+                leaf |= bits.astype(leaf.dtype) << level
+
+            # Leaf values of all trees as one flat array
+            leaf_values: np.ndarray = self.arrays['leaf_values']
+            offsets: np.ndarray = np.arange(n_trees)[:, None] * leaf_values.shape[1]
+            values: np.ndarray = np.take(leaf_values.reshape(-1), leaf + offsets)
+
+            return self.meta['scale'] * values.sum(axis=0) + self.meta['bias']
+
+        # Walking every row down every tree at once until all reached a leaf
+        node: np.ndarray = np.broadcast_to(self.arrays['roots'], (len(X), len(self.arrays['roots']))).copy()
+        rows: np.ndarray = np.arange(len(X))[:, None]
+        while not self.arrays['is_leaf'][node].all():
+            x: np.ndarray = X[rows, self.arrays['feature'][node]]
+            threshold: np.ndarray = self.arrays['threshold'][node]
+            go_left: np.ndarray = (x < threshold) if self.meta['strict'] else (x <= threshold)
+            go_left = np.where(np.isnan(x), self.arrays['default_left'][node], go_left)
+            node = np.where(go_left, self.arrays['left'][node], self.arrays['right'][node])
+
+        values = self.arrays['value'][node]
+        total: np.ndarray = values.mean(axis=1) if self.meta['aggregate'] == 'mean' else values.sum(axis=1)
+
+        return total + self.meta['bias']
+
+    def parse_rate_value(self, rate) -> float:
+        """
+        This function parses and imputes a single rating like the preprocessor,
+        see CompiledPreprocessor().parse_rate_value().
+
+        """
+        rate_value: float = parse_rate(rate)
+        if rate_value == self.meta['rate_missing']:
+            rate_value = self.meta['rate_fill']
+
+        return rate_value
+
+    def transform_record(self,
+                         book: str,
+                         delivery: str,
+                         rate: str,
+                         votes: int,
+                         location: str,
+                         type_tag: str,
+                         r_type: str) -> np.ndarray:
+        """
+        This function transforms the fields of a single restaurant into its
+        feature matrix, one row per distinct type tag, or a single row with the
+        multi_hot encoding.
+
+        """
+        tags: List[str] = list(dict.fromkeys(str(type_tag).split(', ')))
+        values: dict = {
+            'online_order': delivery,
+            'book_table': book,
+            'location': location,
+            'listed_in(type)': r_type
+        }
+
+        unknown: list = [tag for tag in tags if tag not in self.category_dicts['rest_type']]
+        if unknown:
+            raise ValueError(f"Found unknown categories {unknown} in column rest_type during transform")
+
+        tag_codes: np.ndarray = np.array([self.category_dicts['rest_type'][tag] for tag in tags])
+
+        # The tags of the restaurant set on its single row
+        if self.tag_columns:
+            tag_row: np.ndarray = np.zeros((1, len(self.tag_columns)))
+            tag_row[0, tag_codes.astype(np.int64)] = 1.0
+            tag_codes = tag_row
+
+        n: int = len(tag_codes)
+        features: Dict[str, np.ndarray] = {}
+        for column, value in values.items():
+            if value not in self.category_dicts[column]:
+                raise ValueError(f"Found unknown categories [{value!r}] in column {column} during transform")
+            features[column] = np.full(n, self.category_dicts[column][value])
+
+        features['rest_type'] = tag_codes
+        features['rate'] = np.full(n, self.parse_rate_value(rate))
+        features['votes'] = np.full(n, float(votes))
+
+        return self._assemble(features)
+
+    def _assemble(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        This function sets the multi-hot columns of the tags, scales the
+        MinMaxScaler columns and stacks all features in model order, like
+        CompiledPreprocessor()._assemble().
+
+        """
+        if self.tag_columns:
+            tags: np.ndarray = features.pop('rest_type')
+            if tags.ndim == 1:
+                tags = (tags[:, None] == np.arange(len(self.tag_columns))).astype(np.float64)
+            for i, column in enumerate(self.tag_columns):
+                features[column] = tags[:, i]
+
+        # Scaling the MinMaxScaler columns
+        for i, column in enumerate(self.scale_columns):
+            features[column] = features[column] * self.arrays['scale_scale'][i] + self.arrays['scale_min'][i]
+
+        return np.column_stack([features[column] for column in self.feature_names_out])
+
+    def predict_record(self,
+                       book: str,
+                       delivery: str,
+                       rate: str,
+                       votes: int,
+                       location: str,
+                       type_tag: str,
+                       r_type: str) -> float:
+        """
+        This function predicts a single restaurant, the mean of the predictions
+        of its type tags like PredictPipeline().predict().
+
+        """
+        try:
+            X: np.ndarray = self.transform_record(book, delivery, rate, votes, location, type_tag, r_type)
+
+            return float(self.predict_features(X).mean())
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _encode_columns(self, values: Dict[str, list]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        This function encodes the restaurants of values, a dictionary of field
+        lists, into one feature row per distinct type tag, or one row per
+        restaurant with the multi_hot encoding. It returns the feature matrix
+        and the restaurant of every row.
+
+        * owner: Restaurant of every feature row
+        * tags: Type tag of every feature row, or type tags of every restaurant with multi_hot
+
+        """
+        owner: List[int] = []
+        tags: List[str] = []
+        for i, type_tag in enumerate(values['type_tag']):
+            if type_tag is None or (isinstance(type_tag, float) and np.isnan(type_tag)):
+                continue
+            if self.tag_columns:
+                owner.append(i)
+                tags.append(str(type_tag))
+                continue
+            for tag in dict.fromkeys(str(type_tag).split(', ')):
+                owner.append(i)
+                tags.append(tag)
+
+        rows: np.ndarray = np.asarray(owner, dtype=np.int64)
+        features: Dict[str, np.ndarray] = {}
+        for field, column in self.COLUMNS.items():
+            if column not in self.category_dicts:
+                continue
+            if field == 'type_tag' and self.tag_columns:
+                features[column] = self._encode_tags(tags)
+                continue
+            codes: Dict[str, float] = self.category_dicts[column]
+            field_values: list = tags if field == 'type_tag' else [values[field][i] for i in owner]
+            encoded: np.ndarray = np.array([codes.get(value, np.nan) for value in field_values])
+            if np.isnan(encoded).any():
+                unknown: list = list(dict.fromkeys(value for value, code in zip(field_values, encoded)
+                                                   if np.isnan(code)))
+                raise ValueError(f"Found unknown categories {unknown} in column {column} during transform")
+            features[column] = encoded
+
+        features['rate'] = np.array([self.parse_rate_value(rate) for rate in values['rate']])[rows]
+        features['votes'] = np.asarray(values['votes'], dtype=np.float64)[rows]
+
+        return self._assemble(features), rows
+
+    def _encode_tags(self, type_tags: List[str]) -> np.ndarray:
+        """
+        This function maps the type tags of every restaurant to its 0/1 row of
+        tags, splitting every distinct value once.
+
+        """
+        codes: Dict[str, float] = self.category_dicts['rest_type']
+        distinct: Dict[str, int] = {}
+        rows: List[np.ndarray] = []
+        for type_tag in type_tags:
+            if type_tag not in distinct:
+                split: List[str] = type_tag.split(', ')
+                unknown: list = [tag for tag in split if tag not in codes]
+                if unknown:
+                    raise ValueError(f"Found unknown categories {unknown} in column rest_type during transform")
+                row: np.ndarray = np.zeros(len(self.tag_columns))
+                row[[int(codes[tag]) for tag in split]] = 1.0
+                distinct[type_tag] = len(rows)
+                rows.append(row)
+
+        if not rows:
+            return np.zeros((0, len(self.tag_columns)))
+
+        return np.stack(rows)[[distinct[type_tag] for type_tag in type_tags]]
+
+    def predict_columns(self, columns: Mapping[str, Sequence]) -> np.ndarray:
+        """
+        This function predicts every restaurant of columns, a mapping of the
+        dataset columns (a DataFrame works) to their values. The fields of every
+        restaurant are encoded once and repeated for its type tag rows (a single
+        row with the multi_hot encoding), which are all predicted in one call. Restaurants without a rest_type get NaN.
+
+        * rows: Restaurant of every feature row
+
+        """
+        try:
+            values: Dict[str, list] = {field: list(columns[column]) for field, column in self.COLUMNS.items()}
+            n: int = len(values['type_tag'])
+
+            with timed("preprocess"):
+                X, rows = self._encode_columns(values)
+
+            predictions: np.ndarray = np.full(n, np.nan)
+            if len(rows) == 0:
+                return predictions
+
+            with timed("predict"):
+                y: np.ndarray = self.predict_features(X)
+
+            # Averaging the type tag rows of every restaurant
+            counts: np.ndarray = np.bincount(rows, minlength=n)
+            predicted: np.ndarray = counts > 0
+            predictions[predicted] = np.bincount(rows, weights=y, minlength=n)[predicted] / counts[predicted]
+
+            return predictions
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def check_parity(self, model, X: np.ndarray, rtol: float = 1e-5, atol: float = 1e-3) -> None:
+        """
+        This function raises if predict_features() differs from model.predict()
+        on X (a DataFrame of preprocessed features, e.g. the test split) by more
+        than float32 rounding.
+
+        """
+        try:
+            logger.info("Inference runtime parity check has begun")
+
+            expected: np.ndarray = np.asarray(model.predict(X), dtype=np.float64).ravel()
+            actual: np.ndarray = self.predict_features(np.asarray(X, dtype=np.float64))
+
+            if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+                worst: float = float(np.max(np.abs(actual - expected)))
+                raise ValueError(f"Inference runtime differs from {self.meta['model_class']} by up to {worst}")
+
+            logger.info(f"Inference runtime matches {self.meta['model_class']} on {len(expected)} rows")
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Runtime of an InferencePool worker process, memory mapped by init_worker()
+_worker_runtime_path: Optional[str] = None
+_worker_runtime: Optional[InferenceRuntime] = None
+
+
+def init_worker(runtime_path: str) -> None:
+    """
+    This function is the initializer of the InferencePool worker processes. It
+    memory maps the runtime, so all workers read the same pages of the model.
+    The module imports NumPy alone, which keeps spawned workers small.
+
+    """
+    global _worker_runtime_path, _worker_runtime
+
+    _worker_runtime_path = runtime_path
+    _worker_runtime = InferenceRuntime.load(runtime_path, mmap_mode='r')
+
+
+def predict_columns_in_worker(version: str, columns: Mapping[str, Sequence]) -> Tuple[np.ndarray, Dict[str, float]]:
+    """
+    This function runs InferenceRuntime().predict_columns() in a worker
+    process and returns the predictions with the seconds of its preprocess and
+    predict stages, which the parent reports for the request. The runtime is
+    mapped again when the parent serves another model version, and
+    RuntimeVersionError is raised when the file on disk is not that version.
+
+    """
+    global _worker_runtime
+
+    if _worker_runtime is None or _worker_runtime.version != version:
+        _worker_runtime = InferenceRuntime.load(_worker_runtime_path, mmap_mode='r')
+        if _worker_runtime.version != version:
+            raise RuntimeVersionError(f"Runtime {_worker_runtime_path} is version {_worker_runtime.version}, not {version}")
+
+    try:
+        timings: Dict[str, float] = start_request_timing()
+        return _worker_runtime.predict_columns(columns), timings
+    except CustomException as e:
+        # CustomException cannot be unpickled in the parent, its message can
+        raise ValueError(str(e)) from None
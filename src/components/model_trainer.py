@@ -1,160 +1,318 @@
-import sys
-import os
-
-import numpy as np
-import pandas as pd
-
-from sklearn.svm import SVR
-from sklearn.neighbors import KNeighborsRegressor
-from catboost import CatBoostRegressor
-from xgboost import XGBRegressor
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.linear_model import (
-    LinearRegression, 
-    Ridge,
-    Lasso
-)
-from sklearn.ensemble import (
-    RandomForestRegressor,
-    AdaBoostRegressor
-)
-
-from src.exception import CustomException
-from src.logger import logging
-from src.utils import save_object
-from src.utils import evaluate_models
-
-from dataclasses import dataclass
-
-from typing import Type, Tuple
-
-
-@dataclass
-class ModelTrainerConfig:
-    """
-    class ModelTrainerCofig is used to initialize the path to pickled model file
-
-    """
-    trained_model_path: str = os.path.join('artifacts', 'model.pkl')
-
-
-class ModelTrainer:
-    """
-    class ModelTrainer:
-        * __init__() -> None
-        * initiate_model_training(self, 
-                                X_train: pd.DataFrame, 
-                                y_train: pd.Series, 
-                                X_test: pd.DataFrame, 
-                                y_test: pd.Series) -> Tuple[float,
-                                                            str]:
-        
-        This class is used to implement model training. Various models are
-        imported and trained on the X_train and y_train datasets.
-
-    """
-    def __init__(self) -> None:
-        self.model_trainer_config: Type[ModelTrainerConfig] = ModelTrainerConfig()
-    
-
-    def initiate_model_training(self, 
-                                X_train: pd.DataFrame, 
-                                y_train: pd.Series, 
-                                X_test: pd.DataFrame, 
-                                y_test: pd.Series) -> Tuple[float,
-                                                            str]:
-        """
-        This function is used to implement model training. First the feature dataset and 
-        label series are imported. Further they are converted to numpy arrays and the
-        models are trained on them. The function returns the r2 score of the best model
-        and the path to the pickled model object.
-        * models: Dictionary containing model names and models
-        * model_report: Dictionary containing model r2 score and model name
-        * best_model_score: r2 score of the best model
-        * best_model_name: Name of the best model
-
-        """
-        try:
-            logging.info("Model training started")
-
-            logging.info("Converting X and y to numpy arrays")
-
-            # Converting X and y to numpy arrays
-            X_train.to_numpy()
-            X_test.to_numpy()
-            y_train.to_numpy()
-            y_test.to_numpy()
-
-            logging.info("X and y converted to numpy arrays")
-
-            logging.info("Creating a dictionary of training models")
-            
-            # Dictionary of training models 
-            models: dict = {
-                "SVR": SVR(),
-                "Linear Regression": LinearRegression(),
-                "Lasso": Lasso(),
-                "Ridge": Ridge(),
-                "K-Neighbors Regressor": KNeighborsRegressor(),
-                "Decision Tree": DecisionTreeRegressor(),
-                "Random Forest Regressor": RandomForestRegressor(),
-                "XGBRegressor": XGBRegressor(), 
-                "CatBoosting Regressor": CatBoostRegressor(verbose=False),
-                "AdaBoost Regressor": AdaBoostRegressor()
-                }
-            
-            logging.info("Dictionary of training models created")
-
-            logging.info("Model training started")
-
-            # Training models
-            model_report: dict = evaluate_models(X_train=X_train,
-                                                 y_train=y_train,
-                                                 X_test=X_test,
-                                                 y_test=y_test,
-                                                 models=models)
-            
-            logging.info("Model training complete")
-
-            logging.info("Getting the best model info")
-
-            # Best model score
-            best_model_score: float = max(sorted(model_report.values()))
-
-            # Best model name
-            best_model_name: str = list(model_report.keys())[
-                list(model_report.values()).index(best_model_score)
-            ]
-
-            # Getting the best model from models dictionary
-            best_model = models[best_model_name]
-
-            print("Best model is:", best_model_name)
-            print("r2 score is", best_model_score)
-
-            if best_model_score<0.6:
-                raise CustomException("No best model found")
-            
-            logging.info("Have the best model info")
-
-            logging.info("Saving the best model")
-
-            # Saving model as pickled file
-            save_object(
-                file_path=self.model_trainer_config.trained_model_path,
-                obj=best_model
-            )
-
-            logging.info("Best model saved")
-
-            logging.info("Model training ended")
-
-            return (
-                best_model_score,
-                self.model_trainer_config.trained_model_path
-                )
-
-
-        except Exception as e:
-            raise CustomException(e, sys)
-
+import sys
+import os
+import logging
+
+import numpy as np
+import pandas as pd
+
+from sklearn.svm import SVR
+from sklearn.neighbors import KNeighborsRegressor
+from catboost import CatBoostRegressor
+from xgboost import XGBRegressor
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.linear_model import (
+    LinearRegression, 
+    Ridge,
+    Lasso
+)
+from sklearn.ensemble import (
+    RandomForestRegressor,
+    AdaBoostRegressor
+)
+
+from src.exception import CustomException
+from src.components.inference_runtime import InferenceRuntime
+from src.components.transformation_components.compiled_preprocessor import CompiledPreprocessor
+from src.components.hyperparameter_search import HyperparameterSearch, HyperparameterSearchConfig
+from src.utils import save_artifact
+from src.utils import load_artifact
+from src.utils import file_checksum
+from src.utils import evaluate_models
+from src.utils import evaluate_models_halving
+from src.profiler import profiled
+
+from dataclasses import dataclass, field
+
+from typing import Optional, Type, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelTrainerConfig:
+    """
+    class ModelTrainerCofig is used to initialize the path to the manifest of the
+    saved model and the number of models trained at the same time (-1 for every core)
+
+    * model_format: Format the model is saved in, "auto" uses the native format
+      of CatBoost and XGBoost and joblib otherwise, see src.utils.save_artifact()
+
+    * selection: "exhaustive" trains every model on all the data, "halving"
+      drops weak models on subsamples first, see evaluate_models_halving(),
+      "search" tunes the models of get_search_spaces() by cross-validation
+      first and trains every model with its best configuration
+    * halving_eta, halving_min_samples, halving_finalists, time_budget: Settings of "halving"
+    * search: Settings of "search", see HyperparameterSearchConfig
+
+    * preprocessor_path: Path of the manifest of the preprocessor the model is fed by
+    * runtime_path: Path of the NumPy inference runtime exported next to the model,
+      see src.components.inference_runtime
+    * export_runtime: Export the runtime after training
+
+    """
+    trained_model_path: str = os.path.join('artifacts', 'model.manifest.json')
+    model_format: str = "auto"
+    n_jobs: int = 1
+    selection: str = "exhaustive"
+    halving_eta: int = 3
+    halving_min_samples: int = 2000
+    halving_finalists: int = 2
+    time_budget: Optional[float] = None
+    search: HyperparameterSearchConfig = field(default_factory=HyperparameterSearchConfig)
+    preprocessor_path: str = os.path.join('artifacts', 'preprocessor.manifest.json')
+    runtime_path: str = os.path.join('artifacts', 'model_runtime.npz')
+    export_runtime: bool = True
+
+
+class ModelTrainer:
+    """
+    class ModelTrainer:
+        * __init__() -> None
+        * get_models() -> dict
+        * get_search_spaces() -> dict
+        * export_runtime(model, X_test: pd.DataFrame) -> Optional[str]
+        * initiate_model_training(self, 
+                                X_train: pd.DataFrame, 
+                                y_train: pd.Series, 
+                                X_test: pd.DataFrame, 
+                                y_test: pd.Series) -> Tuple[float,
+                                                            str]:
+        
+        This class is used to implement model training. Various models are
+        imported and trained on the X_train and y_train datasets.
+
+    """
+    def __init__(self) -> None:
+        self.model_trainer_config: Type[ModelTrainerConfig] = ModelTrainerConfig()
+
+    def get_models(self) -> dict:
+        """
+        This function returns the dictionary of model names and unfitted models
+        that are trained and compared.
+
+        """
+        return {
+            "SVR": SVR(),
+            "Linear Regression": LinearRegression(),
+            "Lasso": Lasso(),
+            "Ridge": Ridge(),
+            "K-Neighbors Regressor": KNeighborsRegressor(),
+            "Decision Tree": DecisionTreeRegressor(),
+            "Random Forest Regressor": RandomForestRegressor(),
+            "XGBRegressor": XGBRegressor(), 
+            "CatBoosting Regressor": CatBoostRegressor(verbose=False),
+            "AdaBoost Regressor": AdaBoostRegressor()
+            }
+
+    def get_search_spaces(self) -> dict:
+        """
+        This function returns the values tried for the hyperparameters of every
+        model tuned by the "search" selection. The number of boosting rounds of
+        XGBoost and CatBoost is not searched, it is found by early stopping.
+
+        """
+        return {
+            "Lasso": {"alpha": [0.01, 0.1, 1.0, 10.0]},
+            "Ridge": {"alpha": [0.1, 1.0, 10.0, 100.0]},
+            "K-Neighbors Regressor": {"n_neighbors": [3, 5, 10, 20],
+                                      "weights": ["uniform", "distance"]},
+            "Decision Tree": {"max_depth": [None, 10, 20, 30],
+                              "min_samples_leaf": [1, 2, 5, 10]},
+            "Random Forest Regressor": {"n_estimators": [100, 200],
+                                        "max_depth": [None, 20, 30],
+                                        "min_samples_leaf": [1, 2, 4],
+                                        "max_features": [1.0, 0.5, "sqrt"]},
+            "XGBRegressor": {"learning_rate": [0.03, 0.05, 0.1, 0.2],
+                             "max_depth": [4, 6, 8, 10],
+                             "min_child_weight": [1, 3, 5],
+                             "subsample": [0.7, 0.85, 1.0],
+                             "colsample_bytree": [0.7, 0.85, 1.0],
+                             "reg_lambda": [0.1, 1.0, 10.0]},
+            "CatBoosting Regressor": {"learning_rate": [0.03, 0.06, 0.1, 0.2],
+                                      "depth": [4, 6, 8, 10],
+                                      "l2_leaf_reg": [1, 3, 10],
+                                      "random_strength": [0.5, 1, 2]}
+            }
+
+    def export_runtime(self, model, X_test: pd.DataFrame) -> Optional[str]:
+        """
+        This function exports the saved model and preprocessor to the NumPy
+        inference runtime and checks that it predicts X_test like the model.
+        It returns the path of the runtime, or None when the model cannot be
+        exported, in which case a stale runtime is removed so that it is never
+        served with the new model.
+
+        * compiled_preprocessor: Lookup tables of the saved preprocessor
+        * runtime: Exported model and preprocessor
+
+        """
+        try:
+            runtime_path: str = self.model_trainer_config.runtime_path
+
+            logger.info("Exporting the inference runtime")
+
+            # Compiling the preprocessor the model was trained with
+            compiled_preprocessor = CompiledPreprocessor(
+                load_artifact(self.model_trainer_config.preprocessor_path, mmap_mode=None))
+
+            try:
+                runtime = InferenceRuntime.from_model(model, compiled_preprocessor)
+            except NotImplementedError as e:
+                logger.info(f"Inference runtime not exported: {e}")
+                if os.path.exists(runtime_path):
+                    os.remove(runtime_path)
+                return None
+
+            # Refusing to save a runtime that does not predict like the model
+            runtime.check_parity(model, X_test)
+
+            # Tying the runtime to the manifests it was exported from
+            runtime.meta['checksums'] = [file_checksum(self.model_trainer_config.trained_model_path),
+                                         file_checksum(self.model_trainer_config.preprocessor_path)]
+            runtime.save(runtime_path)
+
+            logger.info("Inference runtime exported")
+
+            return runtime_path
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def initiate_model_training(self, 
+                                X_train: pd.DataFrame, 
+                                y_train: pd.Series, 
+                                X_test: pd.DataFrame, 
+                                y_test: pd.Series) -> Tuple[float,
+                                                            str]:
+        """
+        This function is used to implement model training. First the feature dataset and 
+        label series are imported. Further they are converted to numpy arrays and the
+        models are trained on them. The function returns the r2 score of the best model
+        and the path to the pickled model object.
+        * models: Dictionary containing model names and models
+        * model_report: Dictionary containing model name and its r2 score, fit time and predict time
+        * best_model_score: r2 score of the best model
+        * best_model_name: Name of the best model
+
+        """
+        try:
+            logger.info("Model training started")
+
+            logger.info("Converting X and y to numpy arrays")
+
+            # Converting X and y to numpy arrays
+            X_train.to_numpy()
+            X_test.to_numpy()
+            y_train.to_numpy()
+            y_test.to_numpy()
+
+            logger.info("X and y converted to numpy arrays")
+
+            logger.info("Creating a dictionary of training models")
+            
+            # Dictionary of training models 
+            models: dict = self.get_models()
+            
+            logger.info("Dictionary of training models created")
+
+            logger.info("Model training started")
+
+            # Tuning the models by cross-validation on the train split and giving each its best configuration
+            if self.model_trainer_config.selection == "search":
+                with profiled("search"):
+                    search_report: dict = HyperparameterSearch(self.model_trainer_config.search).search(
+                        X_train, y_train, models, self.get_search_spaces())
+
+                for name, best in search_report.items():
+                    models[name].set_params(**best["params"])
+                    logger.info(f"{name}: cv r2 {best['cv_r2_score']:.4f} over {best['trials']} trials, params {best['params']}")
+
+            # Training models
+            if self.model_trainer_config.selection == "halving":
+                model_report: dict = evaluate_models_halving(X_train=X_train,
+                                                             y_train=y_train,
+                                                             X_test=X_test,
+                                                             y_test=y_test,
+                                                             models=models,
+                                                             eta=self.model_trainer_config.halving_eta,
+                                                             min_samples=self.model_trainer_config.halving_min_samples,
+                                                             finalists=self.model_trainer_config.halving_finalists,
+                                                             time_budget=self.model_trainer_config.time_budget,
+                                                             n_jobs=self.model_trainer_config.n_jobs)
+            else:
+                model_report: dict = evaluate_models(X_train=X_train,
+                                                     y_train=y_train,
+                                                     X_test=X_test,
+                                                     y_test=y_test,
+                                                     models=models,
+                                                     n_jobs=self.model_trainer_config.n_jobs)
+            
+            logger.info("Model training complete")
+
+            logger.info("Getting the best model info")
+
+            # r2 scores of the models trained on all the data
+            model_scores: dict = {name: scores["r2_score"] for name, scores in model_report.items()
+                                  if not scores.get("eliminated", False)}
+
+            # Best model score
+            best_model_score: float = max(sorted(model_scores.values()))
+
+            # Best model name
+            best_model_name: str = list(model_scores.keys())[
+                list(model_scores.values()).index(best_model_score)
+            ]
+
+            # Getting the best model from models dictionary
+            best_model = models[best_model_name]
+
+            for name, scores in model_report.items():
+                print(f"{name:<25} r2: {scores['r2_score']:.4f}  fit: {scores['fit_time']:.2f}s  predict: {scores['predict_time']:.2f}s"
+                      + ("  (eliminated on {} rows)".format(scores['n_samples']) if scores.get("eliminated") else ""))
+
+            print("Best model is:", best_model_name)
+            print("r2 score is", best_model_score)
+
+            if best_model_score<0.6:
+                raise CustomException("No best model found")
+            
+            logger.info("Have the best model info")
+
+            logger.info("Saving the best model")
+
+            # Saving model with its manifest
+            with profiled("save"):
+                save_artifact(
+                    self.model_trainer_config.trained_model_path,
+                    best_model,
+                    artifact_format=self.model_trainer_config.model_format
+                )
+
+            logger.info("Best model saved")
+
+            if self.model_trainer_config.export_runtime:
+                with profiled("export_runtime"):
+                    self.export_runtime(best_model, X_test)
+
+            logger.info("Model training ended")
+
+            return (
+                best_model_score,
+                self.model_trainer_config.trained_model_path
+                )
+
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
@@ -1,125 +1,154 @@
-import pandas as pd
-import numpy as np
-import sys
-
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import FunctionTransformer
-from sklearn.preprocessing import OrdinalEncoder
-from sklearn.preprocessing import MinMaxScaler
-
-from src.components.transformation_components.transformation_functions import Transformation_functions
-
-from src.exception import CustomException
-from src.logger import logging
-
-from typing import List
-
-class Column_Transformers:
-    """
-    class Column_Transformers:
-        * __init__() -> None
-        * get_transformers() -> List[ColumnTransformer]
-
-        This class is used to initialize ColumnTransformers for Data Transformation.
-        The get_transformers() initializes ColumnTransfomers and returns a list of 
-        ColumnTransformers.
-
-    """
-    def __init__(self) -> None:
-        pass
-
-    def get_transformers(self) -> List[ColumnTransformer]:
-        """
-        This function initializes ColumnTransforms and creates a list of 
-        them to return.
-
-        * select_trf: Select important feature columns and drop the rest
-        * pre_trf: Preprocess dataset using Transformation_functions().preprocess() for further transformation
-        * pre_rate_trf: Preprocess rate column using Transformation_functions().prep_rate()
-        * imp_rate_trf: Impute rate column using SimpleImputer()
-        * encode_trf: Encode some columns using OrdinalEncoder
-        * scale_trf: Scale some columns using MinMaxScale()
-        * List_Column_transformers: List of all the ColumnTransformers
-        
-        """
-        try:
-            logging.info("get_transformers() has begun")
-
-            # Transformer to select important features
-            select_trf: ColumnTransformer = ColumnTransformer(transformers=[
-                ("SelectColumns", 'passthrough', ['online_order',
-                                                  'book_table',
-                                                  'rate',
-                                                  'votes',
-                                                  'location',
-                                                  'rest_type',
-                                                  'approx_cost(for two people)',
-                                                  'listed_in(type)'])
-            ], verbose_feature_names_out=False)
-
-            logging.info("select_trf created")
-
-
-            # Transformer to do necessary preprocessing
-            pre_trf: ColumnTransformer = ColumnTransformer(transformers=[
-                ("Preprocess", FunctionTransformer(Transformation_functions().preprocess), slice(0,8))
-            ], verbose_feature_names_out=False)
-
-            logging.info("pre_trf created")
-
-
-            # Transformer to preprocess 'rate' column
-            pre_rate_trf: ColumnTransformer = ColumnTransformer(transformers=[
-                ("PreprocessRate", FunctionTransformer(Transformation_functions().prep_rate), slice(0,8))
-            ], verbose_feature_names_out=False)
-
-            logging.info("pre_rate_trf created")
-
-
-            # Transformer to impute 'rate' column
-            imp_rate_trf: ColumnTransformer = ColumnTransformer(transformers=[
-                ("SimpleImputer", SimpleImputer(missing_values=0.0, strategy="mean"), ['rate'])
-            ], remainder = 'passthrough', verbose_feature_names_out=False)
-
-            logging.info("imp_rate_trf created")
-
-
-            # Transformer to Ordinal Encode columns
-            encode_trf: ColumnTransformer = ColumnTransformer(transformers=[
-                ("OrdinalEncoder", OrdinalEncoder(), ['online_order',
-                                                      'book_table',
-                                                      'location',
-                                                      'rest_type',
-                                                      'listed_in(type)'])
-            ], remainder = 'passthrough', verbose_feature_names_out=False)
-
-            logging.info("encode_trf created")
-
-
-            # Transformer to MinMax scale columns
-            scale_trf: ColumnTransformer = ColumnTransformer(transformers=[
-                ("MinMaxScaler", MinMaxScaler(), ['location',
-                                                  'rest_type',
-                                                  'votes'])
-            ], remainder = 'passthrough', verbose_feature_names_out=False)
-
-            logging.info("scale_trf created")
-
-            # Creating a list of all the ColumnTransformers to return
-            List_Column_transformers: List[ColumnTransformer] = [select_trf,
-                                                                 pre_trf,
-                                                                 pre_rate_trf,
-                                                                 imp_rate_trf,
-                                                                 encode_trf,
-                                                                 scale_trf]
-            logging.info("List of Column Transformers complete")
-
-
-            logging.info("get_transformers() complete")
-            
-
-            return List_Column_transformers
-        
-        except Exception as e:
-            raise CustomException(e, sys)
+import pandas as pd
+import numpy as np
+import sys
+import logging
+
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.preprocessing import OrdinalEncoder
+from sklearn.preprocessing import MinMaxScaler
+
+from src.components.transformation_components.transformation_functions import Transformation_functions
+from src.components.transformation_components.multi_hot_encoder import MultiHotEncoder
+
+from src.exception import CustomException
+
+from typing import List
+
+
+logger = logging.getLogger(__name__)
+
+class Column_Transformers:
+    """
+    class Column_Transformers:
+        * __init__(copy: bool = True, rest_type_encoding: str = 'explode') -> None
+        * get_transformers() -> List[ColumnTransformer]
+
+        This class is used to initialize ColumnTransformers for Data Transformation.
+        The get_transformers() initializes ColumnTransfomers and returns a list of 
+        ColumnTransformers. copy is passed on to Transformation_functions().
+
+        rest_type_encoding selects how the tags of rest_type become features:
+
+        * explode: One row per tag, each OrdinalEncoded and MinMax scaled
+        * multi_hot: One row per restaurant with a 0/1 column per tag, see MultiHotEncoder()
+
+    """
+    REST_TYPE_ENCODINGS: List[str] = ['explode', 'multi_hot']
+
+    def __init__(self, copy: bool = True, rest_type_encoding: str = 'explode') -> None:
+        if rest_type_encoding not in self.REST_TYPE_ENCODINGS:
+            raise ValueError(f"rest_type_encoding must be one of {self.REST_TYPE_ENCODINGS}, not {rest_type_encoding!r}")
+
+        self.copy = copy
+        self.rest_type_encoding = rest_type_encoding
+
+    def get_transformers(self) -> List[ColumnTransformer]:
+        """
+        This function initializes ColumnTransforms and creates a list of 
+        them to return.
+
+        * select_trf: Select important feature columns and drop the rest
+        * pre_trf: Preprocess dataset using Transformation_functions().preprocess() for further transformation,
+          or preprocess_tags() with the multi_hot encoding
+        * pre_rate_trf: Preprocess rate column using Transformation_functions().prep_rate()
+        * imp_rate_trf: Impute rate column using SimpleImputer()
+        * encode_trf: Encode some columns using OrdinalEncoder, and rest_type using MultiHotEncoder
+          with the multi_hot encoding
+        * scale_trf: Scale some columns using MinMaxScale(), the multi-hot columns are already 0/1
+        * List_Column_transformers: List of all the ColumnTransformers
+        
+        """
+        try:
+            logger.info("get_transformers() has begun")
+
+            # Transformer to select important features
+            select_trf: ColumnTransformer = ColumnTransformer(transformers=[
+                ("SelectColumns", 'passthrough', ['online_order',
+                                                  'book_table',
+                                                  'rate',
+                                                  'votes',
+                                                  'location',
+                                                  'rest_type',
+                                                  'approx_cost(for two people)',
+                                                  'listed_in(type)'])
+            ], verbose_feature_names_out=False)
+
+            logger.info("select_trf created")
+
+
+            multi_hot: bool = self.rest_type_encoding == 'multi_hot'
+
+            # Transformer to do necessary preprocessing
+            transformation_functions = Transformation_functions(copy=self.copy)
+            preprocess = transformation_functions.preprocess_tags if multi_hot else transformation_functions.preprocess
+            pre_trf: ColumnTransformer = ColumnTransformer(transformers=[
+                ("Preprocess", FunctionTransformer(preprocess), slice(0,8))
+            ], verbose_feature_names_out=False)
+
+            logger.info("pre_trf created")
+
+
+            # Transformer to preprocess 'rate' column
+            pre_rate_trf: ColumnTransformer = ColumnTransformer(transformers=[
+                ("PreprocessRate", FunctionTransformer(Transformation_functions(copy=self.copy).prep_rate), slice(0,8))
+            ], verbose_feature_names_out=False)
+
+            logger.info("pre_rate_trf created")
+
+
+            # Transformer to impute 'rate' column
+            imp_rate_trf: ColumnTransformer = ColumnTransformer(transformers=[
+                ("SimpleImputer", SimpleImputer(missing_values=0.0, strategy="mean"), ['rate'])
+            ], remainder = 'passthrough', verbose_feature_names_out=False)
+
+            logger.info("imp_rate_trf created")
+
+
+            # Transformer to Ordinal Encode columns, rest_type is multi-hot encoded instead with multi_hot
+            if multi_hot:
+                encode_trf: ColumnTransformer = ColumnTransformer(transformers=[
+                    ("OrdinalEncoder", OrdinalEncoder(), ['online_order',
+                                                          'book_table',
+                                                          'location',
+                                                          'listed_in(type)']),
+                    ("MultiHotEncoder", MultiHotEncoder(), ['rest_type'])
+                ], remainder = 'passthrough', verbose_feature_names_out=False)
+            else:
+                encode_trf = ColumnTransformer(transformers=[
+                    ("OrdinalEncoder", OrdinalEncoder(), ['online_order',
+                                                          'book_table',
+                                                          'location',
+                                                          'rest_type',
+                                                          'listed_in(type)'])
+                ], remainder = 'passthrough', verbose_feature_names_out=False)
+
+            logger.info("encode_trf created")
+
+
+            # Transformer to MinMax scale columns
+            scale_columns: List[str] = ['location', 'votes'] if multi_hot else ['location', 'rest_type', 'votes']
+            scale_trf: ColumnTransformer = ColumnTransformer(transformers=[
+                ("MinMaxScaler", MinMaxScaler(), scale_columns)
+            ], remainder = 'passthrough', verbose_feature_names_out=False)
+
+            logger.info("scale_trf created")
+
+            # Creating a list of all the ColumnTransformers to return
+            List_Column_transformers: List[ColumnTransformer] = [select_trf,
+                                                                 pre_trf,
+                                                                 pre_rate_trf,
+                                                                 imp_rate_trf,
+                                                                 encode_trf,
+                                                                 scale_trf]
+            logger.info("List of Column Transformers complete")
+
+
+            logger.info("get_transformers() complete")
+            
+
+            return List_Column_transformers
+        
+        except Exception as e:
+            raise CustomException(e, sys)
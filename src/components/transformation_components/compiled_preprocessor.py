@@ -0,0 +1,301 @@
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.components.transformation_components.rate_parsing import UNRATED, parse_rate
+
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Tuple
+
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledPreprocessor:
+    """
+    class CompiledPreprocessor:
+        * __init__(preprocessor: Pipeline) -> None
+        * transform(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]
+        * transform_record(book, delivery, rate, votes, location, type_tag, r_type) -> np.ndarray
+        * parse_rate_value(rate) -> float
+        * check_parity(preprocessor: Pipeline, df: pd.DataFrame) -> None
+
+        This class compiles the fitted preprocessor from DataTransformation().get_data_transformer_object()
+        into lookup tables and arrays, so that prediction does not go through six
+        ColumnTransformers that each rebuild a DataFrame:
+
+        * select_columns: Columns kept by the Feature_Selection step
+        * rate_fill: Mean used by the SimpleImpute_rate step for missing ratings
+        * category_codes: OrdinalEncoder categories of every encoded column, as pd.Index,
+          and the MultiHotEncoder tags of rest_type with the multi_hot encoding
+        * rest_type_encoding: "explode" or "multi_hot", see Column_Transformers()
+        * tag_columns: Multi-hot columns of the tags of rest_type, empty with explode
+        * scale_columns, scale_min, scale_scale: MinMaxScaler columns, min_ and scale_
+        * feature_names_out: Columns of X in the order the model was trained on
+
+        transform() gives the same numbers as preprocessor.transform(), as NumPy
+        arrays instead of a DataFrame and a Series.
+
+    """
+    # Values replaced by 0.0 in Transformation_functions().prep_rate()
+    UNRATED: FrozenSet[str] = UNRATED
+    TARGET: str = 'approx_cost(for two people)'
+
+    def __init__(self, preprocessor: 'Pipeline') -> None:
+        try:
+            steps: dict = preprocessor.named_steps
+
+            # Columns selected from the raw data
+            self.select_columns: List[str] = list(steps['Feature_Selection'].transformers_[0][2])
+
+            # Mean rating used to impute missing ratings
+            imputer = steps['SimpleImpute_rate'].named_transformers_['SimpleImputer']
+            self.rate_missing: float = float(imputer.missing_values)
+            self.rate_fill: float = float(imputer.statistics_[0])
+
+            # Category lookup tables of the OrdinalEncoder
+            encode_trf = steps['OrdinalEncode']
+            encoder = encode_trf.named_transformers_['OrdinalEncoder']
+            encode_columns: List[str] = list(encode_trf.transformers_[0][2])
+            self.category_codes: Dict[str, pd.Index] = {
+                column: pd.Index(categories) for column, categories in zip(encode_columns, encoder.categories_)
+            }
+
+            # Tags of the MultiHotEncoder, coded by their position among the multi-hot columns
+            self.rest_type_encoding: str = 'explode'
+            self.tag_columns: List[str] = []
+            if 'MultiHotEncoder' in encode_trf.named_transformers_:
+                tag_encoder = encode_trf.named_transformers_['MultiHotEncoder']
+                self.rest_type_encoding = 'multi_hot'
+                self.tag_columns = [str(name) for name in tag_encoder.get_feature_names_out()]
+                self.category_codes['rest_type'] = pd.Index(tag_encoder.categories_)
+
+            self.category_dicts: Dict[str, dict] = {
+                column: {value: float(code) for code, value in enumerate(categories)}
+                for column, categories in self.category_codes.items()
+            }
+
+            # min_ and scale_ arrays of the MinMaxScaler
+            scale_trf = steps['MinMaxScale']
+            scaler = scale_trf.named_transformers_['MinMaxScaler']
+            self.scale_columns: List[str] = list(scale_trf.transformers_[0][2])
+            self.scale_min: np.ndarray = np.asarray(scaler.min_, dtype=np.float64)
+            self.scale_scale: np.ndarray = np.asarray(scaler.scale_, dtype=np.float64)
+
+            # Feature order after the last ColumnTransformer, without the target
+            self.feature_names_out: List[str] = [
+                name for name in scale_trf.get_feature_names_out() if name != self.TARGET
+            ]
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _encode(self, column: str, values: np.ndarray) -> np.ndarray:
+        """
+        This function maps values of a column to their OrdinalEncoder codes and
+        raises on categories unseen during fit, like OrdinalEncoder does.
+
+        """
+        codes: np.ndarray = self.category_codes[column].get_indexer(values)
+        if (codes < 0).any():
+            unknown: list = pd.unique(values[codes < 0]).tolist()
+            raise ValueError(f"Found unknown categories {unknown} in column {column} during transform")
+
+        return codes.astype(np.float64)
+
+    def _encode_tags(self, values: np.ndarray) -> np.ndarray:
+        """
+        This function maps the rest_type of every row to its 0/1 row of tags,
+        like MultiHotEncoder does, splitting every distinct value once.
+
+        """
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        tags: pd.Index = self.category_codes['rest_type']
+
+        rows: np.ndarray = np.zeros((len(uniques), len(tags)), dtype=np.float64)
+        for i, value in enumerate(uniques):
+            positions: np.ndarray = tags.get_indexer(str(value).split(', '))
+            if (positions < 0).any():
+                unknown: list = [tag for tag in str(value).split(', ') if tag not in self.category_dicts['rest_type']]
+                raise ValueError(f"Found unknown categories {unknown} in column rest_type during transform")
+            rows[i, positions] = 1.0
+
+        return rows[codes]
+
+    def _parse_rate(self, rate: pd.Series) -> np.ndarray:
+        """
+        This function parses and imputes the rate column like prep_rate() and
+        SimpleImputer do.
+
+        """
+        rate = rate.where(~(rate.isin(self.UNRATED) | rate.isna()), 0.0)
+        parsed: np.ndarray = rate.to_numpy().astype('U3').astype(np.float64)
+        parsed[parsed == self.rate_missing] = self.rate_fill
+
+        return parsed
+
+    def _assemble(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        This function scales the MinMaxScaler columns and stacks all features in
+        model order. With the multi_hot encoding rest_type is either a 0/1
+        matrix of the tags of every row, or the code of a single tag per row.
+
+        """
+        if self.tag_columns:
+            tags: np.ndarray = features.pop('rest_type')
+            if tags.ndim == 1:
+                tags = (tags[:, None] == np.arange(len(self.tag_columns))).astype(np.float64)
+            for i, column in enumerate(self.tag_columns):
+                features[column] = tags[:, i]
+
+        scaled: np.ndarray = np.column_stack([features[column] for column in self.scale_columns])
+        scaled *= self.scale_scale
+        scaled += self.scale_min
+        for i, column in enumerate(self.scale_columns):
+            features[column] = scaled[:, i]
+
+        return np.column_stack([features[column] for column in self.feature_names_out])
+
+    def transform(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        This function transforms raw data into the feature matrix X and target
+        y, dropping and exploding rows like Transformation_functions().preprocess(),
+        or sorting the tags like preprocess_tags() with the multi_hot encoding.
+
+        * data: Selected columns with NULL rows dropped, exploded by rest_type
+        * features: Dictionary of feature arrays
+
+        """
+        try:
+            data: pd.DataFrame = df[self.select_columns]
+
+            # Dropping rows where price or rest_type in NULL
+            data = data[data[self.TARGET].notna() & data['rest_type'].notna()]
+
+            if self.tag_columns:
+                # Keeping one row per restaurant with its tags deduplicated and sorted
+                codes, uniques = pd.factorize(data['rest_type'])
+                tag_sets: np.ndarray = np.array([', '.join(sorted(set(str(x).split(', ')))) for x in uniques], dtype=object)
+                data = data.assign(rest_type=tag_sets[codes]).drop_duplicates()
+            else:
+                # Splitting clustered values in rest_type into multiple rows
+                data = data.assign(rest_type=data['rest_type'].astype(str).str.split(', '))
+                data = data.explode('rest_type').drop_duplicates()
+
+            features: Dict[str, np.ndarray] = {
+                'rate': self._parse_rate(data['rate']),
+                'votes': np.asarray(data['votes'].to_numpy(), dtype=np.float64)
+            }
+            for column in self.category_codes:
+                if column == 'rest_type' and self.tag_columns:
+                    features[column] = self._encode_tags(data[column].to_numpy())
+                else:
+                    features[column] = self._encode(column, data[column].to_numpy())
+
+            X: np.ndarray = self._assemble(features)
+            y: np.ndarray = data[self.TARGET].astype(str).str.replace(',', '', regex=False).to_numpy().astype(np.float64)
+
+            return X, y
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def parse_rate_value(self, rate) -> float:
+        """
+        This function parses and imputes a single rating like _parse_rate().
+
+        """
+        rate_value: float = parse_rate(rate)
+        if rate_value == self.rate_missing:
+            rate_value = self.rate_fill
+
+        return rate_value
+
+    def transform_record(self,
+                         book: str,
+                         delivery: str,
+                         rate: str,
+                         votes: int,
+                         location: str,
+                         type_tag: str,
+                         r_type: str) -> np.ndarray:
+        """
+        This function transforms the fields of a single form submission straight
+        into its feature matrix, one row per type tag, or a single multi-hot row
+        with the multi_hot encoding, without pandas.
+
+        """
+        try:
+            # One row per distinct type tag, like explode() and drop_duplicates()
+            tags: List[str] = list(dict.fromkeys(str(type_tag).split(', ')))
+
+            # Parsing and imputing rate
+            rate_value: float = self.parse_rate_value(rate)
+
+            values: dict = {
+                'online_order': delivery,
+                'book_table': book,
+                'location': location,
+                'listed_in(type)': r_type
+            }
+            codes: dict = {}
+            for column, value in values.items():
+                if value not in self.category_dicts[column]:
+                    raise ValueError(f"Found unknown categories [{value!r}] in column {column} during transform")
+                codes[column] = self.category_dicts[column][value]
+
+            unknown: list = [tag for tag in tags if tag not in self.category_dicts['rest_type']]
+            if unknown:
+                raise ValueError(f"Found unknown categories {unknown} in column rest_type during transform")
+
+            tag_codes: np.ndarray = np.array([self.category_dicts['rest_type'][tag] for tag in tags])
+
+            # The tags of the restaurant set on its single row
+            if self.tag_columns:
+                tag_row: np.ndarray = np.zeros((1, len(self.tag_columns)))
+                tag_row[0, tag_codes.astype(np.int64)] = 1.0
+                tag_codes = tag_row
+
+            n: int = len(tag_codes)
+            features: Dict[str, np.ndarray] = {column: np.full(n, code) for column, code in codes.items()}
+            features['rest_type'] = tag_codes
+            features['rate'] = np.full(n, rate_value)
+            features['votes'] = np.full(n, float(votes))
+
+            return self._assemble(features)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def check_parity(self, preprocessor: 'Pipeline', df: pd.DataFrame) -> None:
+        """
+        This function raises if transform() does not give exactly the same X and
+        y as preprocessor.transform() on df.
+
+        """
+        try:
+            logger.info("check_parity() has begun")
+
+            from sklearn import config_context
+
+            with config_context(transform_output="pandas"):
+                X_expected, y_expected = preprocessor.transform(df)
+            X, y = self.transform(df)
+
+            if list(X_expected.columns) != self.feature_names_out:
+                raise ValueError("Compiled preprocessor feature order differs from preprocessor")
+            if not np.array_equal(X, X_expected.to_numpy(dtype=np.float64)):
+                raise ValueError("Compiled preprocessor features differ from preprocessor")
+            if not np.array_equal(y, y_expected.to_numpy(dtype=np.float64)):
+                raise ValueError("Compiled preprocessor target differs from preprocessor")
+
+            logger.info(f"Compiled preprocessor matches preprocessor on {len(X)} rows")
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from typing import List
+
+
+class MultiHotEncoder(TransformerMixin, BaseEstimator):
+    """
+    class MultiHotEncoder:
+        * __init__(separator: str = ', ') -> None
+        * fit(X: pd.DataFrame, y=None) -> MultiHotEncoder
+        * transform(X: pd.DataFrame) -> np.ndarray
+        * get_feature_names_out(input_features=None) -> np.ndarray
+
+        This class encodes a column of tags joined by separator, e.g. rest_type
+        "Casual Dining, Bar", into one 0/1 column per tag seen during fit, named
+        <column>_<tag> like OneHotEncoder names its columns. Every restaurant
+        stays on a single row, where the explode encoding gives it one row per
+        tag. Like OrdinalEncoder, it raises on tags unseen during fit.
+
+        * categories_: Sorted tags seen during fit
+
+    """
+    def __init__(self, separator: str = ', ') -> None:
+        self.separator = separator
+
+    @staticmethod
+    def _values(X) -> np.ndarray:
+        """
+        This function returns the single column of X as a 1-D array.
+
+        """
+        if isinstance(X, pd.DataFrame):
+            return X.iloc[:, 0].to_numpy()
+
+        return np.asarray(X, dtype=object).reshape(len(X), -1)[:, 0]
+
+    def fit(self, X, y=None) -> 'MultiHotEncoder':
+        """
+        This function collects the tags of every distinct value of X.
+
+        """
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object) if isinstance(X, pd.DataFrame) else None
+        self.n_features_in_ = 1
+
+        uniques: np.ndarray = pd.unique(self._values(X))
+        tags: set = {tag for value in uniques for tag in str(value).split(self.separator)}
+        self.categories_ = np.array(sorted(tags), dtype=object)
+
+        return self
+
+    def transform(self, X) -> np.ndarray:
+        """
+        This function builds the 0/1 row of every distinct value of X once and
+        gathers them back for all rows.
+
+        * rows: 0/1 row of every distinct value
+
+        """
+        codes, uniques = pd.factorize(self._values(X), use_na_sentinel=False)
+        tag_index: pd.Index = pd.Index(self.categories_)
+
+        rows: np.ndarray = np.zeros((len(uniques), len(self.categories_)), dtype=np.float64)
+        for i, value in enumerate(uniques):
+            tags: List[str] = str(value).split(self.separator)
+            positions: np.ndarray = tag_index.get_indexer(tags)
+            if (positions < 0).any():
+                unknown: list = [tag for tag, position in zip(tags, positions) if position < 0]
+                raise ValueError(f"Found unknown categories {unknown} in column {self._column()} during transform")
+            rows[i, positions] = 1.0
+
+        return rows[codes]
+
+    def _column(self) -> str:
+        return 'x0' if self.feature_names_in_ is None else str(self.feature_names_in_[0])
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        column: str = self._column() if input_features is None else str(input_features[0])
+
+        return np.array([f"{column}_{tag}" for tag in self.categories_], dtype=object)
@@ -0,0 +1,38 @@
+import math
+
+from typing import FrozenSet
+
+
+# Ratings of restaurants that have none yet, read as 0.0 like a missing rating
+UNRATED: FrozenSet[str] = frozenset({'NEW', '-'})
+
+
+def is_unrated(rate) -> bool:
+    """
+    This function returns True for ratings read as 0.0: None, NaN and the
+    values of UNRATED.
+
+    """
+    if rate is None:
+        return True
+    if isinstance(rate, float):
+        return math.isnan(rate)
+
+    return isinstance(rate, str) and rate in UNRATED
+
+
+def parse_rate(rate) -> float:
+    """
+    This function parses a single rating the way the training pipeline does:
+    unrated values are 0.0, anything else is the float of its first three
+    characters, so "4.1/5" is 4.1. It raises ValueError for values that do not
+    parse, like "" or "abc", as the pipeline does.
+
+    This module imports nothing but the standard library, so the spawned
+    workers of the InferencePool can use it.
+
+    """
+    if is_unrated(rate):
+        return 0.0
+
+    return float(str(rate)[:3])
@@ -1,108 +1,220 @@
-import pandas as pd
-import numpy as np
-import sys
-
-from src.exception import CustomException
-from src.logger import logging
-
-class Transformation_functions:
-    """
-    class Transfomation_functions:
-        * __init__() -> None
-        * preprocess(df: pd.DataFrame) -> pd.DataFrame
-        * prep_rate(df: pd.DataFrame) -> pd.DataFrame
-        * X_y_split(df: pd.DataFrame) -> pd.DataFrame
-
-        This class contains necessary functions for data transformation.
-    """
-
-    def __init__(self) -> None:
-        pass
-    
-    # Function for important preprocessing
-    def preprocess(self, df: pd.DataFrame) -> pd.DataFrame:
-        """ 
-        This function drops rows with NULL values in columns
-        'approx_cost(for two people)' and 'rest_type'. Then
-        the dataset is exploded by 'rest_type.
-  
-        """
-        try:
-            logging.info("preproces() has begun")
-
-            # Dropping rows where price or rest_type in NULL
-            df = df[df['approx_cost(for two people)'].notna()]
-            df = df[df['rest_type'].notna()]
-
-            logging.info("NULL removed from DataFrame")
-
-
-            # Splitting clustered values in rest_type into multiple rows
-            df['rest_type'] = df['rest_type'].apply(lambda x: str(x).split(', '))
-            df = df.explode('rest_type')
-
-            logging.info("DataFrame exploded")
-
-
-            # Dropping duplicates
-            df.drop_duplicates(inplace=True)
-
-            logging.info("Duplicates dropped")
-
-
-            logging.info("preproces() has ended")
-
-            return df
-        
-        except Exception as e:
-            raise CustomException(e, sys)
-
-
-    # Function to preprocess feature rate
-    def prep_rate(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        This function changes values 'NEW', '-', np.nan to 0 and
-        converts feature 'rate' to float type.
-
-        """
-        try:
-            logging.info("prep_rate() has begun")
-
-            df['rate'].replace(['NEW', '-', np.nan], 0.0, inplace=True)
-            df['rate'] = df['rate'].apply(lambda x: float(str(x)[:3]))
-
-            logging.info("prep_rate() has ended")
-
-            return df
-        
-        except Exception as e:
-            raise CustomException(e, sys)
-
-
-    # Function to split features and target variable
-    def X_y_split(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        This function splits features and target variable into
-        X and y and converts target variable into float type.
-  
-        """
-        try:
-            logging.info("X_y_split() has begun")
-
-            X: pd.DataFrame = df.drop('approx_cost(for two people)', axis=1)
-            y: pd.Series = df['approx_cost(for two people)']
-
-            logging.info("X and y created")
-
-            # Converting 'approx_cost(for two people)' to float
-            y = y.apply(lambda x: float(str(x).replace(',','')))
-            
-            logging.info("y preprocessed")
-
-
-            logging.info("X_y_split() has ended")
-
-            return X,y
-        
-        except Exception as e:
+import pandas as pd
+import numpy as np
+import sys
+import warnings
+import contextlib
+import logging
+
+from src.exception import CustomException
+from src.components.transformation_components.rate_parsing import UNRATED, parse_rate
+
+
+logger = logging.getLogger(__name__)
+
+# Not defined by pandas versions where copy-on-write is always on
+SettingWithCopyWarning = getattr(pd.errors, 'SettingWithCopyWarning', None)
+
+class Transformation_functions:
+    """
+    class Transfomation_functions:
+        * __init__(copy: bool = True) -> None
+        * preprocess(df: pd.DataFrame) -> pd.DataFrame
+        * preprocess_tags(df: pd.DataFrame) -> pd.DataFrame
+        * prep_rate(df: pd.DataFrame) -> pd.DataFrame
+        * X_y_split(df: pd.DataFrame) -> pd.DataFrame
+
+        This class contains necessary functions for data transformation. The
+        functions avoid row-wise apply(). rest_type, rate and price only take a
+        few hundred distinct values, so every column is factorized, the distinct
+        values are parsed once and the result is gathered back with NumPy
+        indexing. With copy=True the functions work on their own copy of the
+        DataFrame, with copy=False they skip that copy and write into the
+        DataFrame they are given.
+    """
+    # Class level default for preprocessors pickled before copy existed
+    copy: bool = True
+
+    def __init__(self, copy: bool = True) -> None:
+        self.copy = copy
+
+    @contextlib.contextmanager
+    def _writing_in_place(self):
+        """
+        With copy=False writing into a slice of the caller's DataFrame is
+        intended, so SettingWithCopyWarning is silenced.
+  
+        """
+        if self.copy or SettingWithCopyWarning is None:
+            yield
+            return
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', SettingWithCopyWarning)
+            yield
+    
+    # Function for important preprocessing
+    def preprocess(self, df: pd.DataFrame) -> pd.DataFrame:
+        """ 
+        This function drops rows with NULL values in columns
+        'approx_cost(for two people)' and 'rest_type'. Then
+        the dataset is exploded by 'rest_type.
+  
+        """
+        try:
+            logger.info("preproces() has begun")
+
+            # Dropping rows where price or rest_type in NULL
+            mask: pd.Series = df['approx_cost(for two people)'].notna() & df['rest_type'].notna()
+            if self.copy:
+                df = df[mask].copy()
+            elif not mask.all():
+                df = df[mask]
+
+            logger.info("NULL removed from DataFrame")
+
+
+            # Splitting every distinct rest_type once
+            codes, uniques = pd.factorize(df['rest_type'])
+            unique_tags: list = [str(x).split(', ') for x in uniques]
+            unique_counts: np.ndarray = np.array([len(tags) for tags in unique_tags], dtype=np.int64)
+            unique_starts: np.ndarray = np.concatenate(([0], np.cumsum(unique_counts)[:-1]))
+            flat_tags: np.ndarray = np.array([tag for tags in unique_tags for tag in tags], dtype=object)
+
+            # Position of every exploded row's tag in flat_tags
+            counts: np.ndarray = unique_counts[codes]
+            row_starts: np.ndarray = np.repeat(np.cumsum(counts) - counts, counts)
+            tag_index: np.ndarray = np.repeat(unique_starts[codes], counts) + np.arange(counts.sum()) - row_starts
+
+            # Repeating every row once per tag, like df.explode('rest_type')
+            df = df.take(np.repeat(np.arange(len(df)), counts))
+            df['rest_type'] = flat_tags[tag_index]
+
+            logger.info("DataFrame exploded")
+
+
+            # Dropping duplicates
+            df.drop_duplicates(inplace=True)
+
+            logger.info("Duplicates dropped")
+
+
+            logger.info("preproces() has ended")
+
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    # Function for preprocessing without exploding
+    def preprocess_tags(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        This function drops rows with NULL values in columns
+        'approx_cost(for two people)' and 'rest_type' like preprocess(),
+        but keeps one row per restaurant for MultiHotEncoder. The tags of
+        'rest_type' are deduplicated and sorted, so that restaurants listing
+        the same tags in another order are duplicates.
+
+        """
+        try:
+            logger.info("preprocess_tags() has begun")
+
+            # Dropping rows where price or rest_type in NULL
+            mask: pd.Series = df['approx_cost(for two people)'].notna() & df['rest_type'].notna()
+            if self.copy:
+                df = df[mask].copy()
+            elif not mask.all():
+                df = df[mask]
+
+            logger.info("NULL removed from DataFrame")
+
+
+            # Sorting the tags of every distinct rest_type once
+            codes, uniques = pd.factorize(df['rest_type'])
+            tag_sets: np.ndarray = np.array([', '.join(sorted(set(str(x).split(', ')))) for x in uniques], dtype=object)
+
+            with self._writing_in_place():
+                df['rest_type'] = tag_sets[codes]
+
+            logger.info("Tags sorted")
+
+
+            # Dropping duplicates
+            df = df.drop_duplicates()
+
+            logger.info("Duplicates dropped")
+
+
+            logger.info("preprocess_tags() has ended")
+
+            return df
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    # Function to preprocess feature rate
+    def prep_rate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        This function changes values 'NEW', '-', np.nan to 0 and
+        converts feature 'rate' to float type.
+
+        """
+        try:
+            logger.info("prep_rate() has begun")
+
+            if self.copy:
+                df = df.copy()
+
+            # Replacing 'NEW', '-' and NULL with 0.0
+            rate: pd.Series = df['rate']
+            rate = rate.mask(rate.isin(UNRATED) | rate.isna(), 0.0)
+
+            # Parsing every distinct rating once with parse_rate()
+            codes, uniques = pd.factorize(rate)
+            parsed: np.ndarray = np.array([parse_rate(x) for x in uniques], dtype=np.float64)
+
+            with self._writing_in_place():
+                df['rate'] = parsed[codes]
+
+            logger.info("prep_rate() has ended")
+
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    # Function to split features and target variable
+    def X_y_split(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        This function splits features and target variable into
+        X and y and converts target variable into float type.
+  
+        """
+        try:
+            logger.info("X_y_split() has begun")
+
+            X: pd.DataFrame = df.drop('approx_cost(for two people)', axis=1)
+            y: pd.Series = df['approx_cost(for two people)']
+
+            logger.info("X and y created")
+
+            # Converting 'approx_cost(for two people)' to float
+            if pd.api.types.is_numeric_dtype(y):
+                y = y.astype(np.float64)
+            else:
+                # Parsing every distinct price once
+                codes, uniques = pd.factorize(y, use_na_sentinel=False)
+                parsed: np.ndarray = np.array([float(str(x).replace(',','')) for x in uniques], dtype=np.float64)
+                y = pd.Series(parsed[codes], index=y.index, name=y.name)
+            
+            logger.info("y preprocessed")
+
+
+            logger.info("X_y_split() has ended")
+
+            return X,y
+        
+        except Exception as e:
             raise CustomException(e, sys)
\ No newline at end of file
@@ -1,16 +1,169 @@
-import logging
-import os
-from datetime import datetime
-
-LOG_FILE = f"{datetime.now().strftime('%d_%m_%Y_%H_%M_%S')}.log"
-log_path = os.path.join(os.getcwd(), "logs")
-os.makedirs(log_path,exist_ok=True)
-
-LOG_FILE_PATH=os.path.join(log_path,LOG_FILE)
-
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
-
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from typing import Dict, List, Optional, Type
+
+
+# Subsystems muted in the web process. The transformers log several lines per
+# call, which would be written for every prediction served through the pipeline
+SERVING_LEVELS: Dict[str, str] = {
+    "src.components.transformation_components": "WARNING"
+}
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """
+    This function parses levels of subsystems given as
+    "src.pipelines=WARNING,src.components.model_trainer=DEBUG".
+
+    """
+    levels: Dict[str, str] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = entry.partition("=")
+        levels[name.strip()] = level.strip().upper()
+
+    return levels
+
+
+@dataclass
+class LoggingConfig:
+    """
+    class LoggingConfig is used to initialize logging.
+
+    * log_dir: Directory of the log files, one per process start
+    * level: Level of every logger not given in levels
+    * levels: Level of each subsystem, by logger name prefix (module path), e.g. from
+      LOG_LEVELS="src.components.transformation_components=WARNING"
+    * json_format: Whether records are written as one JSON object per line
+    * console: Whether records are also written to stderr
+
+    """
+    log_dir: str = field(default_factory=lambda: os.path.join(os.getcwd(), "logs"))
+    level: str = os.environ.get("LOG_LEVEL", "INFO")
+    levels: Dict[str, str] = field(default_factory=lambda: parse_levels(os.environ.get("LOG_LEVELS", "")))
+    json_format: bool = os.environ.get("LOG_FORMAT", "json") == "json"
+    console: bool = False
+
+
+class DelayedFileHandler(logging.FileHandler):
+    """
+    FileHandler that creates the logs directory and the log file on the first
+    record instead of when it is created.
+    """
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter writing every record as one JSON object per line, with the time,
+    level, logger, module line, process, thread and message, and the traceback
+    of exceptions.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry)
+
+
+TEXT_FORMAT: str = "[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s"
+
+
+class _LoggingState:
+    """
+    Handlers installed by configure_logging(), restarted in forked children.
+    """
+    queue_handler: Optional[logging.handlers.QueueHandler] = None
+    listener: Optional[logging.handlers.QueueListener] = None
+    handlers: List[logging.Handler] = []
+
+
+def _start_listener() -> None:
+    """
+    This function gives the queue handler a new queue and starts a thread
+    writing its records to the handlers.
+
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _LoggingState.queue_handler.queue = log_queue
+    _LoggingState.listener = logging.handlers.QueueListener(log_queue, *_LoggingState.handlers,
+                                                            respect_handler_level=True)
+    _LoggingState.listener.start()
+
+
+def _restart_after_fork() -> None:
+    # The writer thread does not survive a fork, without a new one the records
+    # of a forked child (e.g. a gunicorn worker) would pile up in the queue
+    if _LoggingState.listener is not None:
+        _start_listener()
+
+
+def stop_logging() -> None:
+    """
+    This function writes the queued records and stops the writer thread.
+
+    """
+    if _LoggingState.listener is not None:
+        _LoggingState.listener.stop()
+        _LoggingState.listener = None
+
+
+def configure_logging(config: Optional[LoggingConfig] = None, levels: Optional[Dict[str, str]] = None) -> None:
+    """
+    This function sets up logging for the process. Records are put on a queue
+    by the thread logging them, and a background thread formats and writes
+    them to the log file, so that no request waits on the disk. levels are
+    applied on top of the levels of config, e.g. SERVING_LEVELS in the web
+    process. Importing src.logger has no side effects, entry points call this
+    function, and calling it again only updates the levels.
+
+    * handlers: File handler, and stderr handler when console is set
+
+    """
+    logging_config: Type[LoggingConfig] = config or LoggingConfig()
+
+    root: logging.Logger = logging.getLogger()
+    root.setLevel(logging_config.level)
+
+    # Subsystem levels, the explicit config taking precedence over the defaults of the entry point
+    for name, level in dict(levels or {}, **logging_config.levels).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _LoggingState.queue_handler is not None:
+        return
+
+    formatter: logging.Formatter = JsonFormatter() if logging_config.json_format else logging.Formatter(TEXT_FORMAT)
+    log_file: str = f"{datetime.now().strftime('%d_%m_%Y_%H_%M_%S')}.log"
+
+    handlers: List[logging.Handler] = [DelayedFileHandler(os.path.join(logging_config.log_dir, log_file), delay=True)]
+    if logging_config.console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _LoggingState.handlers = handlers
+    _LoggingState.queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    root.addHandler(_LoggingState.queue_handler)
+    _start_listener()
+
+    atexit.register(stop_logging)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,362 @@
+import bisect
+import weakref
+import threading
+
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the latency buckets in seconds, from 100 us to 10 s
+LATENCY_BUCKETS: Tuple[float, ...] = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                                      0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the batch size buckets
+SIZE_BUCKETS: Tuple[float, ...] = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+class _ShardHolder:
+    """
+    Values of one thread, dropped with the thread local storage of the thread.
+    """
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self, values: list) -> None:
+        self.values = values
+
+
+class _ShardedValues:
+    """
+    Fixed size list of numbers with one copy per thread. A thread only ever
+    writes its own copy, so updates need no lock, and readers add the copies
+    up. When a thread ends its copy is folded into the retired totals, so that
+    threads started per request do not pile up copies.
+    """
+    def __init__(self, size: int) -> None:
+        self.size: int = size
+        self._local: threading.local = threading.local()
+        # Reentrant, since a finalizer may retire a shard while totals() holds the lock
+        self._lock: threading.RLock = threading.RLock()
+        self._live: List[list] = []
+        self._retired: list = [0] * size
+
+    def shard(self) -> list:
+        try:
+            return self._local.holder.values
+        except AttributeError:
+            holder = _ShardHolder([0] * self.size)
+            with self._lock:
+                self._live.append(holder.values)
+            self._local.holder = holder
+            weakref.finalize(holder, self._retire, holder.values)
+            return holder.values
+
+    def _retire(self, values: list) -> None:
+        with self._lock:
+            self._live = [live for live in self._live if live is not values]
+            self._retired = [retired + value for retired, value in zip(self._retired, values)]
+
+    def totals(self) -> list:
+        with self._lock:
+            totals: list = list(self._retired)
+            for values in self._live:
+                totals = [total + value for total, value in zip(totals, values)]
+
+        return totals
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """
+    This function formats labels as {name="value",...}, escaping the values.
+
+    """
+    pairs: List[str] = []
+    for name, value in zip(names, values):
+        escaped: str = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Metric with optional labels. A child is kept for every combination of
+    label values, created on first use.
+    """
+    TYPE: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        This function returns the child of the given label values.
+
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+
+        return child
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """
+        This function yields the (name suffix, labels, value) of every sample.
+
+        """
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines: List[str] = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_values",)
+
+    def __init__(self) -> None:
+        self._values: _ShardedValues = _ShardedValues(1)
+
+    def inc(self, amount: float = 1) -> None:
+        self._values.shard()[0] += amount
+
+    def value(self) -> float:
+        return self._values.totals()[0]
+
+
+class Counter(_Metric):
+    """
+    class Counter:
+        * labels(*values) -> child with inc(amount: float = 1)
+        * inc(amount: float = 1) -> None
+
+        This class is a monotonic counter, exposed as name_total. Increments
+        are lock free, see _ShardedValues.
+
+    """
+    TYPE: str = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for values, child in list(self._children.items()):
+            yield "_total", _format_labels(self.labelnames, values), child.value()
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "_values")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets: Tuple[float, ...] = buckets
+        # One count per bucket, one for +Inf, and the sum
+        self._values: _ShardedValues = _ShardedValues(len(buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        values: list = self._values.shard()
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def totals(self) -> list:
+        return self._values.totals()
+
+
+class Histogram(_Metric):
+    """
+    class Histogram:
+        * labels(*values) -> child with observe(value: float)
+        * observe(value: float) -> None
+
+        This class counts observations in buckets fixed at creation, exposed as
+        cumulative name_bucket{le=...}, name_sum and name_count. An observation
+        is a bisection and two increments of the preallocated counts of the
+        calling thread, without a lock.
+
+    """
+    TYPE: str = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for values, child in list(self._children.items()):
+            totals: list = child.totals()
+
+            cumulative: int = 0
+            for bound, count in zip(self.buckets + (float("inf"),), totals[:-1]):
+                cumulative += count
+                yield "_bucket", _format_labels(self.labelnames, values, f'le="{_format_value(float(bound))}"'), cumulative
+
+            yield "_sum", _format_labels(self.labelnames, values), totals[-1]
+            yield "_count", _format_labels(self.labelnames, values), cumulative
+
+
+class Gauge(_Metric):
+    """
+    class Gauge:
+        * __init__(name: str, documentation: str, function: Callable, labelnames: Sequence[str] = ()) -> None
+
+        This class reads its value when scraped, from function, which returns
+        a number, or a {label values: number} dictionary when the gauge has
+        labels. Nothing is recorded on the request path.
+
+    """
+    TYPE: str = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.function: Callable = function
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        values = self.function()
+        if values is None:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+
+        for label_values, value in values.items():
+            yield "", _format_labels(self.labelnames, label_values), value
+
+
+class MetricsRegistry:
+    """
+    class MetricsRegistry:
+        * register(metric) -> metric
+        * register_stats(prefix: str, stats: Callable[[], dict], counters: Sequence[str] = ()) -> None
+        * render() -> str
+
+        This class holds the metrics of the process and renders them in the
+        Prometheus text format. Every process keeps its own metrics, so with
+        several web workers each scrape reads the worker that answers it.
+
+    """
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+        return metric
+
+    def register_stats(self, prefix: str, stats: Callable[[], dict], counters: Sequence[str] = ()) -> None:
+        """
+        This function exposes the numbers of a stats() dictionary (e.g. of the
+        prediction cache) as prefix_key gauges read at scrape time, and the keys
+        in counters as counters. Values that are not numbers are skipped.
+
+        """
+        def reader(key: str) -> Callable[[], Optional[float]]:
+            def read() -> Optional[float]:
+                value = stats().get(key)
+                return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+            return read
+
+        for key, value in stats().items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+
+            if key in counters:
+                gauge = Gauge(f"{prefix}_{key}_total", f"{key} of {prefix} stats()", reader(key))
+                gauge.TYPE = "counter"
+            else:
+                gauge = Gauge(f"{prefix}_{key}", f"{key} of {prefix} stats()", reader(key))
+            self.register(gauge)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics: List[_Metric] = list(self._metrics.values())
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of the process, rendered by the /metrics endpoint
+REGISTRY: MetricsRegistry = MetricsRegistry()
+
+REQUESTS: Counter = REGISTRY.register(Counter(
+    "http_requests", "HTTP requests answered, by route and status", ["route", "status"]))
+
+REQUEST_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request, by route", LATENCY_BUCKETS, ["route"]))
+
+STAGE_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "prediction_stage_duration_seconds",
+    "Time spent in each stage of serving a prediction (parse, cache, lookup, queue, preprocess, predict, render)",
+    LATENCY_BUCKETS, ["stage"]))
+
+BATCH_SIZE: Histogram = REGISTRY.register(Histogram(
+    "prediction_batch_size", "Restaurants predicted together by one model call", SIZE_BUCKETS))
+
+PREDICTIONS: Counter = REGISTRY.register(Counter(
+    "predictions", "Restaurants predicted, by source (table, runtime or model)", ["source"]))
+
+
+def register_model_metrics(model_registry, registry: MetricsRegistry = REGISTRY) -> None:
+    """
+    This function exposes the model served by a ModelRegistry: its version and
+    whether it is served from the inference runtime as model_info labels, and
+    how long it took to load and when. The snapshot is read at scrape time, so
+    the gauges follow reloads.
+
+    """
+    def snapshot():
+        try:
+            return model_registry.get()
+        except Exception:
+            # A model that cannot be loaded is reported by the absence of model_info
+            return None
+
+    def info() -> Optional[dict]:
+        artifacts = snapshot()
+        if artifacts is None:
+            return None
+        return {(artifacts.version, "runtime" if artifacts.runtime is not None else "model"): 1}
+
+    def load_seconds() -> Optional[float]:
+        artifacts = snapshot()
+        return None if artifacts is None else artifacts.load_time
+
+    def loaded_at() -> Optional[float]:
+        artifacts = snapshot()
+        return None if artifacts is None else artifacts.loaded_at
+
+    registry.register(Gauge("model_info", "Model version served, always 1", info, ["version", "served_from"]))
+    registry.register(Gauge("model_load_seconds", "Seconds taken to load the model served", load_seconds))
+    registry.register(Gauge("model_loaded_timestamp_seconds", "Unix time the model served was loaded", loaded_at))
@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import queue
+import threading
+import logging
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from src.exception import CustomException
+from src.pipelines.predict_pipeline import PredictPipeline
+from src.request_timing import timed, current_timings, start_request_timing, add_timing
+from src.metrics import STAGE_SECONDS
+
+from typing import Dict, List, Optional, Tuple, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchSchedulerConfig:
+    """
+    class BatchSchedulerConfig is used to initialize how requests are grouped
+    into batches.
+
+    * max_batch_size: Largest number of requests predicted together
+    * max_wait_ms: Longest time the first request of a batch waits for others
+
+    """
+    max_batch_size: int = 32
+    max_wait_ms: float = 5.0
+
+
+@dataclass
+class BatchSchedulerMetrics:
+    """
+    class BatchSchedulerMetrics holds the counters reported by the scheduler.
+    It is only written by the scheduler thread.
+
+    * batches: Number of batches predicted
+    * requests: Number of requests predicted
+    * batch_sizes: Number of batches of every size
+    * queue_wait_total: Seconds requests spent in the queue, summed
+    * queue_wait_max: Longest time a request spent in the queue
+
+    """
+    batches: int = 0
+    requests: int = 0
+    batch_sizes: Dict[int, int] = field(default_factory=dict)
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+
+    def snapshot(self) -> dict:
+        """
+        This function returns the counters along with mean batch size and mean
+        queue wait.
+
+        """
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "batch_sizes": dict(self.batch_sizes),
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "mean_queue_wait_ms": 1000 * self.queue_wait_total / self.requests if self.requests else 0.0,
+            "max_queue_wait_ms": 1000 * self.queue_wait_max
+        }
+
+
+class MicroBatchScheduler:
+    """
+    class MicroBatchScheduler:
+        * __init__(config: BatchSchedulerConfig = None, pipeline: PredictPipeline = None) -> None
+        * submit(features: pd.DataFrame) -> Future
+        * predict(features: pd.DataFrame, timeout: float = None) -> int
+        * stats() -> dict
+        * stop() -> None
+
+        This class collects single restaurant requests from concurrent callers
+        for up to max_wait_ms (or until max_batch_size requests are waiting),
+        predicts them with one PredictPipeline().predict_batch() call and resolves
+        the Future of every caller with its own prediction. The pandas and sklearn
+        overhead of a call is paid once per batch instead of once per request.
+        When the batch call fails, its requests are predicted one by one so that
+        only the failing ones receive the exception.
+
+    """
+    def __init__(self,
+                 config: Optional[BatchSchedulerConfig] = None,
+                 pipeline: Optional[PredictPipeline] = None) -> None:
+        self.scheduler_config: Type[BatchSchedulerConfig] = config or BatchSchedulerConfig()
+        self.pipeline: Optional[PredictPipeline] = pipeline
+        self.metrics: BatchSchedulerMetrics = BatchSchedulerMetrics()
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+        self._start_lock: threading.Lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        """
+        This function starts the scheduler thread on first use, and again in
+        a forked child, which does not inherit threads.
+
+        """
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+
+        with self._start_lock:
+            if self._worker is None or self._worker_pid != os.getpid() or not self._worker.is_alive():
+                if self._worker_pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run,
+                                                name="micro-batch-scheduler",
+                                                daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, features: pd.DataFrame) -> Future:
+        """
+        This function queues a DataFrame of one restaurant and returns a Future
+        resolving to its prediction. Restaurants found in the prediction table
+        are answered right away without queueing.
+
+        """
+        future: Future = Future()
+
+        with timed("lookup"):
+            prediction: Optional[int] = (self.pipeline or PredictPipeline()).lookup(features)
+        if prediction is not None:
+            future.set_result(prediction)
+            return future
+
+        # Passing the timings of the request along, the batch adds its stages to them
+        self._ensure_worker()
+        self._queue.put((features, future, time.perf_counter(), current_timings()))
+
+        return future
+
+    def predict(self, features: pd.DataFrame, timeout: Optional[float] = None) -> int:
+        """
+        This function queues a DataFrame of one restaurant and waits for its
+        prediction. It is a drop-in replacement for PredictPipeline().predict().
+
+        """
+        return self.submit(features).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        """
+        This function returns batch size and queue wait metrics.
+
+        """
+        return self.metrics.snapshot()
+
+    def stop(self) -> None:
+        """
+        This function stops the scheduler thread after the queued requests are
+        predicted.
+
+        """
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self._worker = None
+
+    def _collect(self) -> Optional[List[Tuple[pd.DataFrame, Future, float, Optional[dict]]]]:
+        """
+        This function blocks for the first request, then gathers more requests
+        until the batch is full or max_wait_ms has passed since the first one.
+        It returns None when the scheduler is stopped.
+
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch: List[Tuple[pd.DataFrame, Future, float, Optional[dict]]] = [first]
+        deadline: float = time.perf_counter() + self.scheduler_config.max_wait_ms / 1000
+
+        while len(batch) < self.scheduler_config.max_batch_size:
+            remaining: float = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                # Predicting what was collected before stopping
+                self._queue.put(None)
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self) -> None:
+        """
+        This function is the scheduler loop. Every batch is concatenated into one
+        DataFrame, predicted at once and split back per request.
+
+        """
+        pipeline: PredictPipeline = self.pipeline or PredictPipeline()
+
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Dropping requests whose callers gave up
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started: float = time.perf_counter()
+            waits: List[float] = [started - submitted for _, _, submitted, _ in batch]
+
+            self.metrics.batches += 1
+            self.metrics.requests += len(batch)
+            self.metrics.batch_sizes[len(batch)] = self.metrics.batch_sizes.get(len(batch), 0) + 1
+            self.metrics.queue_wait_total += sum(waits)
+            self.metrics.queue_wait_max = max(self.metrics.queue_wait_max, max(waits))
+
+            # Timing the stages of the batch, which every request of it waited for
+            batch_timings: dict = start_request_timing()
+
+            try:
+                # Remembering which rows belong to which request
+                frames: List[pd.DataFrame] = [features for features, _, _, _ in batch]
+                request_id: np.ndarray = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+
+                features: pd.DataFrame = pd.concat(frames, ignore_index=True)
+                predictions: pd.Series = pipeline.predict_batch(features)
+                per_request: pd.Series = predictions.groupby(request_id).mean()
+                results: list = [per_request.get(i, np.nan) for i in range(len(batch))]
+
+            except Exception as e:
+                # One bad request must not fail the others, so each is predicted alone
+                logger.error(f"Batch of {len(batch)} requests failed, predicting them one by one: {e}")
+                results = [e] if len(batch) == 1 else [self._predict_alone(pipeline, features)
+                                                       for features, _, _, _ in batch]
+
+            for i, (_, future, _, timings) in enumerate(batch):
+                STAGE_SECONDS.labels("queue").observe(waits[i])
+                add_timing(timings, "queue", waits[i])
+                for stage, seconds in batch_timings.items():
+                    add_timing(timings, stage, seconds)
+                if isinstance(results[i], Exception):
+                    future.set_exception(results[i])
+                    continue
+                try:
+                    future.set_result(int(results[i]))
+                except Exception as e:
+                    future.set_exception(CustomException(e, sys))
+
+    @staticmethod
+    def _predict_alone(pipeline: PredictPipeline, features: pd.DataFrame):
+        """
+        This function predicts the rows of one request and returns their mean,
+        or the exception raised while predicting them.
+
+        """
+        try:
+            return pipeline.predict_batch(features).mean()
+        except Exception as e:
+            return e
@@ -0,0 +1,207 @@
+import os
+import threading
+import multiprocessing
+import logging
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+from src.components.inference_runtime import (InferenceRuntime, RuntimeVersionError, init_worker,
+                                            predict_columns_in_worker)
+from src.pipelines.model_registry import ModelRegistry, ModelRegistryConfig, LoadedArtifacts
+from src.pipelines.predict_pipeline import PredictPipeline
+from src.request_timing import observe_timing
+
+from typing import Dict, List, Optional, Tuple, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InferencePoolConfig:
+    """
+    class InferencePoolConfig is used to initialize the worker processes of the
+    inference pool.
+
+    * n_workers: Worker processes, 0 predicts in the calling process instead
+    * start_method: multiprocessing start method of the workers. "spawn" starts
+      them from a fresh interpreter that imports NumPy and the runtime only,
+      instead of copying the threads and memory of the web process
+    * min_chunk_rows: Fewest rows sent to a worker, smaller batches use fewer workers
+    * runtime_path: Path of the NumPy inference runtime the workers map
+
+    """
+    n_workers: int = int(os.environ.get("INFERENCE_WORKERS", 0))
+    start_method: str = "spawn"
+    min_chunk_rows: int = 16
+    runtime_path: str = field(default_factory=lambda: ModelRegistryConfig().runtime_path)
+
+
+class InferencePool(PredictPipeline):
+    """
+    class InferencePool:
+        * __init__(config: InferencePoolConfig = None, registry: ModelRegistry = None) -> None
+        * start() -> None
+        * predict_batch(features: pd.DataFrame) -> pd.Series
+        * stats() -> dict
+        * stop() -> None
+
+        This class is a PredictPipeline whose predict_batch() runs in a pool of
+        worker processes, so that batches use every core instead of one GIL.
+        Each worker memory maps the same InferenceRuntime file, and the model
+        arrays are held once in the page cache, not once per worker.
+
+        A batch is split into one chunk of at least min_chunk_rows rows per
+        worker, and the chunks are predicted in parallel. Passing the pool as
+        the pipeline of a MicroBatchScheduler batches single requests too.
+        Single restaurants given to predict() and lookups in the prediction
+        table stay in the calling process, where they are cheaper than a round
+        trip to a worker.
+
+        Every chunk carries the model version of the registry snapshot, and the
+        workers map the runtime again when it changes. Batches fall back to
+        PredictPipeline().predict_batch() in the calling process when the
+        registry is not serving a runtime, or when the runtime file is not the
+        version served. A pool whose worker died is dropped, predicted in process,
+        and the next batch starts a new one. Input errors of the workers, like
+        unknown categories, are raised to the caller, which predicts such rows
+        as NaN with predict_rows().
+
+        Run a single web worker with the pool (e.g. gunicorn -w 1), since every
+        web worker starts its own pool.
+
+    """
+    def __init__(self,
+                 config: Optional[InferencePoolConfig] = None,
+                 registry: Optional[ModelRegistry] = None) -> None:
+        super().__init__(registry)
+        self.pool_config: Type[InferencePoolConfig] = config or InferencePoolConfig()
+        self.counters: Dict[str, int] = {"batches": 0, "chunks": 0, "rows": 0, "fallbacks": 0}
+        self._counters_lock: threading.Lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._start_lock: threading.Lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        This function starts the worker processes, again in a forked child,
+        which cannot use the pool of its parent.
+
+        """
+        if self._executor is not None and self._executor_pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                logger.info(f"Starting {self.pool_config.n_workers} inference workers")
+
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.pool_config.n_workers,
+                    mp_context=multiprocessing.get_context(self.pool_config.start_method),
+                    initializer=init_worker,
+                    initargs=(self.pool_config.runtime_path,))
+                self._executor_pid = os.getpid()
+
+    def _chunks(self, n_rows: int) -> List[slice]:
+        """
+        This function splits n_rows positions into one contiguous chunk per
+        worker, each of at least min_chunk_rows rows.
+
+        """
+        n_chunks: int = max(1, min(self.pool_config.n_workers, n_rows // self.pool_config.min_chunk_rows))
+        bounds: np.ndarray = np.linspace(0, n_rows, n_chunks + 1).astype(int)
+
+        return [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def _predict_batch(self, artifacts: LoadedArtifacts, features: pd.DataFrame) -> Tuple[pd.Series, str]:
+        """
+        This function predicts every row of features in the worker processes,
+        with the same output as PredictPipeline()._predict_batch(), which
+        observes the batch in /metrics. The chunks run in parallel, so each
+        stage of the request lasted as long as its slowest chunk.
+
+        * artifacts: Snapshot of the registry, giving the model version
+        * columns: Dataset columns read by the runtime, as lists
+        * results: Predictions and stage timings of every chunk
+
+        """
+        if self.pool_config.n_workers <= 0 or artifacts.runtime is None or len(features) == 0:
+            return super()._predict_batch(artifacts, features)
+
+        self.start()
+
+        columns: Dict[str, list] = {column: features[column].tolist()
+                                    for column in InferenceRuntime.COLUMNS.values()}
+        chunks: List[slice] = self._chunks(len(features))
+
+        executor: ProcessPoolExecutor = self._executor
+        try:
+            futures: List[Future] = [
+                executor.submit(predict_columns_in_worker,
+                                artifacts.version,
+                                {column: values[chunk] for column, values in columns.items()})
+                for chunk in chunks
+            ]
+            results: List[tuple] = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            logger.error(f"Inference worker died, restarting the pool and predicting in process: {e}")
+            self._reset(executor)
+            self._count(fallbacks=1)
+            return super()._predict_batch(artifacts, features)
+        except RuntimeVersionError as e:
+            logger.error(f"Inference runtime is not the version served, predicting in process: {e}")
+            self._count(fallbacks=1)
+            return super()._predict_batch(artifacts, features)
+
+        # Reporting the stages timed in the workers for the request
+        for stage in {stage for _, timings in results for stage in timings}:
+            observe_timing(stage, max(timings.get(stage, 0.0) for _, timings in results))
+
+        self._count(batches=1, chunks=len(chunks), rows=len(features))
+        predictions: np.ndarray = np.concatenate([chunk_predictions for chunk_predictions, _ in results])
+
+        return pd.Series(predictions, index=features.index, name='prediction'), "runtime"
+
+    def _count(self, **increments: int) -> None:
+        """
+        This function adds increments to the counters, which the threads of
+        the web worker update concurrently.
+
+        """
+        with self._counters_lock:
+            for name, increment in increments.items():
+                self.counters[name] += increment
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        """
+        This function drops a broken pool, unless another thread already
+        replaced it, so that start() creates a new one.
+
+        """
+        with self._start_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """
+        This function returns the number of workers and the batches, chunks and
+        rows predicted by them.
+
+        """
+        with self._counters_lock:
+            return dict(self.counters, n_workers=self.pool_config.n_workers)
+
+    def stop(self) -> None:
+        """
+        This function stops the worker processes.
+
+        """
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=True)
+        self._executor = None
@@ -0,0 +1,209 @@
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.pipelines.predict_pipeline import CustomData, CustomBatchData, PredictPipeline
+from src.pipelines.batch_scheduler import MicroBatchScheduler
+from src.pipelines.prediction_cache import PredictionCache
+from src.pipelines.model_registry import get_registry
+from src.request_timing import timed
+from src.components.transformation_components.rate_parsing import is_unrated, parse_rate
+
+from typing import List, Optional, Union
+
+
+logger = logging.getLogger(__name__)
+
+
+class JsonPredictor:
+    """
+    class JsonPredictor:
+        * __init__(scheduler: MicroBatchScheduler = None, prediction_cache: PredictionCache = None, pipeline: PredictPipeline = None) -> None
+        * check_categories(record: dict) -> None
+        * check_values(record: dict) -> None
+        * parse(payload) -> Union[CustomData, List[dict]]
+        * predict(payload) -> dict
+
+        This class answers the JSON API of application.py and asgi.py. A payload
+        is either one restaurant, {"book": ..., "delivery": ..., ...} with the
+        form field names of CustomData, or a batch, a list of such records or
+        {"records": [...]}, whose records may also use the column names of the
+        dataset. Type tags may be given as a list or joined with ', '.
+
+        A single restaurant goes through the prediction cache and the micro-batch
+        scheduler like a form submission and is answered {"prediction": int}.
+        A batch is predicted with one predict_batch() call of pipeline (e.g. an
+        InferencePool) and answered {"predictions": [int or null, ...]}.
+
+        Payloads that are not of this shape, hold categories the model was not
+        trained on, or values that do not parse (a rate or votes that are not
+        numbers, an empty type tag), raise ValueError, which the apps answer
+        with 400.
+
+    """
+    # Form fields of a single restaurant, price is not known at prediction time
+    FIELDS: List[str] = ['book', 'delivery', 'rate', 'votes', 'location', 'type_tag', 'r_type']
+
+    # Form fields holding categories of the OrdinalEncoder
+    CATEGORY_FIELDS: List[str] = ['book', 'delivery', 'location', 'type_tag', 'r_type']
+
+    def __init__(self,
+                 scheduler: Optional[MicroBatchScheduler] = None,
+                 prediction_cache: Optional[PredictionCache] = None,
+                 pipeline: Optional[PredictPipeline] = None) -> None:
+        self.scheduler: MicroBatchScheduler = scheduler or MicroBatchScheduler()
+        self.prediction_cache: PredictionCache = prediction_cache or PredictionCache()
+        self.pipeline: Optional[PredictPipeline] = pipeline
+
+    def check_categories(self, record: dict) -> None:
+        """
+        This function raises ValueError when a category field of record holds
+        a value the preprocessor of the served model does not know. Type tags
+        are checked one by one.
+
+        * tables: Category lookup tables of the runtime or compiled preprocessor
+
+        """
+        artifacts = get_registry().get()
+        tables = artifacts.runtime or artifacts.compiled_preprocessor
+        if tables is None:
+            return
+
+        for name in self.CATEGORY_FIELDS:
+            column: str = CustomBatchData.FIELD_TO_COLUMN[name]
+            value = self._field(record, name)
+            # Missing values are left to the pipeline, which predicts them as null
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                continue
+
+            values: list = list(value) if isinstance(value, (list, tuple)) else [value]
+            if name == 'type_tag':
+                values = [tag for value in values for tag in str(value).split(', ')]
+
+            unknown: list = [value for value in values if value not in tables.category_dicts[column]]
+            if unknown:
+                raise ValueError(f"Unknown {name}: {unknown}")
+
+    @staticmethod
+    def _field(record: dict, name: str):
+        """
+        This function returns a field of record given by its form field name
+        or its dataset column name.
+
+        """
+        return record[name] if name in record else record.get(CustomBatchData.FIELD_TO_COLUMN[name])
+
+    def check_values(self, record: dict) -> None:
+        """
+        This function raises ValueError when the rate or votes of record do not
+        parse as the preprocessor reads them, or when its type tags are empty.
+        Missing values are left to the pipeline, like in check_categories().
+
+        """
+        rate = self._field(record, 'rate')
+        if not is_unrated(rate):
+            try:
+                parse_rate(rate)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid rate: {rate!r}") from None
+
+        votes = self._field(record, 'votes')
+        if votes is not None:
+            try:
+                votes_value: float = float(votes)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid votes: {votes!r}") from None
+            if isinstance(votes, bool) or not np.isfinite(votes_value) or votes_value < 0:
+                raise ValueError(f"Invalid votes: {votes!r}")
+
+        type_tag = self._field(record, 'type_tag')
+        if type_tag is not None:
+            tags: list = list(type_tag) if isinstance(type_tag, (list, tuple)) else [type_tag]
+            if not tags or any(not isinstance(tag, str) or not tag.strip() for tag in tags):
+                raise ValueError(f"Invalid type_tag: {type_tag!r}")
+
+    def parse(self, payload) -> Union[CustomData, List[dict]]:
+        """
+        This function returns the CustomData of a single restaurant, or the
+        records of a batch.
+
+        """
+        if isinstance(payload, dict) and 'records' in payload:
+            payload = payload['records']
+
+        if isinstance(payload, list):
+            for i, record in enumerate(payload):
+                if not isinstance(record, dict):
+                    raise ValueError("Every record of a batch must be a JSON object")
+
+                # Records of a batch may also use the column names of the dataset
+                missing: List[str] = [name for name in self.FIELDS if name not in record
+                                      and CustomBatchData.FIELD_TO_COLUMN[name] not in record]
+                if missing:
+                    raise ValueError(f"Missing fields in record {i}: {missing}")
+                try:
+                    self.check_values(record)
+                except ValueError as e:
+                    raise ValueError(f"Record {i}: {e}") from None
+                self.check_categories(record)
+
+            return payload
+
+        if not isinstance(payload, dict):
+            raise ValueError("Expected a JSON object or a list of JSON objects")
+
+        # Restaurants without a rating are sent with a null rate
+        missing: List[str] = [name for name in self.FIELDS
+                              if name not in payload or (payload[name] is None and name != 'rate')]
+        if missing:
+            raise ValueError(f"Missing fields: {missing}")
+        self.check_values(payload)
+        self.check_categories(payload)
+
+        type_tag = payload['type_tag']
+        if isinstance(type_tag, (list, tuple)):
+            type_tag = ', '.join(type_tag)
+
+        return CustomData(book=payload['book'],
+                          delivery=payload['delivery'],
+                          rate=payload['rate'],
+                          votes=payload['votes'],
+                          location=payload['location'],
+                          type_tag=type_tag,
+                          r_type=payload['r_type'])
+
+    def predict(self, payload) -> dict:
+        """
+        This function predicts a parsed JSON payload. It blocks, so the ASGI app
+        runs it in its executor.
+
+        * data: Single restaurant or records of a batch
+        * predictions: Prediction of every record, NaN for records that cannot
+          be predicted (e.g. an empty type tag)
+
+        """
+        with timed("parse"):
+            data: Union[CustomData, List[dict]] = self.parse(payload)
+
+        try:
+            if isinstance(data, CustomData):
+                return {"prediction": self.prediction_cache.predict(data, self.scheduler.predict)}
+
+            if not data:
+                return {"predictions": []}
+
+            batch_df: pd.DataFrame = CustomBatchData(data).get_data_as_dataframe()
+            predictions: pd.Series = (self.pipeline or PredictPipeline()).predict_batch(batch_df)
+
+            logger.info(f"Predicted a batch of {len(data)} restaurants")
+
+            return {"predictions": [None if np.isnan(y) else int(y) for y in predictions]}
+
+        except ValueError:
+            raise
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,327 @@
+import os
+import sys
+import time
+import hashlib
+import threading
+import logging
+
+from dataclasses import dataclass, field
+
+from src.exception import CustomException
+from src.utils import load_artifact, file_checksum, resolve_artifact_path
+from src.components.transformation_components.compiled_preprocessor import CompiledPreprocessor
+from src.components.inference_runtime import InferenceRuntime
+from src.pipelines.prediction_table import PredictionTable, PredictionTableConfig, load_prediction_table
+
+from typing import Optional, Tuple, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelRegistryConfig:
+    """
+    class ModelRegistryConfig is used to initialize the paths of the artifacts
+    served by the registry and how often they are checked for changes.
+
+    * model_path: Path of the manifest of the saved model
+    * preprocessor_path: Path of the manifest of the saved preprocessor
+    * poll_interval: Seconds between two checks of the artifact files
+    * prediction_table: Where to find the optional prediction table and its tolerance
+    * runtime_path: Path of the NumPy inference runtime exported by ModelTrainer
+    * use_runtime: Serve from the runtime alone when it was exported from the
+      current manifests, without loading the model and preprocessor, which
+      keeps scikit-learn, CatBoost and XGBoost out of the web process
+
+    """
+    model_path: str = os.path.join('artifacts', 'model.manifest.json')
+    preprocessor_path: str = os.path.join('artifacts', 'preprocessor.manifest.json')
+    poll_interval: float = 30.0
+    prediction_table: PredictionTableConfig = field(default_factory=PredictionTableConfig)
+    runtime_path: str = os.path.join('artifacts', 'model_runtime.npz')
+    use_runtime: bool = True
+
+
+@dataclass(frozen=True)
+class LoadedArtifacts:
+    """
+    Immutable snapshot of the artifacts held by the registry. A request reads
+    the model and the preprocessor from the same snapshot, so a reload can never
+    hand it a model from one version and a preprocessor from another.
+
+    * model: Pre-trained model, None when served from the runtime
+    * preprocessor: Pre-computed preprocessor, None when served from the runtime
+    * compiled_preprocessor: Compiled preprocessor, None if it could not be compiled
+    * prediction_table: Prediction table of this model version, None if none was built
+    * runtime: NumPy inference runtime of this model version, None unless use_runtime
+    * version: Short checksum of the model and preprocessor manifests
+    * loaded_at: Time at which the snapshot was loaded
+    * load_time: Seconds taken to load the snapshot
+
+    """
+    model: object
+    preprocessor: object
+    compiled_preprocessor: Optional[CompiledPreprocessor]
+    prediction_table: Optional[PredictionTable]
+    version: str
+    loaded_at: float
+    load_time: float
+    runtime: Optional[InferenceRuntime] = None
+
+
+class ModelRegistry:
+    """
+    class ModelRegistry:
+        * __init__(config: ModelRegistryConfig = None) -> None
+        * get() -> LoadedArtifacts
+        * load() -> LoadedArtifacts
+        * refresh() -> bool
+        * start(eager: bool = True) -> None
+        * stop() -> None
+
+        This class keeps the model and preprocessor in memory for the lifetime of
+        the process. The artifacts are loaded once, either eagerly by start() or
+        lazily by the first get(). A background thread polls the files and, when
+        their modification time or size changes and their checksum differs, loads
+        the new version and swaps it in with a single assignment. Requests that
+        already hold the old snapshot finish with it.
+
+    """
+    def __init__(self, config: Optional[ModelRegistryConfig] = None) -> None:
+        self.registry_config: Type[ModelRegistryConfig] = config or ModelRegistryConfig()
+        self._artifacts: Optional[LoadedArtifacts] = None
+        self._signature: Optional[Tuple] = None
+        self._checksums: Optional[Tuple[str, str]] = None
+        self._load_lock: threading.Lock = threading.Lock()
+        self._stop_event: threading.Event = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def _artifact_paths(self) -> Tuple[str, str]:
+        """
+        This function returns the files the model and preprocessor are loaded
+        from, see resolve_artifact_path().
+
+        """
+        return (resolve_artifact_path(self.registry_config.model_path),
+                resolve_artifact_path(self.registry_config.preprocessor_path))
+
+    def _file_signature(self) -> Tuple:
+        """
+        This function returns the modification time and size of both artifact
+        files, or of their legacy pickles until manifests are written. It is
+        cheap enough to be called on every poll.
+
+        """
+        signature: list = []
+        for path in self._artifact_paths():
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+
+        return tuple(signature)
+
+    def get(self) -> LoadedArtifacts:
+        """
+        This function returns the current snapshot of artifacts, loading it on
+        first use.
+
+        """
+        artifacts: Optional[LoadedArtifacts] = self._artifacts
+        if artifacts is None:
+            artifacts = self.load()
+
+        return artifacts
+
+    def _load_runtime(self, checksums: Tuple[str, str]) -> Optional[InferenceRuntime]:
+        """
+        This function loads the inference runtime when use_runtime is set and the
+        runtime was exported from the manifests with these checksums, and
+        returns None otherwise.
+
+        """
+        runtime_path: str = self.registry_config.runtime_path
+        if not self.registry_config.use_runtime or not os.path.exists(runtime_path):
+            return None
+
+        try:
+            runtime: InferenceRuntime = InferenceRuntime.load(runtime_path)
+        except Exception as e:
+            logger.error(f"Inference runtime could not be loaded: {e}")
+            return None
+
+        if tuple(runtime.meta.get('checksums', ())) != checksums:
+            logger.info(f"Ignoring inference runtime {runtime_path}, it was exported from other artifacts")
+            return None
+
+        logger.info(f"Serving from inference runtime {runtime_path}")
+
+        return runtime
+
+    def load(self) -> LoadedArtifacts:
+        """
+        This function loads the model and preprocessor from disk and swaps them
+        in as the current snapshot. Concurrent callers wait for a single load.
+
+        * signature: Modification time and size of the files before loading
+        * checksums: sha256 checksums of the model and preprocessor files
+        * version: Short checksum identifying the loaded snapshot
+
+        """
+        try:
+            with self._load_lock:
+                signature: Tuple = self._file_signature()
+
+                # Another thread may have loaded the same files while we waited
+                if self._artifacts is not None and signature == self._signature:
+                    return self._artifacts
+
+                logger.info("Loading model and preprocessor")
+                start: float = time.perf_counter()
+
+                checksums: Tuple[str, str] = tuple(file_checksum(path) for path in self._artifact_paths())
+
+                # Loading the runtime alone when it was exported from these manifests
+                runtime: Optional[InferenceRuntime] = self._load_runtime(checksums)
+
+                # Loading model and preprocessor
+                model = preprocessor = compiled_preprocessor = None
+                if runtime is None:
+                    model = load_artifact(self.registry_config.model_path)
+                    preprocessor = load_artifact(self.registry_config.preprocessor_path)
+
+                    # Compiling the preprocessor for the fast inference path
+                    try:
+                        compiled_preprocessor = CompiledPreprocessor(preprocessor)
+                    except Exception as e:
+                        logger.error(f"Preprocessor could not be compiled, using the pipeline: {e}")
+
+                version: str = hashlib.sha256("".join(checksums).encode()).hexdigest()[:12]
+
+                # Using the prediction table only if it was built from this version
+                prediction_table: Optional[PredictionTable] = load_prediction_table(
+                    self.registry_config.prediction_table, runtime or compiled_preprocessor, version)
+
+                # Swapping in the new snapshot with a single assignment
+                self._artifacts = LoadedArtifacts(model=model,
+                                                  preprocessor=preprocessor,
+                                                  compiled_preprocessor=compiled_preprocessor,
+                                                  prediction_table=prediction_table,
+                                                  version=version,
+                                                  loaded_at=time.time(),
+                                                  load_time=time.perf_counter() - start,
+                                                  runtime=runtime)
+                self._signature = signature
+                self._checksums = checksums
+
+                logger.info(f"Model version {version} loaded")
+
+                return self._artifacts
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def refresh(self) -> bool:
+        """
+        This function reloads the artifacts if they changed on disk and returns
+        True when a new snapshot was swapped in. Files that were only touched
+        keep the current snapshot.
+
+        """
+        try:
+            signature: Tuple = self._file_signature()
+            if signature == self._signature:
+                return False
+
+            checksums: Tuple[str, str] = tuple(file_checksum(path) for path in self._artifact_paths())
+            if checksums == self._checksums:
+                self._signature = signature
+                return False
+
+            logger.info("Artifacts changed on disk, reloading")
+            self.load()
+
+            return True
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _watch(self) -> None:
+        """
+        This function runs in the watcher thread and calls refresh() every
+        poll_interval seconds. A failed reload, for example of a file that is
+        still being written, keeps the current snapshot and is retried on the
+        next poll.
+
+        """
+        while not self._stop_event.wait(self.registry_config.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Artifact reload failed: {e}")
+
+    def start(self, eager: bool = True) -> None:
+        """
+        This function optionally loads the artifacts right away and starts the
+        background watcher thread.
+
+        """
+        if eager:
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Eager artifact load failed, will retry lazily: {e}")
+
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop_event.clear()
+            self._watcher = threading.Thread(target=self._watch,
+                                             name="model-registry-watcher",
+                                             daemon=True)
+            self._watcher.start()
+
+    def _after_fork(self) -> None:
+        """
+        This function is called in a forked child. Locks and threads are not
+        carried over by fork, so they are recreated, while the loaded snapshot is
+        kept and shared with the parent copy-on-write.
+
+        """
+        watching: bool = self._watcher is not None
+        self._load_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+        if watching:
+            self.start(eager=False)
+
+    def stop(self) -> None:
+        """
+        This function stops the background watcher thread.
+
+        """
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+# One registry per process, reset after a fork so children own their watcher
+_registry: Optional[ModelRegistry] = None
+_registry_pid: Optional[int] = None
+_registry_lock: threading.Lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    This function returns the registry shared by the current process.
+
+    """
+    global _registry, _registry_pid
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        elif _registry_pid != os.getpid():
+            _registry._after_fork()
+        _registry_pid = os.getpid()
+
+        return _registry
@@ -1,130 +1,469 @@
-import sys
-import os
-import pandas as pd
-
-from src.exception import CustomException
-from src.utils import load_object
-
-class PredictPipeline:
-    """
-    class PredictPipelin:
-        * __init__() -> None:
-        * predict(features) -> int
-
-        This class is used to predict from the given data.
-    """
-    def __init__(self) -> None:
-        pass
-
-    def predict(self, features: pd.DataFrame) -> int:
-        """
-        * features: Input Dataset
-        * model_path: The path to model pickle
-        * preprocessor_path: The path to preprocessor pickle
-        * model: Pre-trained model
-        * preprocessor: Pre-computer preprocessor
-        * X_pred: Preprocessed feature dataset
-        * y_dummy: Garbage label Series
-        * y_pred: Predicted Series
-
-        This function takes a pandas DataFrame as input uses preprocessor pickle
-        to preprocess the dataset and uses model model pickle file to predict from 
-        the dataset. This function returns the average of all prediction, since a 
-        single column is split into multiple columns due to pd.DataFame.explode().
-        """
-        try:
-            # Model and Prepocessor path
-            model_path = os.path.join('artifacts', 'model.pkl')
-            preprocessor_path = os.path.join('artifacts', 'preprocessor.pkl')
-
-            # Loading model and prepocessor
-            model = load_object(file_path = model_path)
-            preprocessor = load_object(file_path = preprocessor_path)
-
-            # Preprocessing input data
-            X_pred, y_dummy = preprocessor.transform(features)
-
-            # Predicting
-            y_pred = model.predict(X_pred)
-
-            return int(y_pred.mean())
-        
-        except Exception as e:
-            raise CustomException(e, sys)
-
-
-class CustomData:
-    """
-    class CustomData:
-        * __init__(self,
-                 book: str,
-                 delivery: str,
-                 rate: str,
-                 votes: int,
-                 location: str,
-                 type_tag: str,
-                 r_type: str,
-                 price:int = 0) -> None
-        * get_data_as_dataframe(self) -> pd.DataFrame:
-
-        This class is used to get input from flask and convert that into 
-        a pd.DataFrame for prediction
-
-    """
-    def __init__(self,
-                 book: str,
-                 delivery: str,
-                 rate: str,
-                 votes: int,
-                 location: str,
-                 type_tag: str,
-                 r_type: str,
-                 price:int = 0
-                 ) -> None:
-        """
-        * self.book: Table booking ['Yes'|'No']
-        * self.delivery: Home delilvery ['Yes'|'No']
-        * self.rate: Restaurant rating [0.0, 5.0] 
-        * self.votes: Likes received [0, 17000]
-        * self.location: Location of the Restaurant
-        * self.type_tag: Type tag of the Restaurant 
-        * self.r_type: Restaurant type
-        * self.price: Price for two [0]
-        """
-        self.book = book
-        self.delivery = delivery
-        self.rate = rate 
-        self.votes = votes
-        self.location = location
-        self.type_tag = type_tag 
-        self.r_type = r_type
-        self.price = price
-    
-    def get_data_as_dataframe(self) -> pd.DataFrame:
-        """
-        * custom_data_dict: Dictionary containing data
-        * df: DataFrame of the input data
-
-        This function is used to create a dictionary from the input
-        data and convert that into a pd.DataFrame.
-        """
-        try:
-            # Creating Dictionary for DataFrame
-            custom_data_dict: dict = {
-                'online_order': [self.delivery],
-                'book_table': [self.book],
-                'rate': [self.rate],
-                'votes': [self.votes],
-                'location': [self.location],
-                'rest_type': [self.type_tag],
-                'listed_in(type)': [self.r_type],
-                'approx_cost(for two people)': [self.price]
-            }
-
-            # Creating Dataframe from dictionary
-            df: pd.DataFrame = pd.DataFrame(custom_data_dict)
-
-            return df
-        
-        except Exception as e:
-            raise CustomException(e, sys)
+import sys
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.logger import configure_logging
+from src.request_timing import timed
+from src.components.transformation_components.rate_parsing import parse_rate
+from src.metrics import BATCH_SIZE, PREDICTIONS
+from src.pipelines.model_registry import ModelRegistry, LoadedArtifacts, get_registry
+
+from typing import Optional, List, Tuple, Union
+
+
+logger = logging.getLogger(__name__)
+
+class PredictPipeline:
+    """
+    class PredictPipelin:
+        * __init__(registry: ModelRegistry = None) -> None:
+        * lookup(features) -> Optional[int]
+        * predict(features) -> int
+        * predict_batch(features) -> pd.Series
+        * predict_rows(features) -> pd.Series
+
+        This class is used to predict from the given data. The model and
+        preprocessor are taken from the process wide ModelRegistry, so they are
+        loaded once per process instead of once per prediction. When a
+        prediction table was built for the model, single restaurants are
+        looked up in it first. When the registry serves from the NumPy inference
+        runtime, it replaces both the preprocessor and the model.
+    """
+    def __init__(self, registry: Optional[ModelRegistry] = None) -> None:
+        self.registry: ModelRegistry = registry or get_registry()
+
+    @staticmethod
+    def _transform(artifacts: LoadedArtifacts, features: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        This function preprocesses features with the compiled preprocessor when
+        the registry has one, and with the preprocessor pipeline otherwise.
+        """
+        compiled = artifacts.compiled_preprocessor
+        if compiled is None:
+            from sklearn import config_context
+
+            # sklearn config is thread local
+            with config_context(transform_output="pandas"):
+                return artifacts.preprocessor.transform(features)
+
+        X, y = compiled.transform(features)
+
+        return pd.DataFrame(X, columns=compiled.feature_names_out), pd.Series(y)
+
+    @staticmethod
+    def _lookup(artifacts: LoadedArtifacts, features: pd.DataFrame) -> Optional[int]:
+        """
+        This function answers a single restaurant from the prediction table of
+        the snapshot, or returns None when the model has to predict it.
+        """
+        table = artifacts.prediction_table
+        if table is None or len(features) != 1:
+            return None
+
+        row: pd.Series = features.iloc[0]
+        prediction: Optional[float] = table.lookup(book=row['book_table'],
+                                                   delivery=row['online_order'],
+                                                   rate=row['rate'],
+                                                   votes=row['votes'],
+                                                   location=row['location'],
+                                                   type_tag=row['rest_type'],
+                                                   r_type=row['listed_in(type)'])
+
+        return None if prediction is None else int(prediction)
+
+    def lookup(self, features: pd.DataFrame) -> Optional[int]:
+        """
+        This function returns the tabled prediction of a DataFrame of one
+        restaurant, or None when there is no table or the restaurant is not in
+        it within tolerance.
+        """
+        try:
+            prediction: Optional[int] = self._lookup(self.registry.get(), features)
+            if prediction is not None:
+                PREDICTIONS.labels("table").inc()
+
+            return prediction
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def predict(self, features: pd.DataFrame) -> int:
+        """
+        * features: Input Dataset
+        * artifacts: Snapshot of model and preprocessor from the registry
+        * model: Pre-trained model
+        * X_pred: Preprocessed feature dataset
+        * y_dummy: Garbage label Series
+        * y_pred: Predicted Series
+
+        This function takes a pandas DataFrame as input uses the compiled preprocessor
+        (or the preprocessor pickle) to preprocess the dataset and uses model model pickle file to predict from 
+        the dataset. This function returns the average of all prediction, since a 
+        single column is split into multiple columns due to pd.DataFame.explode(),
+        or the single prediction with the multi_hot rest_type encoding.
+        """
+        try:
+            # Getting model and prepocessor from the same snapshot
+            artifacts: LoadedArtifacts = self.registry.get()
+            model = artifacts.model
+
+            # Answering from the prediction table when possible
+            prediction: Optional[int] = self._lookup(artifacts, features)
+            if prediction is not None:
+                PREDICTIONS.labels("table").inc()
+                return prediction
+
+            BATCH_SIZE.observe(1)
+
+            # Predicting with the inference runtime when the registry serves one
+            if artifacts.runtime is not None:
+                PREDICTIONS.labels("runtime").inc()
+                return int(np.nanmean(artifacts.runtime.predict_columns(features)))
+
+            PREDICTIONS.labels("model").inc()
+
+            # Preprocessing input data
+            with timed("preprocess"):
+                X_pred, y_dummy = self._transform(artifacts, features)
+
+            # Predicting
+            with timed("predict"):
+                y_pred = model.predict(X_pred)
+
+            return int(y_pred.mean())
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def predict_batch(self, features: pd.DataFrame) -> pd.Series:
+        """
+        * features: Input Dataset, one row per restaurant
+        * artifacts: Snapshot of model and preprocessor from the registry
+        * source: What predicted the batch, "runtime" or "model"
+
+        This function predicts a price for every row of the input DataFrame, see
+        _predict_batch(), and observes the batch in the /metrics counters. It is
+        the only place batches are counted, so subclasses that predict batches
+        elsewhere (e.g. the InferencePool) override _predict_batch() instead.
+        """
+        try:
+            # Getting model and prepocessor from the same snapshot
+            artifacts: LoadedArtifacts = self.registry.get()
+
+            predictions, source = self._predict_batch(artifacts, features)
+
+            BATCH_SIZE.observe(len(features))
+            PREDICTIONS.labels(source).inc(len(features))
+
+            return predictions
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _predict_batch(self, artifacts: LoadedArtifacts, features: pd.DataFrame) -> Tuple[pd.Series, str]:
+        """
+        * batch: Copy of features carrying the row id in the price column
+        * X_pred: Preprocessed feature dataset, one row per type tag
+        * row_id: Input row of every preprocessed row
+        * y_pred: Predicted Series for every preprocessed row
+        * predictions: Average prediction for every input row
+
+        This function predicts every row of features with a single
+        preprocessor.transform() and model.predict() call, and returns the
+        predictions with what predicted them. The price column is ignored at
+        prediction time, so it is overwritten with the row position. That keeps
+        rows of different restaurants distinct when preprocess() drops
+        duplicates, and the row id comes back as y after X_y_split(). The
+        exploded rows are then averaged per row id, which gives every restaurant
+        its own prediction. Rows that preprocess() drops, for example with an
+        empty rest_type, get NaN.
+        """
+        # Predicting with the inference runtime when the registry serves one
+        if artifacts.runtime is not None:
+            return pd.Series(artifacts.runtime.predict_columns(features),
+                             index=features.index, name='prediction'), "runtime"
+
+        # Tagging every input row with its position
+        batch: pd.DataFrame = features.reset_index(drop=True)
+        batch['approx_cost(for two people)'] = np.arange(len(batch))
+
+        # Preprocessing all rows at once
+        with timed("preprocess"):
+            X_pred, row_id = self._transform(artifacts, batch)
+
+        # Predicting all rows at once
+        with timed("predict"):
+            y_pred = artifacts.model.predict(X_pred)
+
+        # Averaging the exploded rows of every input row
+        predictions: pd.Series = pd.Series(np.asarray(y_pred, dtype=float).ravel()).groupby(
+            row_id.to_numpy().astype(np.int64)).mean()
+        predictions = predictions.reindex(np.arange(len(batch)))
+        predictions.index = features.index
+        predictions.name = 'prediction'
+
+        return predictions, "model"
+
+    @staticmethod
+    def _valid_rows(artifacts: LoadedArtifacts, features: pd.DataFrame) -> np.ndarray:
+        """
+        * tables: Category lookup tables of the runtime or compiled preprocessor
+        * valid: Whether the preprocessor can encode every row
+
+        This function marks the rows of features the preprocessor can encode:
+        categories seen during fit, known type tags, a rate that parses and
+        finite votes. Every distinct value is checked once. Rows without a
+        rest_type stay valid, the pipeline predicts them as NaN itself. All
+        rows are valid when the snapshot has no lookup tables.
+        """
+        valid: np.ndarray = np.ones(len(features), dtype=bool)
+        tables = artifacts.runtime or artifacts.compiled_preprocessor
+        if tables is None:
+            return valid
+
+        # Categories of the OrdinalEncoder
+        for column, codes in tables.category_dicts.items():
+            if column != 'rest_type':
+                valid &= features[column].isin(list(codes)).to_numpy()
+
+        # Every type tag of a restaurant
+        rest_type: pd.Series = features['rest_type']
+        tags_known: dict = {value: all(tag in tables.category_dicts['rest_type'] for tag in str(value).split(', '))
+                            for value in rest_type.dropna().unique()}
+        valid &= (rest_type.isna() | rest_type.map(tags_known).eq(True)).to_numpy()
+
+        # Ratings as parse_rate() reads them
+        rate: pd.Series = features['rate']
+        rate_parses: dict = {}
+        for value in rate.dropna().unique():
+            try:
+                rate_parses[value] = np.isfinite(parse_rate(value))
+            except (TypeError, ValueError):
+                rate_parses[value] = False
+        valid &= (rate.isna() | rate.map(rate_parses).eq(True)).to_numpy()
+
+        # Votes as numbers
+        valid &= np.isfinite(pd.to_numeric(features['votes'], errors='coerce').to_numpy(dtype=np.float64))
+
+        return valid
+
+    def predict_rows(self, features: pd.DataFrame) -> pd.Series:
+        """
+        * valid: Rows the preprocessor can encode, see _valid_rows()
+        * predictions: Prediction of every row, NaN for the others
+
+        This function predicts every row of features like predict_batch(), but
+        a row that cannot be predicted, for example with a location the model
+        was not trained on or a rate that does not parse, gets NaN instead of
+        failing the whole batch. Such rows are found up front, and the valid
+        rows are predicted with a single predict_batch() call.
+        """
+        try:
+            valid: np.ndarray = self._valid_rows(self.registry.get(), features)
+            if not valid.all():
+                logger.warning(f"{int((~valid).sum())} of {len(features)} rows cannot be encoded, predicting them as NaN")
+
+            predictions: np.ndarray = np.full(len(features), np.nan)
+            if valid.any():
+                predictions[valid] = self.predict_batch(features[valid]).to_numpy(dtype=np.float64)
+
+            return pd.Series(predictions, index=features.index, name='prediction')
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+class CustomData:
+    """
+    class CustomData:
+        * __init__(self,
+                 book: str,
+                 delivery: str,
+                 rate: str,
+                 votes: int,
+                 location: str,
+                 type_tag: str,
+                 r_type: str,
+                 price:int = 0) -> None
+        * get_data_as_dataframe(self) -> pd.DataFrame:
+        * cache_key(self) -> tuple:
+
+        This class is used to get input from flask and convert that into 
+        a pd.DataFrame for prediction
+
+    """
+    def __init__(self,
+                 book: str,
+                 delivery: str,
+                 rate: str,
+                 votes: int,
+                 location: str,
+                 type_tag: str,
+                 r_type: str,
+                 price:int = 0
+                 ) -> None:
+        """
+        * self.book: Table booking ['Yes'|'No']
+        * self.delivery: Home delilvery ['Yes'|'No']
+        * self.rate: Restaurant rating [0.0, 5.0] 
+        * self.votes: Likes received [0, 17000]
+        * self.location: Location of the Restaurant
+        * self.type_tag: Type tag of the Restaurant 
+        * self.r_type: Restaurant type
+        * self.price: Price for two [0]
+        """
+        self.book = book
+        self.delivery = delivery
+        self.rate = rate 
+        self.votes = votes
+        self.location = location
+        self.type_tag = type_tag 
+        self.r_type = r_type
+        self.price = price
+    
+    def get_data_as_dataframe(self) -> pd.DataFrame:
+        """
+        * custom_data_dict: Dictionary containing data
+        * df: DataFrame of the input data
+
+        This function is used to create a dictionary from the input
+        data and convert that into a pd.DataFrame.
+        """
+        try:
+            # Creating Dictionary for DataFrame
+            custom_data_dict: dict = {
+                'online_order': [self.delivery],
+                'book_table': [self.book],
+                'rate': [self.rate],
+                'votes': [self.votes],
+                'location': [self.location],
+                'rest_type': [self.type_tag],
+                'listed_in(type)': [self.r_type],
+                'approx_cost(for two people)': [self.price]
+            }
+
+            # Creating Dataframe from dictionary
+            df: pd.DataFrame = pd.DataFrame(custom_data_dict)
+
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def cache_key(self) -> tuple:
+        """
+        * tags: Distinct type tags, sorted
+        * rate: Rating as the preprocessor reads it, see parse_rate()
+        * votes: Votes as a float, the scaler does not round them
+
+        This function returns the input in a canonical form, equal for inputs
+        the preprocessor turns into the same features: type tags are split,
+        deduplicated and sorted, and rate and votes are parsed. Values that do
+        not parse are kept as given, so they never share a key with a valid one.
+        """
+        tags: tuple = tuple(sorted(set(str(self.type_tag).split(', '))))
+
+        rate = self.rate
+        try:
+            rate = parse_rate(rate)
+        except (TypeError, ValueError):
+            pass
+
+        votes = self.votes
+        try:
+            votes = float(votes)
+        except (TypeError, ValueError):
+            pass
+
+        return (self.book, self.delivery, rate, votes, self.location, tags, self.r_type)
+
+
+class CustomBatchData:
+    """
+    class CustomBatchData:
+        * __init__(self, data: Union[pd.DataFrame, List[dict]]) -> None
+        * get_data_as_dataframe(self) -> pd.DataFrame:
+
+        This class is used to convert many restaurants, given either as a DataFrame
+        (e.g. read from CSV) or as a list of JSON records, into a pd.DataFrame for
+        PredictPipeline().predict_batch(). Columns may use the form field names of
+        CustomData or the column names of the Zomato dataset.
+
+    """
+    # Form field names of CustomData and the dataset columns they map to
+    FIELD_TO_COLUMN: dict = {
+        'delivery': 'online_order',
+        'book': 'book_table',
+        'rate': 'rate',
+        'votes': 'votes',
+        'location': 'location',
+        'type_tag': 'rest_type',
+        'r_type': 'listed_in(type)',
+        'price': 'approx_cost(for two people)'
+    }
+
+    def __init__(self, data: Union[pd.DataFrame, List[dict]]) -> None:
+        """
+        * self.data: Input restaurants
+        """
+        self.data = data
+
+    def get_data_as_dataframe(self) -> pd.DataFrame:
+        """
+        * df: DataFrame of the input data with dataset column names
+
+        This function renames form field columns to dataset columns, joins type
+        tags given as lists with ', ' and fills the price column. Empty type
+        tags are missing, the pipeline predicts those restaurants as NaN. It
+        raises ValueError when columns are missing.
+        """
+        try:
+            df: pd.DataFrame = pd.DataFrame(self.data)
+            df = df.rename(columns=self.FIELD_TO_COLUMN)
+
+            missing: list = [column for column in self.FIELD_TO_COLUMN.values()
+                             if column not in df.columns and column != 'approx_cost(for two people)']
+            if missing:
+                raise ValueError(f"Missing columns: {missing}")
+
+            # Joining type tags given as lists
+            df['rest_type'] = df['rest_type'].map(
+                lambda x: ', '.join(x) if isinstance(x, (list, tuple)) else x)
+
+            # Treating empty type tags as missing
+            df['rest_type'] = df['rest_type'].mask(df['rest_type'].map(lambda x: isinstance(x, str) and not x.strip()))
+
+            # Price is not known at prediction time
+            df['approx_cost(for two people)'] = 0
+
+            return df
+
+        except ValueError:
+            raise
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+if __name__=="__main__":
+
+    parser = argparse.ArgumentParser(description="Predict the cost for two of every restaurant in a CSV file")
+    parser.add_argument("--input", required=True, help="CSV file with one restaurant per row")
+    parser.add_argument("--output", default=None, help="CSV file to write, prints to stdout when omitted")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    # Reading and predicting all restaurants in one pass
+    input_df: pd.DataFrame = pd.read_csv(args.input)
+    batch_df: pd.DataFrame = CustomBatchData(input_df).get_data_as_dataframe()
+
+    input_df['prediction'] = np.trunc(PredictPipeline().predict_rows(batch_df)).astype('Int64')
+
+    if args.output:
+        input_df.to_csv(args.output, index=False)
+    else:
+        input_df.to_csv(sys.stdout, index=False)
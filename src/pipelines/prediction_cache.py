@@ -0,0 +1,204 @@
+import sys
+import time
+import threading
+import logging
+
+import pandas as pd
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.pipelines.model_registry import ModelRegistry, get_registry
+from src.pipelines.predict_pipeline import CustomData
+from src.request_timing import timed
+
+from typing import Callable, Optional, Tuple, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PredictionCacheConfig:
+    """
+    class PredictionCacheConfig is used to initialize the size and lifetime of
+    cached predictions.
+
+    * max_entries: Largest number of predictions kept, the least recently used
+      one is evicted beyond it
+    * ttl: Seconds a prediction is served from the cache, None keeps it until
+      it is evicted or the model changes
+
+    """
+    max_entries: int = 4096
+    ttl: Optional[float] = 3600.0
+
+
+@dataclass
+class PredictionCacheMetrics:
+    """
+    class PredictionCacheMetrics holds the counters reported by the cache.
+
+    * hits: Predictions served from the cache
+    * misses: Predictions computed, including expired ones
+    * evictions: Entries dropped to stay within max_entries
+    * expirations: Entries dropped because they outlived ttl
+    * invalidations: Times the cache was emptied because the model changed
+
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def snapshot(self) -> dict:
+        """
+        This function returns the counters along with the hit rate.
+
+        """
+        lookups: int = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class PredictionCache:
+    """
+    class PredictionCache:
+        * __init__(config: PredictionCacheConfig = None, registry: ModelRegistry = None) -> None
+        * predict(data: CustomData, predict_fn: Callable[[pd.DataFrame], int]) -> int
+        * clear() -> None
+        * stats() -> dict
+
+        This class memoizes predictions of form submissions in a bounded LRU
+        dictionary keyed on CustomData().cache_key(), so that submissions that
+        only differ in the order of their type tags or in how rate and votes are
+        written share an entry. Entries belong to the model version they were
+        predicted with: when the registry swaps in a new model the cache is
+        emptied, and a prediction that was in flight during the swap is not
+        stored.
+
+    """
+    def __init__(self,
+                 config: Optional[PredictionCacheConfig] = None,
+                 registry: Optional[ModelRegistry] = None) -> None:
+        self.cache_config: Type[PredictionCacheConfig] = config or PredictionCacheConfig()
+        self.registry: Optional[ModelRegistry] = registry
+        self.metrics: PredictionCacheMetrics = PredictionCacheMetrics()
+        self._entries: OrderedDict = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def _current_version(self) -> str:
+        """
+        This function returns the version of the model currently served and
+        empties the cache when it changed.
+
+        """
+        version: str = (self.registry or get_registry()).get().version
+
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    logger.info(f"Model version {version} replaced {self._version}, emptying the prediction cache")
+                    self.metrics.invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+        return version
+
+    def _get(self, key: Tuple) -> Optional[int]:
+        """
+        This function returns the cached prediction of key and marks it as
+        recently used, or returns None when it is missing or expired.
+
+        """
+        with self._lock:
+            entry: Optional[Tuple[int, float]] = self._entries.get(key)
+            if entry is None:
+                self.metrics.misses += 1
+                return None
+
+            prediction, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.metrics.expirations += 1
+                self.metrics.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.metrics.hits += 1
+
+            return prediction
+
+    def _put(self, key: Tuple, prediction: int, version: str) -> None:
+        """
+        This function stores a prediction made with model version, evicting the
+        least recently used entries beyond max_entries.
+
+        """
+        ttl: Optional[float] = self.cache_config.ttl
+        expires_at: float = float('inf') if ttl is None else time.monotonic() + ttl
+
+        with self._lock:
+            # The model changed while predicting, the prediction is of the old one
+            if version != self._version:
+                return
+
+            self._entries[key] = (prediction, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.cache_config.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics.evictions += 1
+
+    def predict(self, data: CustomData, predict_fn: Callable[[pd.DataFrame], int]) -> int:
+        """
+        This function returns the cached prediction of data, or predicts it with
+        predict_fn(data.get_data_as_dataframe()) and caches the result.
+
+        * version: Model version the prediction is made with
+        * key: Canonical form of data
+
+        """
+        try:
+            with timed("cache"):
+                version: str = self._current_version()
+                key: Tuple = data.cache_key()
+                prediction: Optional[int] = self._get(key)
+
+            if prediction is None:
+                prediction = predict_fn(data.get_data_as_dataframe())
+                self._put(key, prediction, version)
+
+            return prediction
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def clear(self) -> None:
+        """
+        This function empties the cache.
+
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        This function returns the counters, the number of entries and the model
+        version they belong to.
+
+        """
+        with self._lock:
+            return dict(self.metrics.snapshot(),
+                        entries=len(self._entries),
+                        max_entries=self.cache_config.max_entries,
+                        version=self._version)
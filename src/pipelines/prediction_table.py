@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import threading
+import logging
+
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.components.transformation_components.compiled_preprocessor import CompiledPreprocessor
+
+from typing import Dict, List, Optional, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PredictionTableConfig:
+    """
+    class PredictionTableConfig is used to initialize where the prediction table
+    is stored, how finely votes are bucketed and how much error a lookup may
+    carry before the model is used instead.
+
+    * table_dir: Directory of the table arrays and their metadata
+    * votes_buckets: Number of votes buckets
+    * error_samples: Votes evenly spaced across every bucket, edges included,
+      at which the error of a cell is estimated (odd, the middle one is the centre)
+    * tolerance: Largest estimated error, in rupees, of a cell for it to be
+      answered from the table
+
+    """
+    table_dir: str = os.path.join('artifacts', 'prediction_table')
+    votes_buckets: int = 8
+    error_samples: int = 9
+    tolerance: float = 25.0
+
+
+class PredictionTable:
+    """
+    class PredictionTable:
+        * __init__(values, errors, votes_edges, version, compiled_preprocessor, tolerance) -> None
+        * build(model, compiled_preprocessor, version, config) -> PredictionTable
+        * save(table_dir: str) -> None
+        * load(table_dir, compiled_preprocessor, tolerance) -> PredictionTable
+        * lookup(book, delivery, rate, votes, location, type_tag, r_type) -> Optional[float]
+        * stats() -> dict
+
+        This class holds the predictions of a model over the whole input space of
+        the web form: every online_order, book_table, location, listed_in(type)
+        and single type tag, crossed with every rating the preprocessor can parse
+        (0.1 steps, plus the imputed rating) and with buckets of votes.
+        The model predicts each exploded type tag on its own row and averages
+        them, so a request with several tags is the mean of their cells. With
+        the multi_hot encoding a restaurant with several tags is one row the
+        table does not cover, only single tag requests are looked up.
+
+        * values: Prediction at the centre of every cell (float32), indexed by
+          [online_order, book_table, location, listed_in(type), rest_type, rate, votes]
+          with the OrdinalEncoder codes of the categories
+        * errors: Estimated error of every cell, the largest difference between
+          the centre and error_samples votes spread across its bucket, in whole
+          rupees capped at 255 (uint8)
+        * votes_edges: Edges of the votes buckets, the last one inclusive
+        * version: Model version the table was built from
+
+        Votes are continuous, so a cell answers for a whole bucket. The error of
+        a cell is an estimate, not a bound: a split of the model between two
+        sampled votes is not seen. A lookup only uses cells whose estimated
+        error is within tolerance and returns None otherwise, or for inputs
+        outside the table, for the caller to fall back to the model.
+
+    """
+    AXES: List[str] = ['online_order', 'book_table', 'location', 'listed_in(type)', 'rest_type']
+    RATE_STEPS: int = 50
+
+    def __init__(self,
+                 values: np.ndarray,
+                 errors: np.ndarray,
+                 votes_edges: np.ndarray,
+                 version: str,
+                 compiled_preprocessor: CompiledPreprocessor,
+                 tolerance: float) -> None:
+        self.values: np.ndarray = values
+        self.errors: np.ndarray = errors
+        self.votes_edges: np.ndarray = votes_edges
+        self.version: str = version
+        self.compiled_preprocessor: CompiledPreprocessor = compiled_preprocessor
+        self.tolerance: float = tolerance
+        self.hits: int = 0
+        self.misses: int = 0
+        self._counters_lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def rate_axis(cls, compiled_preprocessor: CompiledPreprocessor) -> np.ndarray:
+        """
+        This function returns the ratings of the rate axis: the imputed rating
+        first, then 0.1 to 5.0.
+
+        """
+        return np.concatenate([[compiled_preprocessor.rate_fill],
+                               np.arange(1, cls.RATE_STEPS + 1) / 10])
+
+    @staticmethod
+    def votes_axis(compiled_preprocessor: CompiledPreprocessor,
+                   buckets: int,
+                   votes_sample: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        This function returns the edges of the votes buckets from 0 to the
+        largest votes seen by the MinMaxScaler: quantiles of votes_sample (for
+        example the votes of the train split), so that every bucket holds as
+        many restaurants, or log-spaced edges without a sample.
+
+        """
+        i: int = compiled_preprocessor.scale_columns.index('votes')
+        votes_max: float = (1 - compiled_preprocessor.scale_min[i]) / compiled_preprocessor.scale_scale[i]
+
+        if votes_sample is not None and len(votes_sample):
+            inner: np.ndarray = np.quantile(np.asarray(votes_sample, dtype=np.float64),
+                                            np.linspace(0, 1, buckets + 1)[1:-1])
+            edges: np.ndarray = np.concatenate([[0], np.round(inner), [votes_max]])
+        else:
+            edges = np.round(np.geomspace(1, votes_max + 1, buckets + 1) - 1)
+
+        return np.unique(np.clip(edges, 0, votes_max))
+
+    @classmethod
+    def build(cls,
+              model,
+              compiled_preprocessor: CompiledPreprocessor,
+              version: str,
+              config: Optional[PredictionTableConfig] = None,
+              votes_sample: Optional[np.ndarray] = None) -> 'PredictionTable':
+        """
+        This function scores the model over the grid, one (online_order,
+        book_table, location) block at a time to bound memory. votes_sample
+        places the votes buckets, see votes_axis().
+
+        * rates: Ratings of the rate axis
+        * votes_points: error_samples evenly spaced votes of every bucket, bucket
+          after bucket, the centre of each in the middle
+        * block: Predictions of a block at every votes point, with the samples
+          of a bucket on the last axis
+
+        """
+        try:
+            config = config or PredictionTableConfig()
+            logger.info("Prediction table build has begun")
+            start: float = time.perf_counter()
+
+            sizes: List[int] = [len(compiled_preprocessor.category_codes[column]) for column in cls.AXES]
+            rates: np.ndarray = cls.rate_axis(compiled_preprocessor)
+            votes_edges: np.ndarray = cls.votes_axis(compiled_preprocessor, config.votes_buckets, votes_sample)
+
+            samples: int = max(3, config.error_samples | 1)
+            votes_points: np.ndarray = np.linspace(votes_edges[:-1], votes_edges[1:], samples, axis=1).ravel()
+
+            values: np.ndarray = np.empty(sizes + [len(rates), len(votes_edges) - 1], dtype=np.float32)
+            errors: np.ndarray = np.empty(values.shape, dtype=np.uint8)
+
+            # Feature values of a block, shared by every block
+            r_type, tag, rate, votes = np.meshgrid(np.arange(sizes[3], dtype=np.float64),
+                                                   np.arange(sizes[4], dtype=np.float64),
+                                                   rates,
+                                                   votes_points,
+                                                   indexing='ij')
+            block_shape: tuple = r_type.shape[:-1] + (len(votes_edges) - 1, samples)
+
+            for online_order in range(sizes[0]):
+                for book_table in range(sizes[1]):
+                    for location in range(sizes[2]):
+                        features: Dict[str, np.ndarray] = {
+                            'online_order': np.full(r_type.size, float(online_order)),
+                            'book_table': np.full(r_type.size, float(book_table)),
+                            'location': np.full(r_type.size, float(location)),
+                            'listed_in(type)': r_type.ravel(),
+                            'rest_type': tag.ravel(),
+                            'rate': rate.ravel(),
+                            'votes': votes.ravel()
+                        }
+                        X: pd.DataFrame = pd.DataFrame(compiled_preprocessor._assemble(features),
+                                                       columns=compiled_preprocessor.feature_names_out)
+                        block: np.ndarray = np.asarray(model.predict(X), dtype=np.float64).reshape(block_shape)
+
+                        # Centre of every bucket and its distance to the other samples of the bucket
+                        centre: np.ndarray = block[..., samples // 2]
+                        error: np.ndarray = np.abs(block - centre[..., np.newaxis]).max(axis=-1)
+
+                        values[online_order, book_table, location] = centre
+                        errors[online_order, book_table, location] = np.minimum(np.ceil(error), 255)
+
+            logger.info(f"Prediction table of {values.size} cells built in {time.perf_counter() - start:.1f}s, "
+                         f"{(errors <= config.tolerance).mean():.2%} estimated within {config.tolerance} rupees")
+
+            return cls(values, errors, votes_edges, version, compiled_preprocessor, config.tolerance)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def save(self, table_dir: str) -> None:
+        """
+        This function saves the arrays as .npy files, which load() memory-maps,
+        and the metadata as JSON, written last.
+
+        """
+        try:
+            os.makedirs(table_dir, exist_ok=True)
+
+            np.save(os.path.join(table_dir, 'values.npy'), self.values)
+            np.save(os.path.join(table_dir, 'errors.npy'), self.errors)
+
+            with open(os.path.join(table_dir, 'meta.json'), 'w') as file_obj:
+                json.dump({"version": self.version,
+                           "votes_edges": self.votes_edges.tolist(),
+                           "shape": list(self.values.shape)}, file_obj)
+
+            logger.info(f"Prediction table saved to {table_dir}")
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def load(cls,
+             table_dir: str,
+             compiled_preprocessor: CompiledPreprocessor,
+             tolerance: float) -> 'PredictionTable':
+        """
+        This function loads a saved table. The arrays are memory-mapped, so forked
+        workers share their pages and only the cells looked up are read.
+
+        """
+        try:
+            with open(os.path.join(table_dir, 'meta.json')) as file_obj:
+                meta: dict = json.load(file_obj)
+
+            values: np.ndarray = np.load(os.path.join(table_dir, 'values.npy'), mmap_mode='r')
+            errors: np.ndarray = np.load(os.path.join(table_dir, 'errors.npy'), mmap_mode='r')
+
+            return cls(values, errors, np.asarray(meta["votes_edges"]), meta["version"],
+                       compiled_preprocessor, tolerance)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _rate_index(self, rate) -> Optional[int]:
+        """
+        This function returns the position of a rating on the rate axis, or None
+        if it is not on it.
+
+        """
+        try:
+            rate_value: float = self.compiled_preprocessor.parse_rate_value(rate)
+        except (TypeError, ValueError):
+            return None
+
+        step: int = int(round(rate_value * 10))
+        if 1 <= step <= self.RATE_STEPS and step / 10 == rate_value:
+            return step
+        if rate_value == self.compiled_preprocessor.rate_fill:
+            return 0
+
+        return None
+
+    def _votes_index(self, votes) -> Optional[int]:
+        """
+        This function returns the votes bucket of votes, or None outside the
+        buckets.
+
+        """
+        try:
+            votes_value: float = float(votes)
+        except (TypeError, ValueError):
+            return None
+
+        if not self.votes_edges[0] <= votes_value <= self.votes_edges[-1]:
+            return None
+
+        return min(int(np.searchsorted(self.votes_edges, votes_value, side='right')) - 1,
+                   len(self.votes_edges) - 2)
+
+    def lookup(self,
+               book: str,
+               delivery: str,
+               rate: str,
+               votes: int,
+               location: str,
+               type_tag: str,
+               r_type: str) -> Optional[float]:
+        """
+        This function returns the tabled prediction of a restaurant, the mean of
+        the cells of its type tags, or None when it has to go to the model.
+
+        """
+        codes: Dict[str, dict] = self.compiled_preprocessor.category_dicts
+        try:
+            index: list = [int(codes['online_order'][delivery]),
+                           int(codes['book_table'][book]),
+                           int(codes['location'][location]),
+                           int(codes['listed_in(type)'][r_type])]
+            tags: List[int] = [int(codes['rest_type'][tag]) for tag in dict.fromkeys(str(type_tag).split(', '))]
+        except (KeyError, TypeError):
+            return self._count(None)
+
+        # Several tags are not the mean of their cells when they share a multi-hot row
+        if len(tags) > 1 and self.compiled_preprocessor.rest_type_encoding == 'multi_hot':
+            return self._count(None)
+
+        rate_index: Optional[int] = self._rate_index(rate)
+        votes_index: Optional[int] = self._votes_index(votes)
+        if rate_index is None or votes_index is None:
+            return self._count(None)
+
+        cell: tuple = tuple(index) + (tags, rate_index, votes_index)
+        if self.errors[cell].max() > self.tolerance:
+            return self._count(None)
+
+        return self._count(float(self.values[cell].astype(np.float64).mean()))
+
+    def _count(self, prediction: Optional[float]) -> Optional[float]:
+        """
+        This function counts a lookup as a hit or a miss, under a lock since
+        the threads of a web worker share the table, and returns prediction.
+
+        """
+        with self._counters_lock:
+            if prediction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return prediction
+
+    def stats(self) -> dict:
+        """
+        This function returns lookup counters of the table.
+
+        """
+        with self._counters_lock:
+            hits, misses = self.hits, self.misses
+        lookups: int = hits + misses
+        return {"version": self.version,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / lookups if lookups else 0.0}
+
+
+def load_prediction_table(config: PredictionTableConfig,
+                          compiled_preprocessor: Optional[CompiledPreprocessor],
+                          version: str) -> Optional[PredictionTable]:
+    """
+    This function loads the table in config.table_dir when there is one built
+    for the model version, and returns None otherwise. When the registry serves
+    from the InferenceRuntime it is passed as compiled_preprocessor, it has the
+    same lookup tables.
+
+    """
+    if compiled_preprocessor is None or not os.path.exists(os.path.join(config.table_dir, 'meta.json')):
+        return None
+
+    try:
+        table: PredictionTable = PredictionTable.load(config.table_dir, compiled_preprocessor, config.tolerance)
+    except Exception as e:
+        logger.error(f"Prediction table could not be loaded: {e}")
+        return None
+
+    if table.version != version:
+        logger.info(f"Ignoring prediction table of model version {table.version}")
+        return None
+
+    logger.info(f"Prediction table of model version {version} loaded")
+
+    return table
+
+
+if __name__=="__main__":
+
+    from src.pipelines.model_registry import ModelRegistry, ModelRegistryConfig
+    from src.components.data_ingestion import DataIngestionConfig
+    from src.components.artifact_store import read_frame
+    from src.logger import configure_logging
+
+    configure_logging()
+
+    # Building the table for the artifacts on disk, from the model itself
+    artifacts = ModelRegistry(ModelRegistryConfig(use_runtime=False)).load()
+    table_config: Type[PredictionTableConfig] = PredictionTableConfig()
+
+    # Placing the votes buckets by the votes of the train split, when there is one
+    train_data_path: str = DataIngestionConfig().train_data_path
+    votes_sample: Optional[np.ndarray] = None
+    if os.path.exists(train_data_path):
+        votes_sample = read_frame(train_data_path, columns=['votes'])['votes'].dropna().to_numpy()
+
+    table: PredictionTable = PredictionTable.build(artifacts.model,
+                                                   artifacts.compiled_preprocessor,
+                                                   artifacts.version,
+                                                   table_config,
+                                                   votes_sample)
+    table.save(table_config.table_dir)
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import logging
+
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.utils import file_checksum
+
+from typing import Dict, Optional, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageCacheConfig:
+    """
+    class StageCacheConfig is used to initialize where cached stage results are
+    kept.
+
+    * cache_dir: Directory holding one sub-directory per stage and fingerprint
+    * transformed_data_path: Pickle of the transformed datasets, cached with the preprocessor
+    * max_entries: Entries kept per stage, the least recently used are removed
+
+    """
+    cache_dir: str = os.path.join('artifacts', 'cache')
+    transformed_data_path: str = os.path.join('artifacts', 'transformed.pkl')
+    max_entries: int = 5
+
+
+def fingerprint(*parts) -> str:
+    """
+    This function returns the sha256 of the repr() of parts. Configs are
+    dataclasses and model params are dictionaries, so their repr() lists every
+    setting in a stable order.
+
+    """
+    sha256 = hashlib.sha256()
+    for part in parts:
+        sha256.update(repr(part).encode())
+        sha256.update(b"\0")
+
+    return sha256.hexdigest()
+
+
+def source_fingerprint(*objects) -> str:
+    """
+    This function returns the sha256 of the source code of the modules defining
+    objects, so that editing them invalidates the stages that run them.
+
+    """
+    return fingerprint(*[inspect.getsource(inspect.getmodule(obj)) for obj in objects])
+
+
+def package_versions(*names: str) -> Dict[str, str]:
+    """
+    This function returns the installed version of every package in names.
+
+    """
+    from importlib.metadata import version
+
+    return {name: version(name) for name in names}
+
+
+class StageCache:
+    """
+    class StageCache:
+        * __init__(config: StageCacheConfig = None) -> None
+        * lookup(stage: str, key: str) -> Optional[dict]
+        * store(stage: str, key: str, outputs: Dict[str, str], result: dict) -> None
+        * invalidate(*stages: str) -> None
+
+        This class caches the outputs of train_pipeline stages by the fingerprint
+        of their inputs (key). store() copies the output files of a run into
+        cache_dir/<stage>/<key>/ next to a manifest.json holding their checksums
+        and the result of the stage. lookup() finds the entry of a key, puts its
+        files back at their output paths when they are missing or differ, and
+        returns the stored result. Every fingerprint keeps its own entry, so
+        switching back to an earlier config is a cache hit too, up to the
+        max_entries most recently used entries of every stage.
+
+        The key only covers the inputs of a stage, not artifacts changed
+        outside of it, so runs that update them in place (incremental
+        training) invalidate the cache.
+
+    """
+    MANIFEST: str = 'manifest.json'
+
+    def __init__(self, config: Optional[StageCacheConfig] = None) -> None:
+        self.cache_config: Type[StageCacheConfig] = config or StageCacheConfig()
+
+    def _entry_dir(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_config.cache_dir, stage, key)
+
+    def lookup(self, stage: str, key: str) -> Optional[dict]:
+        """
+        This function returns the result stored for stage under key, after
+        restoring its output files, or None on a cache miss.
+
+        * manifest: Output files of the entry with their checksums, and the result
+
+        """
+        try:
+            entry_dir: str = self._entry_dir(stage, key)
+            manifest_path: str = os.path.join(entry_dir, self.MANIFEST)
+            if not os.path.exists(manifest_path):
+                logger.info(f"Stage {stage}: no cached result for {key[:12]}")
+                return None
+
+            with open(manifest_path) as file_obj:
+                manifest: dict = json.load(file_obj)
+
+            # Restoring outputs overwritten by a run with another fingerprint
+            for name, output in manifest["outputs"].items():
+                path: str = output["path"]
+                if os.path.exists(path) and file_checksum(path) == output["sha256"]:
+                    continue
+
+                logger.info(f"Stage {stage}: restoring {path} from the cache")
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                shutil.copyfile(os.path.join(entry_dir, output["file"]), path)
+
+            # Marking the entry as recently used for eviction
+            os.utime(manifest_path)
+
+            logger.info(f"Stage {stage}: using cached result {key[:12]}")
+
+            return manifest["result"]
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def store(self, stage: str, key: str, outputs: Dict[str, str], result: dict) -> None:
+        """
+        This function stores copies of the output files of stage and its result
+        under key.
+
+        * outputs: Dictionary of output names and the paths the stage wrote
+        * result: JSON serializable result returned on a cache hit
+
+        """
+        try:
+            entry_dir: str = self._entry_dir(stage, key)
+            os.makedirs(entry_dir, exist_ok=True)
+
+            manifest: dict = {"stage": stage, "key": key, "created_at": time.time(),
+                              "outputs": {}, "result": result}
+            for name, path in outputs.items():
+                file: str = name + os.path.splitext(path)[1]
+                shutil.copyfile(path, os.path.join(entry_dir, file))
+                manifest["outputs"][name] = {"path": path, "file": file, "sha256": file_checksum(path)}
+
+            # Writing the manifest last, an entry without one is never used
+            with open(os.path.join(entry_dir, self.MANIFEST), "w") as file_obj:
+                json.dump(manifest, file_obj, indent=2)
+
+            logger.info(f"Stage {stage}: result cached as {key[:12]}")
+
+            self._evict(stage)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def _evict(self, stage: str) -> None:
+        """
+        This function removes the entries of stage beyond the max_entries most
+        recently stored or used ones, and entries left without a manifest.
+
+        """
+        stage_dir: str = os.path.join(self.cache_config.cache_dir, stage)
+        last_used: Dict[str, float] = {}
+        for key in os.listdir(stage_dir):
+            manifest_path: str = os.path.join(stage_dir, key, self.MANIFEST)
+            last_used[key] = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else 0.0
+
+        for key in sorted(last_used, key=last_used.get, reverse=True)[self.cache_config.max_entries:]:
+            logger.info(f"Stage {stage}: evicting cached result {key[:12]}")
+            shutil.rmtree(os.path.join(stage_dir, key), ignore_errors=True)
+
+    def invalidate(self, *stages: str) -> None:
+        """
+        This function removes every cached result of stages.
+
+        """
+        try:
+            for stage in stages:
+                stage_dir: str = os.path.join(self.cache_config.cache_dir, stage)
+                if os.path.exists(stage_dir):
+                    logger.info(f"Stage {stage}: invalidating cached results")
+                    shutil.rmtree(stage_dir)
+
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -1,25 +1,223 @@
-from src.components.data_ingestion import DataIngestion
-from src.components.data_transformation import DataTransformation
-from src.components.model_trainer import ModelTrainer
-
-from src.logger import logging
-
-
-if __name__=="__main__":
-
-    # Data Ingestion
-    logging.info("Train_Pipeline: Data Ingestion has begun")
-    train_data_path, test_data_path = DataIngestion().intiate_data_ingestion()
-
-    # Data Transformation
-    logging.info("Train_Pipeline: Data Transformation has begun")
-    X_train, y_train, X_test, y_test, preprocessor_path = DataTransformation().initiate_data_transformation(train_data_path, test_data_path)
-
-    # Model Training
-    logging.info("Train_Pipeline: Model Training has begun")
-    r2_score, model_path = ModelTrainer().initiate_model_training(X_train=X_train,
-                                                                  y_train=y_train,
-                                                                  X_test=X_test,
-                                                                  y_test=y_test)
-    
-    logging.info("Train_Pipeline: End")
\ No newline at end of file
+import os
+import argparse
+import logging
+
+from src.components.data_ingestion import DataIngestion
+from src.components.data_transformation import DataTransformation
+from src.components.model_trainer import ModelTrainer
+from src.components.inference_runtime import InferenceRuntime
+from src.components.hyperparameter_search import HyperparameterSearch
+from src.components.incremental_trainer import IncrementalTrainer
+from src.components.artifact_store import write_frame
+from src.components.transformation_components.column_transformers import Column_Transformers
+from src.components.transformation_components.transformation_functions import Transformation_functions
+from src.components.transformation_components.compiled_preprocessor import CompiledPreprocessor
+from src.components.transformation_components.multi_hot_encoder import MultiHotEncoder
+from src.pipelines.stage_cache import StageCache, fingerprint, source_fingerprint, package_versions
+from src.profiler import Profiler, ProfilerConfig, profiled
+from src.logger import configure_logging
+
+from src.utils import file_checksum, save_object, load_object, artifact_files, evaluate_models
+
+from typing import List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+STAGES: List[str] = ["ingestion", "transformation", "training"]
+
+
+def run_ingestion(cache: StageCache, streaming: bool = False, force: bool = False) -> Tuple[str, str, str]:
+    """
+    This function runs DataIngestion, or restores its datasets when the source
+    dump, the incremental listings, the config and the ingestion code are
+    unchanged. It returns the train and test paths with the fingerprint of the
+    stage.
+
+    """
+    data_ingestion = DataIngestion()
+    config = data_ingestion.ingestion_config
+    config.streaming = streaming
+
+    incremental_checksum: Optional[str] = (file_checksum(config.incremental_data_path)
+                                           if os.path.exists(config.incremental_data_path) else None)
+
+    key: str = fingerprint(file_checksum(config.source_data_path),
+                           incremental_checksum,
+                           config,
+                           source_fingerprint(DataIngestion, write_frame),
+                           package_versions("pandas", "pyarrow"))
+
+    result = None if force else cache.lookup("ingestion", key)
+    if result is None:
+        train_data_path, test_data_path = data_ingestion.intiate_data_ingestion()
+        result = {"train_data_path": train_data_path, "test_data_path": test_data_path}
+        cache.store("ingestion", key,
+                    outputs={"raw": config.raw_data_path, "train": train_data_path, "test": test_data_path},
+                    result=result)
+
+    return result["train_data_path"], result["test_data_path"], key
+
+
+def run_transformation(cache: StageCache, train_data_path: str, test_data_path: str, force: bool = False) -> Tuple[tuple, str]:
+    """
+    This function runs DataTransformation, or loads the preprocessor and the
+    transformed datasets when the train and test datasets, the config and the
+    transformation code are unchanged. It returns (X_train, y_train, X_test,
+    y_test, preprocessor_path) with the fingerprint of the stage.
+
+    """
+    data_transformation = DataTransformation()
+
+    key: str = fingerprint(file_checksum(train_data_path),
+                           file_checksum(test_data_path),
+                           data_transformation.data_tranformation_config,
+                           source_fingerprint(DataTransformation,
+                                              Column_Transformers,
+                                              Transformation_functions,
+                                              MultiHotEncoder,
+                                              CompiledPreprocessor),
+                           package_versions("scikit-learn", "pandas", "numpy"))
+
+    transformed_data_path: str = cache.cache_config.transformed_data_path
+
+    result = None if force else cache.lookup("transformation", key)
+    if result is None:
+        transformed: tuple = data_transformation.initiate_data_transformation(train_data_path, test_data_path)
+        save_object(file_path=transformed_data_path, obj=transformed)
+        cache.store("transformation", key,
+                    outputs=dict({os.path.basename(path): path for path in artifact_files(transformed[4])},
+                                 transformed=transformed_data_path),
+                    result={"preprocessor_path": transformed[4]})
+        return transformed, key
+
+    return load_object(transformed_data_path), key
+
+
+def run_training(cache: StageCache,
+                 transformed: tuple,
+                 transformation_key: str,
+                 force: bool = False,
+                 selection: Optional[str] = None,
+                 search_budget: Optional[float] = None,
+                 search_jobs: Optional[int] = None) -> Tuple[float, str]:
+    """
+    This function runs ModelTrainer, or restores the model when the transformed
+    datasets, the config, the model params and search spaces and the training
+    code are unchanged. It returns the r2 score and path of the model.
+
+    * selection: Overrides ModelTrainerConfig.selection, e.g. "search"
+    * search_budget: Overrides the time budget of the hyperparameter search
+    * search_jobs: Overrides the folds the hyperparameter search trains at once
+
+    """
+    model_trainer = ModelTrainer()
+    config = model_trainer.model_trainer_config
+    if selection is not None:
+        config.selection = selection
+    if search_budget is not None:
+        config.search.time_budget = search_budget
+    if search_jobs is not None:
+        config.search.n_jobs = search_jobs
+    X_train, y_train, X_test, y_test, _ = transformed
+
+    key: str = fingerprint(transformation_key,
+                           config,
+                           {name: model.get_params() for name, model in model_trainer.get_models().items()},
+                           model_trainer.get_search_spaces(),
+                           source_fingerprint(ModelTrainer, evaluate_models, HyperparameterSearch, InferenceRuntime),
+                           package_versions("scikit-learn", "xgboost", "catboost"))
+
+    result = None if force else cache.lookup("training", key)
+    if result is None:
+        r2_score, model_path = model_trainer.initiate_model_training(X_train=X_train,
+                                                                     y_train=y_train,
+                                                                     X_test=X_test,
+                                                                     y_test=y_test)
+        result = {"r2_score": r2_score, "model_path": model_path}
+        outputs: List[str] = artifact_files(model_path)
+        if os.path.exists(model_trainer.model_trainer_config.runtime_path):
+            outputs.append(model_trainer.model_trainer_config.runtime_path)
+        cache.store("training", key,
+                    outputs={os.path.basename(path): path for path in outputs},
+                    result=result)
+    else:
+        print("Cached model r2 score is", result["r2_score"])
+
+    return result["r2_score"], result["model_path"]
+
+
+if __name__=="__main__":
+
+    parser = argparse.ArgumentParser(description="Train the restaurant price model")
+    parser.add_argument("--incremental", metavar="NEW_DATA_CSV", default=None,
+                        help="Update the saved preprocessor and model with the listings in this CSV")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Ingest the dataset in chunks, for dumps larger than memory")
+    parser.add_argument("--force", nargs="*", choices=STAGES, default=None,
+                        help="Rerun these stages even if their inputs are unchanged, every stage when none are given")
+    parser.add_argument("--profile-path", default=ProfilerConfig.profile_path,
+                        help="File the JSON profile of the stages of the run is written to")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Trace the memory allocated by every stage with tracemalloc, slower")
+    parser.add_argument("--cprofile", metavar="STATS_FILE", default=None,
+                        help="Also write cProfile stats of the run, e.g. for snakeviz or flameprof")
+    parser.add_argument("--selection", choices=["exhaustive", "halving", "search"], default=None,
+                        help="How models are selected, search tunes their hyperparameters first")
+    parser.add_argument("--search-budget", type=float, default=None, metavar="SECONDS",
+                        help="Time budget of the hyperparameter search")
+    parser.add_argument("--search-jobs", type=int, default=None, metavar="N",
+                        help="Folds the hyperparameter search trains at once, -1 (the default) uses every core")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    # Wall time, CPU time and memory of every stage, written at the end of the run
+    profiler = Profiler(ProfilerConfig(profile_path=args.profile_path,
+                                       trace_memory=args.trace_memory,
+                                       cprofile_path=args.cprofile))
+    profiler.start()
+
+    try:
+        if args.incremental:
+            # Incremental Training
+            logger.info("Train_Pipeline: Incremental Training has begun")
+            with profiled("incremental_training"):
+                r2_score, model_path = IncrementalTrainer().initiate_incremental_training(args.incremental)
+
+            # The train split, preprocessor and model changed outside the cached stages
+            StageCache().invalidate(*STAGES)
+
+        else:
+            # Stages to rerun regardless of the cache
+            force: List[str] = [] if args.force is None else (args.force or STAGES)
+            cache = StageCache()
+
+            # Data Ingestion
+            logger.info("Train_Pipeline: Data Ingestion has begun")
+            with profiled("ingestion"):
+                train_data_path, test_data_path, _ = run_ingestion(cache, streaming=args.streaming,
+                                                                   force="ingestion" in force)
+
+            # Data Transformation
+            logger.info("Train_Pipeline: Data Transformation has begun")
+            with profiled("transformation"):
+                transformed, transformation_key = run_transformation(cache, train_data_path, test_data_path,
+                                                                     force="transformation" in force)
+
+            # Model Training
+            logger.info("Train_Pipeline: Model Training has begun")
+            with profiled("training"):
+                r2_score, model_path = run_training(cache, transformed, transformation_key,
+                                                    force="training" in force,
+                                                    selection=args.selection,
+                                                    search_budget=args.search_budget,
+                                                    search_jobs=args.search_jobs)
+
+    finally:
+        # Stopping tracemalloc and cProfile and keeping the profile of the stages that ran, also after a failure
+        profiler.stop()
+        logger.info(f"Profile written to {profiler.save()}")
+
+    logger.info("Train_Pipeline: End")
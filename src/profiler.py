@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+import logging
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from src.exception import CustomException
+
+from typing import Iterator, List, Optional, Type
+
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is then not reported
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+MB: int = 1024 * 1024
+
+
+@dataclass
+class ProfilerConfig:
+    """
+    class ProfilerConfig is used to initialize the training profiler.
+
+    * profile_path: Path of the JSON profile written at the end of a run
+    * trace_memory: Whether to trace Python and NumPy allocations with tracemalloc,
+      which reports the memory of every stage precisely but slows training down
+    * cprofile_path: Path of the cProfile stats of the whole run, not collected
+      when None. View them as a flame graph with e.g. snakeviz or flameprof
+
+    """
+    profile_path: str = os.path.join('artifacts', 'profile.json')
+    trace_memory: bool = False
+    cprofile_path: Optional[str] = None
+
+
+@dataclass
+class _Frame:
+    """
+    Stage being measured, with its measurements at entry.
+    """
+    name: str
+    wall_start: float
+    cpu_start: float
+    rss_start: Optional[int]
+    peak_rss_start: Optional[int]
+    traced_start: int = 0
+    traced_peak: int = 0
+    entry: dict = field(default_factory=dict)
+
+
+def current_rss() -> Optional[int]:
+    """
+    This function returns the resident set size of the process in bytes, or
+    None where /proc is not available.
+
+    """
+    try:
+        with open("/proc/self/statm") as file_obj:
+            return int(file_obj.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    """
+    This function returns the highest resident set size of the process so far
+    in bytes, or None where the resource module is not available.
+
+    """
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _megabytes(n_bytes: Optional[int]) -> Optional[float]:
+    return None if n_bytes is None else round(n_bytes / MB, 3)
+
+
+class Profiler:
+    """
+    class Profiler:
+        * __init__(config: ProfilerConfig = None) -> None
+        * start() -> None
+        * stage(name: str) -> ContextManager
+        * record(name: str, **measurements) -> None
+        * stop() -> None
+        * to_dict() -> dict
+        * save() -> str
+
+        This class measures the stages of a training run. Every stage records
+        its wall time, CPU time, resident set size at exit and growth, growth
+        of the peak resident set size and, with trace_memory, the peak and net
+        memory allocated through tracemalloc. Stages nest, and each is named
+        by the path of the stages enclosing it, e.g.
+        "transformation/fit_transform:OrdinalEncode".
+
+        Between start() and stop() the profiler is the active one, and the
+        components report their stages to it with profiled(), which does
+        nothing when no profiler is active.
+
+    """
+    def __init__(self, config: Optional[ProfilerConfig] = None) -> None:
+        self.profiler_config: Type[ProfilerConfig] = config or ProfilerConfig()
+        self.stages: List[dict] = []
+        self._stack: List[_Frame] = []
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._started_at: Optional[str] = None
+        self._wall_start: float = 0.0
+        self._wall_time: Optional[float] = None
+
+    def start(self) -> None:
+        """
+        This function makes the profiler the active one and starts tracemalloc
+        and cProfile when configured.
+
+        """
+        global _active_profiler
+        _active_profiler = self
+
+        self._started_at = datetime.now(timezone.utc).isoformat()
+        self._wall_start = time.perf_counter()
+
+        if self.profiler_config.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        if self.profiler_config.cprofile_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        This function measures the enclosed block as stage name.
+
+        """
+        path: str = "/".join([frame.name for frame in self._stack] + [name])
+        frame = _Frame(name=name,
+                       wall_start=time.perf_counter(),
+                       cpu_start=time.process_time(),
+                       rss_start=current_rss(),
+                       peak_rss_start=peak_rss(),
+                       entry={"stage": path, "depth": len(self._stack)})
+
+        tracing: bool = tracemalloc.is_tracing()
+        if tracing:
+            # The peak of the enclosing stage so far is kept before the peak is reset for this one
+            if self._stack:
+                self._stack[-1].traced_peak = max(self._stack[-1].traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            frame.traced_start = tracemalloc.get_traced_memory()[0]
+
+        # Stages are listed in the order they start, enclosing stages first
+        self.stages.append(frame.entry)
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+
+            rss_end: Optional[int] = current_rss()
+            peak_rss_end: Optional[int] = peak_rss()
+            frame.entry.update({
+                "wall_time": time.perf_counter() - frame.wall_start,
+                "cpu_time": time.process_time() - frame.cpu_start,
+                "rss_mb": _megabytes(rss_end),
+                "rss_delta_mb": _megabytes(None if rss_end is None or frame.rss_start is None
+                                           else rss_end - frame.rss_start),
+                "peak_rss_mb": _megabytes(peak_rss_end),
+                "peak_rss_growth_mb": _megabytes(None if peak_rss_end is None
+                                                 else peak_rss_end - frame.peak_rss_start)
+            })
+
+            if tracing and tracemalloc.is_tracing():
+                traced_end, traced_peak = tracemalloc.get_traced_memory()
+                traced_peak = max(traced_peak, frame.traced_peak)
+                frame.entry.update({
+                    "traced_peak_mb": _megabytes(traced_peak - frame.traced_start),
+                    "traced_delta_mb": _megabytes(traced_end - frame.traced_start)
+                })
+
+                # The peak of this stage is part of the peak of the enclosing one
+                if self._stack:
+                    self._stack[-1].traced_peak = max(self._stack[-1].traced_peak, traced_peak)
+
+    def record(self, name: str, **measurements) -> None:
+        """
+        This function adds a stage measured elsewhere, e.g. a model trained in
+        a worker process, under the current stage.
+
+        """
+        path: str = "/".join([frame.name for frame in self._stack] + [name])
+        self.stages.append(dict({"stage": path, "depth": len(self._stack)}, **measurements))
+
+    def stop(self) -> None:
+        """
+        This function stops tracemalloc and cProfile, writes the cProfile stats
+        and makes no profiler active.
+
+        """
+        global _active_profiler
+        if _active_profiler is self:
+            _active_profiler = None
+
+        self._wall_time = time.perf_counter() - self._wall_start
+
+        if self.profiler_config.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            os.makedirs(os.path.dirname(self.profiler_config.cprofile_path) or ".", exist_ok=True)
+            self._cprofile.dump_stats(self.profiler_config.cprofile_path)
+            self._cprofile = None
+
+    def to_dict(self) -> dict:
+        """
+        This function returns the profile of the run.
+
+        """
+        return {
+            "started_at": self._started_at,
+            "wall_time": self._wall_time,
+            "peak_rss_mb": _megabytes(peak_rss()),
+            "trace_memory": self.profiler_config.trace_memory,
+            "cprofile_path": self.profiler_config.cprofile_path,
+            "stages": self.stages
+        }
+
+    def save(self) -> str:
+        """
+        This function writes the profile as JSON and returns its path.
+
+        """
+        try:
+            profile_path: str = self.profiler_config.profile_path
+            os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+
+            with open(profile_path, "w") as file_obj:
+                json.dump(self.to_dict(), file_obj, indent=2)
+
+            logger.info(f"Training profile saved to {profile_path}")
+
+            return profile_path
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Profiler the components report their stages to, None when not profiling
+_active_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    """
+    This function returns the active profiler, or None when not profiling.
+
+    """
+    return _active_profiler
+
+
+@contextmanager
+def profiled(name: str) -> Iterator[None]:
+    """
+    This function measures the enclosed block as a stage of the active
+    profiler. Without one it does nothing but run the block.
+
+    """
+    if _active_profiler is None:
+        yield
+        return
+
+    with _active_profiler.stage(name):
+        yield
+
+
+def record_stage(name: str, **measurements) -> None:
+    """
+    This function adds a stage measured elsewhere to the active profiler, if any.
+
+    """
+    if _active_profiler is not None:
+        _active_profiler.record(name, **measurements)
+
+
+def run_pipeline_steps(pipeline, X, fit: bool):
+    """
+    This function runs the steps of a scikit-learn Pipeline one at a time, each
+    as a stage, and returns the same output as pipeline.fit_transform(X) when
+    fit is True, or pipeline.transform(X) otherwise. The steps are fitted in
+    place, as Pipeline does without a memory.
+
+    """
+    action: str = "fit_transform" if fit else "transform"
+
+    for name, step in pipeline.steps:
+        if step is None or step == "passthrough":
+            continue
+        with profiled(f"{action}:{name}"):
+            X = step.fit_transform(X) if fit else step.transform(X)
+
+    return X
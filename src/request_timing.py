@@ -0,0 +1,96 @@
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.metrics import STAGE_SECONDS
+
+from typing import Dict, Iterator, Optional
+
+
+# Stage timings of the request handled by the current thread or task
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timing() -> Dict[str, float]:
+    """
+    This function starts collecting stage timings for the current request and
+    returns the dictionary they are added to, in seconds.
+
+    """
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+
+    return timings
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    """
+    This function returns the timings of the current request, or None outside
+    of a timed request.
+
+    """
+    return _request_timings.get()
+
+
+def add_timing(timings: Optional[Dict[str, float]], stage: str, seconds: float) -> None:
+    """
+    This function adds seconds to a stage of timings, if there are timings.
+
+    """
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def observe_timing(stage: str, seconds: float) -> None:
+    """
+    This function records seconds spent in stage outside of a timed() block,
+    e.g. measured in a worker process, for the current request and in the
+    stage latency histogram of /metrics.
+
+    """
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    add_timing(_request_timings.get(), stage, seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    This function times the enclosed block as stage of the current request,
+    if any, and observes it in the stage latency histogram of /metrics.
+
+    """
+    timings: Optional[Dict[str, float]] = _request_timings.get()
+
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds: float = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        add_timing(timings, stage, seconds)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """
+    This function formats timings as a Server-Timing header, in milliseconds,
+    e.g. "parse;dur=0.12, predict;dur=3.40".
+
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items())
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """
+    This function reads a Server-Timing header back into seconds per stage.
+
+    """
+    timings: Dict[str, float] = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, parameters = entry.partition(";")
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.strip().partition("=")
+            if key == "dur":
+                timings[name.strip()] = float(value) / 1000
+
+    return timings
@@ -1,85 +1,467 @@
-import os
-import sys
-import pickle
-
-import numpy as np
-import pandas as pd
-
-from src.exception import CustomException
-from sklearn.metrics import r2_score
-
-# Function for pickling objects
-def save_object(file_path: str, obj) -> None:
-    """
-    This function takes file path and object as input and saves the object
-    at specified path.
-
-    * file_path: Path of the location where object is to be stored
-    * obj: Object to be pickled
-    * dir_path: Variable for creating directory
-
-    """
-    try:
-        # Extracting directory from file_path
-        dir_path: str = os.path.dirname(file_path)
-
-        # Creating directory
-        os.makedirs(dir_path, exist_ok=True)
-
-        # Pickling object
-        with open(file_path, "wb") as file_obj:
-            pickle.dump(obj, file_obj)
-
-    except Exception as e:
-        raise CustomException(e, sys)
-
-
-# Function for loading pickled objects
-def load_object(file_path: str) -> pickle:
-    """
-    This function is used to load pickled objects.
-
-    """
-    try:
-        with open(file_path, "rb") as file_obj:
-            return pickle.load(file_obj)
-
-    except Exception as e:
-        raise CustomException(e, sys)
-
-# Function to train and evaluate models
-def evaluate_models(X_train: pd.DataFrame,
-                    y_train: pd.Series,
-                    X_test: pd.DataFrame,
-                    y_test: pd.Series,
-                    models: dict) -> dict:
-    """
-    This function trains models and evaluates their r2 score
-        * report: Dictionary containing model names and r2 scores
-        * model: Store model from the dictionary of models
-        * y_test_pred: Predicted target variable from X_test data
-        * test_model_score: r2 score of the model
-    """
-    try:
-        report: dict = {}
-
-        for i in range(len(list(models))):
-            # Get model
-            model = list(models.values())[i]
-
-            # Train model
-            model.fit(X_train,y_train)
-
-            # Predict
-            y_test_pred: pd.Series = model.predict(X_test)
-
-            # Evaluate r2 score
-            test_model_score: float = r2_score(y_test, y_test_pred)
-
-            # Add r2 score to dictionary
-            report[list(models.keys())[i]] = test_model_score
-
-        return report
-
-    except Exception as e:
-        raise CustomException(e, sys)
+import os
+import sys
+import time
+import json
+import pickle
+import hashlib
+import platform
+import importlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.exception import CustomException
+from src.profiler import profiled, record_stage
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Function for pickling objects
+def save_object(file_path: str, obj) -> None:
+    """
+    This function takes file path and object as input and saves the object
+    at specified path.
+
+    * file_path: Path of the location where object is to be stored
+    * obj: Object to be pickled
+    * dir_path: Variable for creating directory
+
+    """
+    try:
+        # Extracting directory from file_path
+        dir_path: str = os.path.dirname(file_path)
+
+        # Creating directory
+        os.makedirs(dir_path, exist_ok=True)
+
+        # Pickling object
+        with open(file_path, "wb") as file_obj:
+            pickle.dump(obj, file_obj)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+# Function for loading pickled objects
+def load_object(file_path: str) -> pickle:
+    """
+    This function is used to load pickled objects.
+
+    """
+    try:
+        with open(file_path, "rb") as file_obj:
+            return pickle.load(file_obj)
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+# Function for checksumming files
+def file_checksum(file_path: str) -> str:
+    """
+    This function returns the sha256 checksum of a file, read in blocks so
+    that large files are not held in memory.
+
+    """
+    try:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as file_obj:
+            for block in iter(lambda: file_obj.read(1 << 20), b""):
+                sha256.update(block)
+
+        return sha256.hexdigest()
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+# Extensions of the artifact formats
+ARTIFACT_EXTENSIONS: Dict[str, str] = {
+    "pickle": "pkl",
+    "joblib": "joblib",
+    "catboost": "cbm",
+    "xgboost": "ubj"
+}
+
+MANIFEST_SUFFIX: str = ".manifest.json"
+
+
+# Function to pick the format of an artifact
+def artifact_format_of(obj) -> str:
+    """
+    This function returns the native format of CatBoost and XGBoost models and
+    joblib for every other object.
+
+    """
+    module: str = type(obj).__module__
+    if module.startswith("catboost"):
+        return "catboost"
+    if module.startswith("xgboost"):
+        return "xgboost"
+
+    return "joblib"
+
+
+# Function for the file an artifact is loaded from
+def resolve_artifact_path(manifest_path: str) -> str:
+    """
+    This function returns manifest_path, or the legacy pickle saved with the
+    same name before artifacts had manifests (artifacts/model.pkl for
+    artifacts/model.manifest.json) when only that pickle exists.
+
+    """
+    if not manifest_path.endswith(MANIFEST_SUFFIX) or os.path.exists(manifest_path):
+        return manifest_path
+
+    legacy_path: str = f"{manifest_path[:-len(MANIFEST_SUFFIX)]}.{ARTIFACT_EXTENSIONS['pickle']}"
+    if os.path.exists(legacy_path):
+        return legacy_path
+
+    return manifest_path
+
+
+# Function for the data file named by a manifest
+def artifact_files(manifest_path: str) -> List[str]:
+    """
+    This function returns the files of an artifact, the data file first and
+    the manifest last, or just the path of an artifact without a manifest.
+
+    """
+    try:
+        manifest_path = resolve_artifact_path(manifest_path)
+        if not manifest_path.endswith(MANIFEST_SUFFIX):
+            return [manifest_path]
+
+        with open(manifest_path) as file_obj:
+            manifest: dict = json.load(file_obj)
+
+        return [os.path.join(os.path.dirname(manifest_path), manifest["file"]), manifest_path]
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+# Function for saving artifacts with a manifest
+def save_artifact(manifest_path: str, obj, artifact_format: str = "auto") -> str:
+    """
+    This function saves obj next to manifest_path in artifact_format, then the
+    manifest describing it, and returns manifest_path.
+
+    * artifact_format: "pickle", "joblib", "catboost" (.cbm), "xgboost" (.ubj),
+      or "auto" for artifact_format_of(obj)
+    * data_path: manifest_path with the extension of the format
+    * manifest: Format, file name, sha256, class and library versions of the artifact
+
+    Both files are written to a temporary name and renamed, and the manifest
+    last, so a reader polling the manifest never sees a half written artifact.
+
+    """
+    try:
+        if artifact_format == "auto":
+            artifact_format = artifact_format_of(obj)
+
+        base_path: str = manifest_path[:-len(MANIFEST_SUFFIX)] if manifest_path.endswith(MANIFEST_SUFFIX) else manifest_path
+        data_path: str = f"{base_path}.{ARTIFACT_EXTENSIONS[artifact_format]}"
+        os.makedirs(os.path.dirname(data_path) or ".", exist_ok=True)
+
+        # Writing the data file
+        temp_path: str = f"{data_path}.tmp.{os.getpid()}.{ARTIFACT_EXTENSIONS[artifact_format]}"
+        if artifact_format == "pickle":
+            with open(temp_path, "wb") as file_obj:
+                pickle.dump(obj, file_obj, protocol=pickle.HIGHEST_PROTOCOL)
+        elif artifact_format == "joblib":
+            import joblib
+            joblib.dump(obj, temp_path)
+        else:
+            obj.save_model(temp_path)
+        os.replace(temp_path, data_path)
+
+        versions: dict = {"python": platform.python_version()}
+        for package in ("numpy", "sklearn", "joblib", type(obj).__module__.split(".")[0]):
+            module = sys.modules.get(package)
+            if module is not None and hasattr(module, "__version__"):
+                versions[package] = module.__version__
+
+        manifest: dict = {
+            "format": artifact_format,
+            "file": os.path.basename(data_path),
+            "sha256": file_checksum(data_path),
+            "size": os.path.getsize(data_path),
+            "class": f"{type(obj).__module__}.{type(obj).__qualname__}",
+            "params": obj.get_params() if artifact_format == "catboost" else None,
+            "versions": versions,
+            "created_at": time.time()
+        }
+
+        # Writing the manifest last
+        with open(manifest_path + ".tmp", "w") as file_obj:
+            json.dump(manifest, file_obj, indent=2, default=str)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        logger.info(f"{manifest['class']} saved as {artifact_format} to {data_path}")
+
+        return manifest_path
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+# Function for loading artifacts saved with save_artifact()
+def load_artifact(manifest_path: str, verify: bool = True, mmap_mode: Optional[str] = "r"):
+    """
+    This function loads an artifact saved with save_artifact(). Paths without a
+    manifest are loaded as plain pickles, like load_object(), and so is the
+    legacy pickle of a manifest that does not exist yet, see
+    resolve_artifact_path().
+
+    * verify: Check the sha256 of the data file against the manifest
+    * mmap_mode: joblib memory maps the NumPy arrays of the object read-only,
+      so their pages come from the page cache and are shared between processes
+
+    Versions of the libraries that differ from the ones that saved the
+    artifact are logged.
+
+    """
+    try:
+        manifest_path = resolve_artifact_path(manifest_path)
+        if not manifest_path.endswith(MANIFEST_SUFFIX):
+            return load_object(manifest_path)
+
+        with open(manifest_path) as file_obj:
+            manifest: dict = json.load(file_obj)
+        data_path: str = os.path.join(os.path.dirname(manifest_path), manifest["file"])
+
+        if verify and file_checksum(data_path) != manifest["sha256"]:
+            raise ValueError(f"Checksum of {data_path} does not match {manifest_path}")
+
+        for package, version in manifest["versions"].items():
+            module = sys.modules.get(package)
+            if module is not None and getattr(module, "__version__", version) != version:
+                logger.warning(f"{data_path} was saved with {package} {version}, loading with {module.__version__}")
+
+        artifact_format: str = manifest["format"]
+        if artifact_format == "pickle":
+            return load_object(data_path)
+        if artifact_format == "joblib":
+            import joblib
+            return joblib.load(data_path, mmap_mode=mmap_mode)
+
+        # Native model formats are loaded into a new model of the saved class
+        module_name, class_name = manifest["class"].rsplit(".", 1)
+        model_class = getattr(importlib.import_module(module_name), class_name)
+        model = model_class(**(manifest["params"] or {}))
+        model.load_model(data_path)
+
+        return model
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+# Function to cap the threads a model uses
+def limit_model_threads(model, n_threads: int) -> None:
+    """
+    This function sets the thread count parameter of models that have one
+    (n_jobs for scikit-learn and XGBoost, thread_count for CatBoost).
+
+    """
+    params: dict = model.get_params()
+    for param in ("n_jobs", "thread_count"):
+        if param in params:
+            model.set_params(**{param: n_threads})
+
+
+# Function to train and evaluate a single model
+def fit_and_score(name: str,
+                  model,
+                  X_train: pd.DataFrame,
+                  y_train: pd.Series,
+                  X_test: pd.DataFrame,
+                  y_test: pd.Series,
+                  n_threads: int = None) -> Tuple[str, object, dict]:
+    """
+    This function trains one model and returns its name, the fitted model and
+    its r2 score with fit and predict wall times and the CPU time of both, in
+    the process that trained it. With n_threads set, the model
+    and the BLAS/OpenMP pools it uses are capped to that many threads.
+
+    """
+    # Training only, kept out of the imports of the web process
+    from sklearn.metrics import r2_score
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=n_threads):
+        if n_threads is not None:
+            limit_model_threads(model, n_threads)
+
+        # Train model
+        cpu_start: float = time.process_time()
+        start: float = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time: float = time.perf_counter() - start
+
+        # Predict
+        start = time.perf_counter()
+        y_test_pred: pd.Series = model.predict(X_test)
+        predict_time: float = time.perf_counter() - start
+        cpu_time: float = time.process_time() - cpu_start
+
+    # Evaluate r2 score
+    test_model_score: float = r2_score(y_test, y_test_pred)
+
+    return name, model, {"r2_score": test_model_score,
+                         "fit_time": fit_time,
+                         "predict_time": predict_time,
+                         "cpu_time": cpu_time}
+
+
+# Function to train and evaluate models
+def evaluate_models(X_train: pd.DataFrame,
+                    y_train: pd.Series,
+                    X_test: pd.DataFrame,
+                    y_test: pd.Series,
+                    models: dict,
+                    n_jobs: int = 1) -> dict:
+    """
+    This function trains models and evaluates their r2 score
+        * report: Dictionary containing model names and, for every model, its
+          r2 score, fit wall time and predict wall time in seconds
+        * n_jobs: Number of models trained at the same time in a process pool,
+          -1 uses every core, at most one worker per model. The cores are
+          shared out between the models so the pool does not oversubscribe the
+          machine, and models trained alone keep every core.
+        * n_threads: Threads given to each model when n_jobs > 1
+
+    The fitted models replace the unfitted ones in the models dictionary.
+    """
+    try:
+        report: dict = {}
+
+        cpu_count: int = os.cpu_count() or 1
+        # Never more workers than models, so the spare cores go to their threads
+        n_jobs = max(1, min(cpu_count if n_jobs == -1 else n_jobs, len(models)))
+
+        if n_jobs == 1:
+            for name, model in models.items():
+                with profiled(f"model:{name}"):
+                    _, models[name], report[name] = fit_and_score(name, model,
+                                                                  X_train, y_train,
+                                                                  X_test, y_test)
+                logger.info(f"{name}: {report[name]}")
+
+            return report
+
+        n_threads: int = max(1, cpu_count // n_jobs)
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures: list = [executor.submit(fit_and_score, name, model,
+                                             X_train, y_train,
+                                             X_test, y_test,
+                                             n_threads)
+                             for name, model in models.items()]
+
+            for future in as_completed(futures):
+                name, fitted_model, scores = future.result()
+                models[name] = fitted_model
+                report[name] = scores
+
+                # Trained in a worker process, which the profiler cannot measure
+                record_stage(f"model:{name}",
+                             wall_time=scores["fit_time"] + scores["predict_time"],
+                             cpu_time=scores["cpu_time"],
+                             worker_process=True)
+                logger.info(f"{name}: {scores}")
+
+        # Keeping the order of the models dictionary
+        return {name: report[name] for name in models}
+
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+# Function to select a model by successive halving
+def evaluate_models_halving(X_train: pd.DataFrame,
+                            y_train: pd.Series,
+                            X_test: pd.DataFrame,
+                            y_test: pd.Series,
+                            models: dict,
+                            eta: int = 3,
+                            min_samples: int = 2000,
+                            finalists: int = 2,
+                            time_budget: Optional[float] = None,
+                            n_jobs: int = 1,
+                            random_state: int = 9) -> dict:
+    """
+    This function selects models by successive halving. Every candidate is
+    first trained on a small random subsample of the training data, only the
+    best 1/eta of them move on to the next round, which uses eta times more
+    rows. Once finalists or fewer are left, or time_budget seconds have passed,
+    the remaining models are trained on the full training data with
+    evaluate_models().
+        * report: Same as evaluate_models(), models dropped early are marked
+          with "eliminated": True and carry the score of their last round
+        * candidates: Names of the models still in the race
+        * n_samples: Training rows used in the current round
+        * order: Random order of the training rows, the subsample of a round
+          is its first n_samples rows
+
+    The fitted finalists replace the unfitted ones in the models dictionary.
+    """
+    from sklearn.base import clone
+
+    try:
+        report: dict = {}
+        candidates: list = list(models)
+        start: float = time.perf_counter()
+
+        order: np.ndarray = np.random.RandomState(random_state).permutation(len(X_train))
+        n_samples: int = min_samples
+
+        while len(candidates) > finalists and n_samples < len(X_train):
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                logger.info("Time budget spent, moving on to the finalists")
+                break
+
+            # Training fresh copies of the candidates on a subsample
+            rows: np.ndarray = order[:n_samples]
+            round_models: dict = {name: clone(models[name]) for name in candidates}
+            with profiled(f"halving_round:{n_samples}"):
+                round_report: dict = evaluate_models(X_train=X_train.iloc[rows],
+                                                     y_train=y_train.iloc[rows],
+                                                     X_test=X_test,
+                                                     y_test=y_test,
+                                                     models=round_models,
+                                                     n_jobs=n_jobs)
+
+            # Keeping the best 1/eta of the candidates, never fewer than finalists
+            ranked: list = sorted(candidates, key=lambda name: round_report[name]["r2_score"], reverse=True)
+            keep: int = max(finalists, int(np.ceil(len(ranked) / eta)))
+
+            for name in ranked[keep:]:
+                report[name] = dict(round_report[name], n_samples=n_samples, eliminated=True)
+
+            logger.info(f"Halving round on {n_samples} rows kept {ranked[:keep]}")
+
+            candidates = ranked[:keep]
+            n_samples *= eta
+
+        # Training the finalists on the full training data
+        finalist_models: dict = {name: models[name] for name in candidates}
+        with profiled("finalists"):
+            final_report: dict = evaluate_models(X_train=X_train,
+                                                 y_train=y_train,
+                                                 X_test=X_test,
+                                                 y_test=y_test,
+                                                 models=finalist_models,
+                                                 n_jobs=n_jobs)
+
+        for name in candidates:
+            models[name] = finalist_models[name]
+            report[name] = dict(final_report[name], n_samples=len(X_train), eliminated=False)
+
+        # Keeping the order of the models dictionary
+        return {name: report[name] for name in models}
+
+    except Exception as e:
+        raise CustomException(e, sys)
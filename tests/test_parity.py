@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sklearn import config_context
+from sklearn.svm import SVR
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor, AdaBoostRegressor
+from catboost import CatBoostRegressor
+from xgboost import XGBRegressor
+
+from src.components.data_transformation import DataTransformation
+from src.components.inference_runtime import InferenceRuntime
+from src.components.transformation_components.compiled_preprocessor import CompiledPreprocessor
+from src.components.transformation_components.transformation_functions import Transformation_functions
+from src.components.transformation_components.rate_parsing import parse_rate
+
+
+ENCODINGS = ['explode', 'multi_hot']
+
+# Models of every family the runtime exports: sklearn trees, XGBoost, CatBoost and linear
+EXPORTABLE_MODELS = {
+    "Decision Tree": lambda: DecisionTreeRegressor(random_state=0),
+    "Random Forest Regressor": lambda: RandomForestRegressor(n_estimators=10, random_state=0),
+    "Extra Trees Regressor": lambda: ExtraTreesRegressor(n_estimators=10, random_state=0),
+    "XGBRegressor": lambda: XGBRegressor(n_estimators=20, random_state=0),
+    "CatBoosting Regressor": lambda: CatBoostRegressor(iterations=20, verbose=False, allow_writing_files=False),
+    "Linear Regression": lambda: LinearRegression(),
+    "Ridge": lambda: Ridge()
+}
+
+LOCATIONS = ['BTM', 'Banashankari', 'Indiranagar', 'Jayanagar', 'Koramangala 5th Block']
+REST_TYPES = ['Casual Dining', 'Cafe', 'Quick Bites', 'Bar, Casual Dining', 'Casual Dining, Bar',
+              'Cafe, Quick Bites', 'Quick Bites, Cafe, Quick Bites']
+LISTED_IN = ['Buffet', 'Delivery', 'Dine-out']
+RATES = ['4.1/5', '3.8 /5', '2.9/5', '4.9 /5', 'NEW', '-', None]
+
+
+def synthetic_frame(n_rows: int, seed: int) -> pd.DataFrame:
+    """
+    This function returns n_rows restaurants with the columns of the Zomato
+    dataset, including unrated restaurants, multi-tag and unsorted rest_types,
+    and rows without a price or a rest_type that the preprocessor drops.
+
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'name': [f"Restaurant {i}" for i in range(n_rows)],
+        'online_order': rng.choice(['Yes', 'No'], n_rows),
+        'book_table': rng.choice(['Yes', 'No'], n_rows),
+        'rate': rng.choice(np.array(RATES, dtype=object), n_rows),
+        'votes': rng.integers(0, 3000, n_rows),
+        'location': rng.choice(LOCATIONS, n_rows),
+        'rest_type': rng.choice(np.array(REST_TYPES, dtype=object), n_rows),
+        'approx_cost(for two people)': rng.choice(['300', '450', '800', '1,200', '2,500'], n_rows),
+        'listed_in(type)': rng.choice(LISTED_IN, n_rows)
+    })
+    df.loc[df.sample(frac=0.03, random_state=seed).index, 'rest_type'] = None
+    df.loc[df.sample(frac=0.03, random_state=seed + 1).index, 'approx_cost(for two people)'] = None
+
+    return df
+
+
+def records(df: pd.DataFrame):
+    """
+    This function yields the restaurants of df the preprocessor keeps, as the
+    fields of a form submission.
+
+    """
+    df = df[df['rest_type'].notna() & df['approx_cost(for two people)'].notna()]
+    for _, row in df.iterrows():
+        yield {'book': row['book_table'],
+               'delivery': row['online_order'],
+               'rate': row['rate'],
+               'votes': row['votes'],
+               'location': row['location'],
+               'type_tag': row['rest_type'],
+               'r_type': row['listed_in(type)']}
+
+
+@pytest.fixture(scope="module")
+def train_df() -> pd.DataFrame:
+    return synthetic_frame(400, seed=1)
+
+
+@pytest.fixture(scope="module")
+def test_df() -> pd.DataFrame:
+    return synthetic_frame(120, seed=2)
+
+
+@pytest.fixture(scope="module", params=ENCODINGS)
+def fitted(request, train_df):
+    """
+    This fixture fits the sklearn preprocessor of every rest_type encoding on
+    train_df and compiles it.
+
+    """
+    data_transformation = DataTransformation()
+    data_transformation.data_tranformation_config.rest_type_encoding = request.param
+    preprocessor = data_transformation.get_data_transformer_object()
+    with config_context(transform_output="pandas"):
+        X_train, y_train = preprocessor.fit_transform(train_df)
+
+    return preprocessor, CompiledPreprocessor(preprocessor), X_train, y_train
+
+
+def pipeline_transform(preprocessor, df: pd.DataFrame):
+    with config_context(transform_output="pandas"):
+        return preprocessor.transform(df)
+
+
+def test_compiled_preprocessor_matches_pipeline(fitted, test_df):
+    preprocessor, compiled_preprocessor, _, _ = fitted
+
+    X_expected, y_expected = pipeline_transform(preprocessor, test_df)
+    X, y = compiled_preprocessor.transform(test_df)
+
+    assert list(X_expected.columns) == compiled_preprocessor.feature_names_out
+    np.testing.assert_array_equal(X, X_expected.to_numpy(dtype=np.float64))
+    np.testing.assert_array_equal(y, y_expected.to_numpy(dtype=np.float64))
+
+
+def test_transform_record_matches_pipeline(fitted, test_df):
+    preprocessor, compiled_preprocessor, X_train, y_train = fitted
+    runtime = InferenceRuntime.from_model(LinearRegression().fit(X_train, y_train), compiled_preprocessor)
+
+    for record in list(records(test_df))[:25]:
+        frame = pd.DataFrame({'online_order': [record['delivery']],
+                              'book_table': [record['book']],
+                              'rate': [record['rate']],
+                              'votes': [record['votes']],
+                              'location': [record['location']],
+                              'rest_type': [record['type_tag']],
+                              'approx_cost(for two people)': ['0'],
+                              'listed_in(type)': [record['r_type']]})
+        expected = pipeline_transform(preprocessor, frame)[0].to_numpy(dtype=np.float64)
+
+        np.testing.assert_array_equal(compiled_preprocessor.transform_record(**record), expected)
+        np.testing.assert_array_equal(runtime.transform_record(**record), expected)
+
+
+@pytest.mark.parametrize("name", list(EXPORTABLE_MODELS))
+def test_runtime_matches_model(fitted, test_df, name):
+    preprocessor, compiled_preprocessor, X_train, y_train = fitted
+    model = EXPORTABLE_MODELS[name]().fit(X_train, y_train)
+    runtime = InferenceRuntime.from_model(model, compiled_preprocessor)
+
+    # Feature rows of the pipeline, predicted by the model and by the runtime
+    X_test, _ = pipeline_transform(preprocessor, test_df)
+    np.testing.assert_allclose(runtime.predict_features(X_test.to_numpy(dtype=np.float64)),
+                               np.asarray(model.predict(X_test), dtype=np.float64).ravel(),
+                               rtol=1e-5, atol=1e-3)
+
+    # Whole restaurants, the mean of their rows, from the raw columns and from single records
+    kept = test_df[test_df['rest_type'].notna() & test_df['approx_cost(for two people)'].notna()]
+    predictions = runtime.predict_columns(kept)
+    for prediction, record in zip(predictions, records(kept)):
+        X_record = compiled_preprocessor.transform_record(**record)
+        expected = float(np.mean(model.predict(pd.DataFrame(X_record, columns=compiled_preprocessor.feature_names_out))))
+        assert prediction == pytest.approx(expected, rel=1e-5, abs=1e-3)
+        assert runtime.predict_record(**record) == pytest.approx(expected, rel=1e-5, abs=1e-3)
+
+
+@pytest.mark.parametrize("model", [SVR(), KNeighborsRegressor(), AdaBoostRegressor(n_estimators=5)],
+                         ids=lambda model: type(model).__name__)
+def test_unexportable_models_raise(fitted, model):
+    _, compiled_preprocessor, X_train, y_train = fitted
+    model.fit(X_train, y_train)
+
+    with pytest.raises(NotImplementedError):
+        InferenceRuntime.from_model(model, compiled_preprocessor)
+
+
+def test_rate_parsers_agree():
+    rates = ['4.1/5', '3.8 /5', 'NEW', '-', None, np.nan, 4.5]
+    parsed = Transformation_functions().prep_rate(pd.DataFrame({'rate': rates}))['rate'].tolist()
+
+    assert parsed == [parse_rate(rate) for rate in rates] == [4.1, 3.8, 0.0, 0.0, 0.0, 0.0, 4.5]
+    with pytest.raises(ValueError):
+        parse_rate('')